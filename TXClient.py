@@ -1,264 +1,577 @@
-import basicvislib5549 as bvl
-import comms
-import src
-
-import math
-
-import traceback
-import numpy as np
-
-'''
-    TXClient is the client code that will run on the Jetson TX2.
-
-    Upon initialization, presuming this is the main execution, it will run in a loop given an 'Enabled' and 'Mode'
-    key from SmartDashboard until it is terminated.
-    
-    Keys that should be established in SmartDashboard to control operations:
-        Enabled: True or False, should be set in SmartDashboard when a button is pressed, this key enables
-            running the programs on the Jetson.
-        Mode: May be set to a number inclusive of the range -1 to 3. 1 runs with single camera, 2 runs with two 
-            in vision processing, 3 solely streams video to SmartDashboard.
-        CameraStream: Boolean that can be toggled to True when using a camera on the robot, works with
-            _run() and _dualrun().
-        Camera: Toggles between cameras (cameraSoleStream only).
-'''
-
-
-class TXClient:
-
-    def __init__(self):
-
-        self.__Table = comms.ConnectTable()
-        self.isReset = False
-        self.__vidstream = comms.VideoStream()
-        self.AsourceStatus = None
-        self.BsourceStatus = None
-
-        while self.__Table.Connected:
-            self.__Table.table.putBoolean("tableExists", True)
-
-            if self.__Table.table.getNumber("Mode", -1) is 0:
-                self._test()
-
-            elif self.__Table.table.getNumber("Mode", -1) is 1:
-                self._run()
-
-                self.__avg_centers = []
-                self.__all_centers = []
-                self.__contour_dimensions = []
-
-            elif self.__Table.table.getNumber("Mode", -1) is 2:
-                self._dualrun()
-
-                self.__lavg_centers = []
-                self.__lall_centers = []
-                self.__lcontour_dimensions = []
-                self.__ravg_centers = []
-                self.__rall_centers = []
-                self.__rcontour_dimensions = []
-
-            elif self.__Table.table.getNumber("Mode", -1) is 3:
-                self._cameraSoleStream()
-
-    def _visReset(self):
-
-        """Method to reset variables after finishing loop and be ready for enabling. Reset code goes here."""
-
-        return
-
-    def _cameraSoleStream(self):
-
-        try:
-            self.__bvissource
-            self.__tvissource
-
-        except NameError:
-            try:
-                self.__bvissource = bvl.CamLib.cv_video_source('/dev/video1')
-
-            except Exception:
-                self.AsourceStatus = False
-
-            else:
-                self.AsourceStatus = True
-
-            try:
-                self.__tvissource = bvl.CamLib.cv_video_source('/dev/video2')
-
-            except Exception:
-                self.BsourceStatus = False
-
-            else:
-                self.BsourceStatus = True
-
-        if self.__Table.table.getBoolean("Enabled", False) is True:
-            if self.AsourceStatus is True:
-                bret, bsource = self.__bvissource.read()
-
-            else:
-                bsource = np.zeros((1, 1, 3))
-
-            if self.BsourceStatus is True:
-                tret, tsource = self.__tvissource.read()
-
-            else:
-                tsource = np.zeros((1, 1, 3))
-
-            if self.__Table.table.getNumber("Camera", 0) is 0:
-                self.__vidstream.putFrame(tsource)
-
-            elif self.__Table.table.getNumber("Camera", 0) is 1:
-                self.__vidstream.putFrame(bsource)
-
-    def _dualrun(self):
-
-        try:
-            self.__lvissource
-            self.__rvissource
-
-        except NameError:
-            try:
-                self.__lvissource = bvl.CamLib.cv_video_source('/dev/video1')
-
-            except Exception:
-                self.AsourceStatus = False
-
-            else:
-                self.AsourceStatus = True
-
-            try:
-                self.__rvissource = bvl.CamLib.cv_video_source('/dev/video2')
-
-            except Exception:
-                self.BsourceStatus = False
-
-            else:
-                self.BsourceStatus = True
-
-        if self.__Table.table.getBoolean("Enabled", False) is True:
-            if self.AsourceStatus is True:
-                lret, lsource = self.__lvissource.read()
-
-            else:
-                lsource = np.zeros((1, 1, 3))
-
-            if self.BsourceStatus is True:
-                rret, rsource = self.__rvissource.read()
-
-            else:
-                rsource = np.zeros((1, 1, 3))
-
-            self.__lavg_centers, self.__lall_centers, self.__lcontour_dimensions = src.Src.vision_assistance_contour(lsource)
-            self.__ravg_centers, self.__rall_centers, self.__rcontour_dimensions = src.Src.vision_assistance_contour(rsource)
-            self.isReset = False
-
-            if len(self.__lcontour_dimensions) > 1:
-                self.__lcwidth = abs(self.__lcontour_dimensions[1, 1] - (self.__lcontour_dimensions[0, 1] + self.__lcontour_dimensions[0, 3]))
-
-            elif len(self.__lcontour_dimensions) == 1:
-                self.__lcwidth = self.__lcontour_dimensions[0, 3]
-
-            lcenterdist = -(lsource.shape[0]/2 - self.__lavg_centers)
-            lhypodist = (lcenterdist*3.5) / self.__lcwidth
-            loffset_direction = math.degrees(math.atan(lhypodist / lcenterdist))
-
-            if len(self.__rcontour_dimensions) > 1:
-                self.__rcwidth = abs(self.__rcontour_dimensions[1, 1] - (self.__rcontour_dimensions[0, 1] + self.__rcontour_dimensions[0, 3]))
-
-            elif len(self.__rcontour_dimensions) == 1:
-                self.__rcwidth = self.__rcontour_dimensions[0, 3]
-
-            rcenterdist = -(rsource.shape[0]/2 - self.__ravg_centers)
-            rhypodist = (rcenterdist * 3.5) / self.__rcwidth
-            roffset_direction = math.degrees(math.atan(rhypodist / rcenterdist))
-
-            self.__Table.table.putNumber("Left Camera Direction", loffset_direction)
-            self.__Table.table.putNumber("Right Camera Direction", roffset_direction)
-            self.__Table.table.putNumber("Left Camera Distance", lhypodist)
-            self.__Table.table.putNumber("Right Camera Distance", rhypodist)
-
-            if self.__Table.table.getBoolean("CameraStream", False) is True:
-                lsource = bvl.RobotVision.rotate_image(lsource, -90, False)
-                self.__vidstream.putFrame(lsource)
-
-        elif self.isReset is False and self.__Table.table.getBoolean("Enabled", False) is False:
-            self._visReset()
-            self.isReset = True
-
-    def _run(self):
-
-        """Single run only. Recommended for flexibility on termination."""
-
-        try:
-            self.__vissource
-
-        except NameError:
-            try:
-                self.__vissource = bvl.CamLib.cv_video_source('/dev/video1')
-
-            except Exception:
-                self.AsourceStatus = False
-
-            else:
-                self.AsourceStatus = True
-
-        if self.__Table.table.getBoolean("Enabled", False) is True:
-            if self.AsourceStatus is True:
-                ret, source = self.__vissource.read()
-
-            else:
-                source = np.zeros((1, 1, 3))
-
-            self.__avg_centers, self.__all_centers, self.__contour_dimensions = src.Src.vision_assistance_contour(source)
-            self.isReset = False
-
-            if len(self.__contour_dimensions) > 1:
-                self.__cwidth = abs(self.__contour_dimensions[1, 1] - (self.__contour_dimensions[0, 1] + self.__contour_dimensions[0, 3]))
-
-            elif len(self.__contour_dimensions) == 1:
-                self.__cwidth = self.__contour_dimensions[0, 3]
-
-            centerdist = (source.shape[0]/2-self.__avg_centers)
-            hypodist = (centerdist*3.5) / self.__cwidth
-            offset_direction = math.degrees(math.atan(hypodist/centerdist))
-
-            self.__Table.table.putNumberArray("contour centers", self.__avg_centers)
-            self.__Table.table.putNumberArray("all visible contour centers", self.__all_centers)
-            self.__Table.table.putNumberArray("all contour dimensions", self.__contour_dimensions)
-            self.__Table.table.putNumber("Direction", offset_direction)
-            self.__Table.table.putNumber("Camera Distance", hypodist)
-
-            if self.__Table.table.getBoolean("CameraStream", False) is True:
-                self.__vidstream.putFrame(source)
-
-        elif self.isReset is False and self.__Table.table.getBoolean("Enabled", False) is False:
-            self._visReset()
-            self.isReset = True
-
-    def _test(self):
-
-        """Test for connection and enabling"""
-        if self.__Table.table.getBoolean("Enabled", False) is True:
-            if self.__Table.table.getNumber("Number", 0) is 1:
-                self.__Table.table.putNumber("Number", 0)
-
-    '''def looprun(self):
-
-        """Run function looping itself."""
-
-        while self.__Table.Connected:
-            self.__Table.table.putBoolean("tableExists", True)
-
-            if self.__Table.table.getBoolean("Enabled", False) is True:
-
-                # Put code here using 'src' package.
-    '''
-
-
-if __name__ == '__main__':
-    try:
-        TXC = TXClient()
-    except Exception as e:
-        with open('txclientlog.txt', 'w') as f:
-            f.write(str(e))
-            f.write(traceback.format_exc())
+import time
+
+_started = time.perf_counter()
+
+import basicvislib5549 as bvl
+import comms
+import src
+
+import os
+
+import traceback
+import numpy as np
+
+_imported = time.perf_counter()
+
+'''
+    TXClient is the client code that will run on the Jetson TX2.
+
+    Upon initialization, presuming this is the main execution, it will run in a loop given an 'Enabled' and 'Mode'
+    key from SmartDashboard until it is terminated.
+    
+    Keys that should be established in SmartDashboard to control operations:
+        Enabled: True or False, should be set in SmartDashboard when a button is pressed, this key enables
+            running the programs on the Jetson.
+        Mode: May be set to a number inclusive of the range -1 to 3. 1 runs with single camera, 2 runs with two 
+            in vision processing, 3 solely streams video to SmartDashboard.
+        CameraStream: Boolean that can be toggled to True when using a camera on the robot, works with
+            _run() and _dualrun().
+        Camera: Toggles between cameras (cameraSoleStream only).
+
+    Frame time of every stage is recorded while running and published to the 'Diagnostics' subtable, and to a local
+    HTTP endpoint when a metricsPort is given.
+
+    While disabled (or Mode is -1) the loop blocks until a control key changes. While running it is paced to 'rate'
+    iterations per second and the number of iterations that overran their period is published as 'Missed Deadlines'.
+
+    Distance, yaw and skew of the target are solved from the tape contours with the camera intrinsics and distortion
+    of the 'calibration' file (OpenCV calibration format), or from 'fov' (horizontal degrees) when there is none.
+
+    Given a 'record' directory, every frame read from a camera is logged there with the control keys (see
+    basicvislib5549.FrameRecorder). Given a 'replay' directory of such logs, the cameras and the table are played back
+    from it instead, as fast as possible or in real time, with no hardware or network.
+
+    Cameras are owned by a basicvislib5549.CameraManager: each device is opened once and shared by every mode, and a
+    camera that is unplugged is reopened with backoff. Their frame rate and health are published once a second as
+    'Camera <device> FPS', 'Connected' and 'Reconnects'. A mode whose camera gives no frame publishes no targets.
+
+    Startup connects to the table, opens the 'preopen' cameras and warms up the pipeline on a blank frame concurrently,
+    and prints how long each phase took (also recorded as 'startup' stages of the metrics).
+
+    With 'detectEvery' above 1, single camera runs track the targets (see src.TargetTracker) and only search the full
+    frame every that many frames, the fraction of tracked targets seen on a frame is published as 'Target Confidence'.
+    The frames searched in full and only around the targets so far are published as 'Detections' and 'Verifications',
+    the frames tracked per second as 'Tracker FPS'.
+
+    With 'processes', every camera captures in its own process into a shared-memory ring (see
+    basicvislib5549.ProcessCamera) and the dashboard stream runs in another process reading the rings (see
+    comms.StreamProcess), so capture and streaming do not compete with the vision loop for the GIL. Frames are not
+    copied between the processes.
+
+    With 'pyramid', untracked single camera runs find the targets coarse to fine on the full-resolution frame (see
+    src.PyramidDetector), so the contours the pose is solved from keep the precision of the capture. The processing
+    resolution quality step does not apply to it.
+
+    While running, the time each iteration spends working is held against 'budget' (80% of the frame period by
+    default, see comms.QualityController). Over budget, quality is lowered a step at a time: the stream frame rate,
+    then the stream resolution, then the processing resolution, then detection on alternate frames only. It is raised
+    again once there is headroom. The level is published as 'Quality Level' and 'Quality', the measured frame time as
+    'Frame Time' (ms). Replays and a budget of 0 keep full quality.
+'''
+
+
+class TXClient:
+
+    ControlKeys = ("Mode", "Enabled", "Camera", "CameraStream")
+
+    def __init__(self, diagnostics=True, metricsPort=None, rate=30.0, record=None, replay=None, realtime=False,
+                 calibration=None, fov=60.0, detectEvery=1, preopen=('/dev/video1', '/dev/video2'),
+                 processes=False, budget=None, pyramid=False):
+
+        startup = comms.Startup(_started)
+        startup.record("imports", _started, _imported)
+
+        self.__record = record
+        self.__recorders = []
+        self.__replays = {}
+        self.__sources = {}
+        self.__cameras = None
+        self.__cameraTime = 0.0
+        self.__rings = {}
+        self.__streamer = None
+
+        if replay is not None:
+            clock = bvl.ReplayClock(realtime)
+            for device in ('/dev/video1', '/dev/video2'):
+                path = os.path.join(replay, os.path.basename(device))
+                if os.path.exists(path + '.index'):
+                    self.__replays[device] = bvl.ReplayCapture(path, clock)
+
+            if not self.__replays:
+                raise IOError("no FrameRecorder logs in %s" % replay)
+
+            self.__Table = comms.ReplayTable(self.__replays.values())
+            # Replay paces itself, as fast as possible or at the recorded rate.
+            rate = 0
+
+        else:
+            # Connects in the background, the cameras open and the pipeline warms up meanwhile.
+            self.__Table = comms.ConnectTable(wait=False)
+
+            if processes:
+                # Named after the device, so a segment left by a killed client is reclaimed on the next start.
+                self.__rings = {device: bvl.SharedFrameRing((480, 640, 3),
+                                                            name="bvl5549_%s" % os.path.basename(device))
+                                for device in ('/dev/video1', '/dev/video2')}
+                self.__cameras = bvl.CameraManager(lambda device: bvl.ProcessCamera(self.__rings[device], device))
+
+            else:
+                self.__cameras = bvl.CameraManager()
+
+        self.isReset = False
+        self.__vidstream = None
+        self.AsourceStatus = None
+        self.BsourceStatus = None
+        self.__metrics = bvl.Metrics(enabled=diagnostics)
+        self.__diagnostics = comms.Diagnostics(self.__metrics, self.__Table, port=metricsPort)
+        self.__dualworkers = None
+        self.__solver = src.TargetSolver.from_file(calibration) if calibration is not None \
+            else src.TargetSolver.from_fov(fov)
+        self.__pyramid = src.PyramidDetector(metrics=self.__metrics) if pyramid else None
+        self.__tracker = src.TargetTracker(every=detectEvery, compiled=True, metrics=self.__metrics) \
+            if detectEvery > 1 else None
+        # Control keys are kept up to date by entry listeners, the loop only reads attributes.
+        self.__state = self.__Table.subscribe({"Mode": -1, "Enabled": False, "Camera": 0, "CameraStream": False,
+                                               "Number": 0})
+        self.__scheduler = comms.LoopScheduler(self.__state, rate)
+
+        if budget is None:
+            budget = 0.8 / rate if rate > 0 else 0
+        self.__quality = comms.QualityController(budget, self.__Table) if budget > 0 else None
+        self.__skipped = 0
+
+        startup.start("connect", self.__Table.wait)
+        for device in preopen:
+            # A camera that fails to open here is retried by the first mode that uses it.
+            startup.start("open %s" % os.path.basename(device), self._preopen, device)
+        startup.start("warm-up", self._warmup)
+        startup.wait()
+
+        for name, (start, end) in startup.Phases.items():
+            self.__metrics.record("startup %s" % name, end - start)
+        print(startup.report())
+
+        marked = None
+
+        while self.__Table.Connected:
+            begin = time.perf_counter()
+            version = self.__state.Version
+
+            if version != marked:
+                # Key changes between frames are recorded too, so replay sees when the robot was disabled.
+                for recorder in self.__recorders:
+                    recorder.mark(self.__state)
+                marked = version
+
+            self.__Table.putBatch({"tableExists": True})
+            self.__diagnostics.publish()
+
+            mode = self.__state.Mode
+
+            if mode == 0:
+                self._test()
+
+            elif mode == 1:
+                self._run()
+
+                self.__avg_centers = []
+                self.__all_centers = []
+                self.__contour_dimensions = []
+
+            elif mode == 2:
+                self._dualrun()
+
+                self.__lavg_centers = []
+                self.__lall_centers = []
+                self.__lcontour_dimensions = []
+                self.__ravg_centers = []
+                self.__rall_centers = []
+                self.__rcontour_dimensions = []
+
+            elif mode == 3:
+                self._cameraSoleStream()
+
+            running = mode in (1, 2, 3) and self.__state.Enabled is True
+
+            if running:
+                self.__Table.putBatch({"Missed Deadlines": self.__scheduler.Missed})
+                self._publishCameras()
+                self._adapt(time.perf_counter() - begin)
+
+                if self.__recorders:
+                    self.__Table.putBatch({"Recording Dropped": sum(r.Dropped for r in self.__recorders)})
+
+            # Everything the mode wrote this iteration goes out as one update.
+            self.__Table.flush()
+
+            if running:
+                self.__scheduler.pace()
+
+            else:
+                self._stream(None)
+                # Nothing to do until a control key changes.
+                self.__scheduler.idle(version)
+
+        if self.__streamer is not None:
+            self.__streamer.close()
+
+        if self.__cameras is not None:
+            self.__cameras.close()
+
+        for ring in self.__rings.values():
+            ring.close()
+
+    @staticmethod
+    def _noTargets():
+
+        """Result of vision_assistance_contour(..., contours=True) for a camera that gave no frame."""
+
+        return (0, 0), np.zeros((0, 2), int), np.zeros((0, 4), np.int32), []
+
+    def _openSource(self, device):
+
+        """Gets the source of a camera, or its recording when replaying (None if there is none), and records it when
+        recording. Modes share a device's source."""
+
+        if self.__replays:
+            return self.__replays.get(device)
+
+        if device in self.__sources:
+            return self.__sources[device]
+
+        source = self.__cameras.open(device)
+
+        if self.__record is not None:
+            # Encoding and writing happen on the recorder's thread, the loop only copies the frame.
+            recorder = bvl.BackgroundRecorder(
+                bvl.FrameRecorder(os.path.join(self.__record, os.path.basename(device)), TXClient.ControlKeys))
+            self.__recorders.append(recorder)
+            source = bvl.RecordingSource(source, recorder, self.__state)
+
+        self.__sources[device] = source
+
+        return source
+
+    def _preopen(self, device):
+
+        """Opens a camera at startup, waiting for the first attempt."""
+
+        source = self._openSource(device)
+
+        if self.__cameras is not None:
+            return self.__cameras.open(device).wait()
+
+        return source is not None
+
+    def _read(self, device):
+
+        """Gets the newest frame of a camera, None if it gave none (disconnected, timed out or the replay ended)."""
+
+        source = self._openSource(device)
+        if source is None:
+            return None
+
+        ret, frame = source.read()
+
+        return frame if ret else None
+
+    def _publishCameras(self):
+
+        """Publishes the frame rate and health of every camera, once a second."""
+
+        now = time.monotonic()
+        if self.__cameras is None or now - self.__cameraTime < 1.0:
+            return
+
+        self.__cameraTime = now
+
+        for device, status in self.__cameras.status().items():
+            name = "Camera %s" % os.path.basename(device)
+            self.__Table.putBatch({"%s FPS" % name: status["fps"],
+                                   "%s Connected" % name: status["connected"],
+                                   "%s Reconnects" % name: max(0, status["connects"] - 1)})
+
+    def _warmup(self):
+
+        """Runs the pipeline once on a blank frame, so building the threshold table and OpenCV's lazy initialization
+        are not paid by the first real frame."""
+
+        frame = np.zeros((480, 640, 3), np.uint8)
+        src.Src.vision_assistance_contour(frame, compiled=True)
+        self.__solver.undistort_points(np.zeros((1, 2), int))
+
+    def _adapt(self, seconds):
+
+        """Records the working time of a running iteration, applies the quality level when it changes and publishes
+        it."""
+
+        if self.__quality is None:
+            return
+
+        if self.__quality.update(seconds):
+            self._applyQuality()
+
+        self.__quality.publish()
+
+    def _applyQuality(self):
+
+        """Applies the current quality level to the streams and pipelines that exist."""
+
+        if self.__quality is None:
+            return
+
+        level = self.__quality.Current
+
+        if self.__vidstream is not None:
+            self.__vidstream.fps = level.streamFps
+            self.__vidstream.scale = level.streamScale
+
+        if self.__streamer is not None:
+            self.__streamer.configure(level.streamFps, level.streamScale)
+
+        if self.__dualworkers is not None:
+            self.__dualworkers.kwargs["scale"] = level.processScale
+
+        if self.__tracker is not None:
+            # Tracked regions are processed at full resolution, under load the full frame is searched less often.
+            self.__tracker.roi.reacquire = self.__tracker.every * level.detectEvery
+
+    def _processScale(self):
+
+        """Gets the scale the pipeline processes frames at under the current quality level."""
+
+        return self.__quality.Current.processScale if self.__quality is not None else 1.0
+
+    def _detect(self):
+
+        """Whether this frame is searched for targets. Under load only every few frames are, and the last targets
+        stay published in between."""
+
+        every = self.__quality.Current.detectEvery if self.__quality is not None else 1
+        detect = self.__skipped == 0
+        self.__skipped = (self.__skipped + 1) % every
+
+        return detect
+
+    def _videoStream(self):
+
+        """Gets the VideoStream, started by the first mode that streams so the others never load cscore."""
+
+        if self.__vidstream is None:
+            self.__vidstream = comms.VideoStream()
+            self._applyQuality()
+
+        return self.__vidstream
+
+    def _stream(self, device, frame=None, rotation=0):
+
+        """Streams the frame of a camera to the dashboard, or stops streaming when device is None. In the
+        multi-process layout the stream process reads the camera itself and frame is not used."""
+
+        if self.__rings:
+            if device is None:
+                if self.__streamer is not None:
+                    self.__streamer.hide()
+
+            else:
+                if self.__streamer is None:
+                    self.__streamer = comms.StreamProcess(self.__rings)
+                    self._applyQuality()
+                self.__streamer.show(device, rotation)
+
+        elif device is not None:
+            self._videoStream().rotation = rotation
+            self._videoStream().putFrame(frame)
+
+    def _visReset(self):
+
+        """Method to reset variables after finishing loop and be ready for enabling. Reset code goes here."""
+
+        if self.__tracker is not None:
+            self.__tracker.reset()
+
+        return
+
+    def _cameraSoleStream(self):
+
+        if self.__state.Enabled is True:
+            # Only the streamed camera is read.
+            if self.__state.Camera == 0:
+                device = '/dev/video2'
+                source = self._read(device)
+                self.BsourceStatus = source is not None
+
+            elif self.__state.Camera == 1:
+                device = '/dev/video1'
+                source = self._read(device)
+                self.AsourceStatus = source is not None
+
+            else:
+                source = None
+
+            if source is not None:
+                with self.__metrics.timer("stream"):
+                    self._stream(device, source)
+
+            else:
+                self._stream(None)
+
+    def _dualrun(self):
+
+        if self.__state.Enabled is True:
+            if self.__dualworkers is None:
+                # Both cameras are read and processed concurrently, frames more than a frame period apart are re-read.
+                self.__dualworkers = src.CameraWorkers(
+                    [self._openSource('/dev/video1'), self._openSource('/dev/video2')],
+                    maxSkew=1 / 30, metrics=self.__metrics, compiled=True, contours=True, scale=self._processScale())
+
+            if not self._detect():
+                # Skipped under load, the last targets stay published and only the stream is fed.
+                frame = self._read('/dev/video1') if self.__state.CameraStream is True else None
+
+                if frame is not None:
+                    with self.__metrics.timer("stream"):
+                        self._stream('/dev/video1', frame, -90)
+
+                else:
+                    self._stream(None)
+
+                return
+
+            with self.__metrics.timer("vision"):
+                left, right = self.__dualworkers.process()
+
+            self.AsourceStatus = left.ret
+            self.BsourceStatus = right.ret
+            self.__lavg_centers, self.__lall_centers, self.__lcontour_dimensions, lcontours = \
+                left.result or self._noTargets()
+            self.__ravg_centers, self.__rall_centers, self.__rcontour_dimensions, rcontours = \
+                right.result or self._noTargets()
+            self.isReset = False
+
+            with self.__metrics.timer("solve"):
+                lpose = self.__solver.solve(lcontours)
+                rpose = self.__solver.solve(rcontours)
+
+            with self.__metrics.timer("publish"):
+                self.__Table.putBatch({"Left Target Found": lpose is not None,
+                                       "Right Target Found": rpose is not None})
+
+                # The last values stay published while a camera has lost the target.
+                if lpose is not None:
+                    self.__Table.putBatch({"Left Camera Direction": lpose.yaw,
+                                           "Left Camera Distance": lpose.distance,
+                                           "Left Camera Skew": lpose.skew})
+
+                if rpose is not None:
+                    self.__Table.putBatch({"Right Camera Direction": rpose.yaw,
+                                           "Right Camera Distance": rpose.distance,
+                                           "Right Camera Skew": rpose.skew})
+
+            if self.__state.CameraStream is True and left.ret:
+                with self.__metrics.timer("stream"):
+                    # Rotated on the stream thread.
+                    self._stream('/dev/video1', left.frame, -90)
+
+            else:
+                self._stream(None)
+
+        elif self.isReset is False and self.__state.Enabled is False:
+            self._visReset()
+            self.isReset = True
+
+    def _run(self):
+
+        """Single run only. Recommended for flexibility on termination."""
+
+        if self.__state.Enabled is True:
+            with self.__metrics.timer("capture"):
+                source = self._read('/dev/video1')
+                self.AsourceStatus = source is not None
+
+            if source is not None and self.__tracker is None and not self._detect():
+                # Skipped under load, the last targets stay published. The tracker keeps its own cadence.
+                if self.__state.CameraStream is True:
+                    with self.__metrics.timer("stream"):
+                        self._stream('/dev/video1', source)
+
+                else:
+                    self._stream(None)
+
+                return
+
+            with self.__metrics.timer("vision"):
+                if source is None:
+                    self.__avg_centers, self.__all_centers, self.__contour_dimensions, contours = self._noTargets()
+
+                elif self.__tracker is not None:
+                    self.__avg_centers, self.__all_centers, self.__contour_dimensions = \
+                        self.__tracker.process(source)
+                    contours = self.__tracker.Contours
+
+                else:
+                    self.__avg_centers, self.__all_centers, self.__contour_dimensions, contours = \
+                        src.Src.vision_assistance_contour(source, compiled=True, metrics=self.__metrics,
+                                                          contours=True, scale=self._processScale(),
+                                                          pyramid=self.__pyramid)
+            self.isReset = False
+
+            with self.__metrics.timer("solve"):
+                pose = self.__solver.solve(contours)
+
+            with self.__metrics.timer("publish"):
+                self.__Table.putBatch({"contour centers": [float(c) for c in self.__avg_centers],
+                                       "all visible contour centers": np.ravel(self.__all_centers).tolist(),
+                                       "all contour dimensions": np.ravel(self.__contour_dimensions).tolist(),
+                                       "Target Found": pose is not None})
+
+                if self.__tracker is not None:
+                    self.__Table.putBatch({"Target Confidence": self.__tracker.Confidence,
+                                           "Tracker FPS": self.__tracker.Rate,
+                                           "Detections": self.__tracker.Detections,
+                                           "Verifications": self.__tracker.Verifications})
+
+                # The last values stay published while the target is lost.
+                if pose is not None:
+                    self.__Table.putBatch({"Direction": pose.yaw,
+                                           "Camera Distance": pose.distance,
+                                           "Skew": pose.skew})
+
+            if self.__state.CameraStream is True and source is not None:
+                with self.__metrics.timer("stream"):
+                    self._stream('/dev/video1', source)
+
+            else:
+                self._stream(None)
+
+        elif self.isReset is False and self.__state.Enabled is False:
+            self._visReset()
+            self.isReset = True
+
+    def _test(self):
+
+        """Test for connection and enabling"""
+        if self.__state.Enabled is True:
+            if self.__state.Number == 1:
+                self.__Table.putBatch({"Number": 0})
+
+    '''def looprun(self):
+
+        """Run function looping itself."""
+
+        while self.__Table.Connected:
+            self.__Table.table.putBoolean("tableExists", True)
+
+            if self.__Table.table.getBoolean("Enabled", False) is True:
+
+                # Put code here using 'src' package.
+    '''
+
+
+if __name__ == '__main__':
+    try:
+        TXC = TXClient()
+    except Exception as e:
+        with open('txclientlog.txt', 'w') as f:
+            f.write(str(e))
+            f.write(traceback.format_exc())
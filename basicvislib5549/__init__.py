@@ -1,2 +1,13 @@
-from .robotvisionlib import RobotVision
-from .camlib import CamLib
\ No newline at end of file
+from .robotvisionlib import RobotVision
+from .camlib import CamLib
+from .framegrabber import FrameGrabber
+from .cameramanager import CameraManager, ManagedCamera
+from .sharedring import SharedFrameRing, RingReader, ProcessCamera
+from .compiledthreshold import CompiledThreshold
+from .framepool import FramePool
+from .framecontext import FrameContext
+from .pipelinegraph import PipelineGraph
+from .hsvcalibration import HsvCalibration
+from .metrics import Metrics
+from .framelog import FrameLog, FrameRecorder, RecordingSource, ReplayClock, ReplayCapture
+from .recorder import BackgroundRecorder, VideoSegments
\ No newline at end of file
@@ -0,0 +1,235 @@
+import threading
+import time
+
+from .camlib import CamLib
+
+"""
+Ownership of the cameras. Every device is opened once, on a background thread, and the same capture is handed to every
+user of it, so switching modes never reopens a camera. When a camera stops delivering (unplugged, driver reset) it is
+released and reopened with exponential backoff while reads keep returning (False, None) instead of blocking.
+"""
+
+
+class ManagedCamera:
+    """
+    A camera kept open by a CameraManager.
+
+    Usage: Obtained from CameraManager.open(). Has the read()/read_stamped() contract of a FrameGrabber; while the
+    camera is not connected reads return (False, None) right away.
+        Variables:
+            self.Device: The device path or PlatformType it opens.
+            self.Connected: Whether the camera is open and delivering frames.
+            self.Connects: Number of times the camera was opened.
+            self.Disconnects: Number of times it was lost after being opened.
+            self.Backoff: Seconds until the next open attempt while disconnected.
+            self.Fps: Frames captured per second, updated by status().
+            self.Error: Description of the last failure, None if there was none.
+    """
+
+    def __init__(self, device, opener, minBackoff, maxBackoff):
+        self.Device = device
+        self.Connected = False
+        self.Connects = 0
+        self.Disconnects = 0
+        self.Backoff = minBackoff
+        self.Fps = 0.0
+        self.Error = None
+
+        self._opener = opener
+        self._minBackoff = minBackoff
+        self._maxBackoff = maxBackoff
+        self._source = None
+        self._cond = threading.Condition()
+        self._running = True
+        self._attempted = False
+        self._rate = (time.monotonic(), 0, 0)
+
+        self._thread = threading.Thread(target=self._connect, name="ManagedCamera %s" % device, daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._source is None)
+                if not self._running:
+                    return
+
+            source = None
+            try:
+                source = self._opener(self.Device)
+                if not source.isOpened():
+                    # Sources that know why they failed say so.
+                    raise IOError(getattr(source, 'Error', None) or "could not open %s" % self.Device)
+
+            except Exception as e:
+                if source is not None:
+                    source.release()
+
+                with self._cond:
+                    self.Error = str(e)
+                    self._attempted = True
+                    self._cond.notify_all()
+                    # Woken early by close().
+                    self._cond.wait(self.Backoff)
+                    self.Backoff = min(self.Backoff * 2, self._maxBackoff)
+
+                continue
+
+            with self._cond:
+                if not self._running:
+                    source.release()
+                    return
+
+                self._source = source
+                self._attempted = True
+                self.Connected = True
+                self.Connects += 1
+                self.Backoff = self._minBackoff
+                self._rate = (time.monotonic(), self._captured(), self._rate[2])
+                self._cond.notify_all()
+
+    def _captured(self):
+        # FrameGrabbers count the frames they capture, plain captures only the frames read.
+        return getattr(self._source, 'Captured', self._rate[2])
+
+    def _lost(self, source):
+        with self._cond:
+            if self._source is not source:
+                return
+
+            self._source = None
+            self.Connected = False
+            self.Disconnects += 1
+            self.Error = getattr(source, 'Error', None) or "%s stopped delivering frames" % self.Device
+            self._cond.notify_all()
+
+        source.release()
+
+    def wait(self, timeout=None):
+        """Waits for the first open attempt to finish.
+        Returns:
+            self.Connected.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._attempted or not self._running, timeout)
+
+        return self.Connected
+
+    def read_stamped(self):
+        """Gets the newest frame.
+        Returns:
+            A (ret, frame, timestamp) tuple, (False, None, 0.0) while disconnected.
+        """
+        source = self._source
+        if source is None:
+            return False, None, 0.0
+
+        if hasattr(source, 'read_stamped'):
+            ret, frame, stamp = source.read_stamped()
+        else:
+            ret, frame = source.read()
+            stamp = time.monotonic()
+
+        if ret:
+            self._rate = self._rate[:2] + (self._rate[2] + 1,)
+
+        elif not source.isOpened():
+            # A timeout of a live camera keeps it, a dead capture is replaced.
+            self._lost(source)
+
+        return ret, frame, stamp
+
+    def read(self):
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def isOpened(self):
+        return self.Connected
+
+    def get(self, propId):
+        source = self._source
+        return source.get(propId) if source is not None else 0.0
+
+    def set(self, propId, value):
+        source = self._source
+        return source.set(propId, value) if source is not None else False
+
+    def status(self):
+        """Gets the health of the camera, measuring the frame rate since the last call.
+        Returns:
+            A dict of connected, fps, connects, disconnects, backoff and error.
+        """
+        now = time.monotonic()
+        with self._cond:
+            last, captured, reads = self._rate
+            current = self._captured() if self._source is not None else captured
+
+            if now > last:
+                self.Fps = (current - captured) / (now - last) if self.Connected else 0.0
+            self._rate = (now, current, reads)
+
+        return {"connected": self.Connected, "fps": self.Fps, "connects": self.Connects,
+                "disconnects": self.Disconnects, "backoff": self.Backoff, "error": self.Error}
+
+    def release(self):
+        """Stops reconnecting and releases the capture. The CameraManager owns its cameras, use close() there."""
+        with self._cond:
+            self._running = False
+            source, self._source = self._source, None
+            self.Connected = False
+            self._cond.notify_all()
+
+        if source is not None:
+            source.release()
+
+        self._thread.join(1.0)
+
+
+class CameraManager:
+    """
+    Owner of one ManagedCamera per device.
+
+    Usage: open() a device wherever it is needed, every call for the same device returns the same camera. Call close()
+    once at shutdown.
+        Params:
+            opener: Function from a device to an opened source, CamLib.cv_threaded_source by default.
+            minBackoff: Seconds before the first reopen attempt of a lost or missing camera.
+            maxBackoff: Longest wait between attempts, the wait doubles after each failed one.
+    """
+
+    def __init__(self, opener=None, minBackoff=0.25, maxBackoff=8.0):
+        self.opener = opener if opener is not None else CamLib.cv_threaded_source
+        self.minBackoff = minBackoff
+        self.maxBackoff = maxBackoff
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    def open(self, device):
+        """Gets the camera of a device, starting to open it in the background the first time.
+        Returns:
+            The ManagedCamera, which reads (False, None) until it is connected.
+        """
+        with self._lock:
+            camera = self._cameras.get(device)
+            if camera is None:
+                camera = self._cameras[device] = ManagedCamera(device, self.opener, self.minBackoff, self.maxBackoff)
+
+        return camera
+
+    def cameras(self):
+        """Gets every camera opened so far, as a dict of device to ManagedCamera."""
+        with self._lock:
+            return dict(self._cameras)
+
+    def status(self):
+        """Gets ManagedCamera.status() of every camera, as a dict of device to status."""
+        return {device: camera.status() for device, camera in self.cameras().items()}
+
+    def close(self):
+        """Releases every camera."""
+        with self._lock:
+            cameras, self._cameras = list(self._cameras.values()), {}
+
+        for camera in cameras:
+            camera.release()
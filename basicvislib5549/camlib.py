@@ -1,166 +1,202 @@
-import numpy as np
-import cv2
-
-
-class CamLib(object):
-    class PlatformType:
-        USB_CAM_LINUX = -1
-        USB_CAM_WIN = -2
-        JETSON_TX2_INT = -3
-
-    class SourceType:
-        CAMERA = 0
-        VIDEO = 1
-        IMAGE_ELSE = 2
-
-    @staticmethod
-    def cv_video_source(platform):
-        """Gets a camera/video source.
-        Args:
-            platform: A PlatformType or a custom camera string.
-        Returns:
-            A VideoCapture object.
-        """
-
-        if platform is -1:
-
-            try:
-                camSrc = cv2.VideoCapture("/dev/video1")
-
-            except:
-                raise ("Error, Video source not found [USB_CAM_LINUX]")
-
-        elif platform is -2:
-
-            try:
-                camSrc = cv2.VideoCapture(0)
-
-            except:
-                raise ("Error, Video source not found [USB_CAM_WIN]")
-
-        elif platform is -3:
-
-            try:
-                camSrc = cv2.VideoCapture(
-                    "nvcamerasrc ! video/x-raw(memory:NVMM), width=(int)640, height=(int)480, format=(string)I420, framerate=(fraction)30/1 ! nvvidconv flip-method=0 ! video/x-raw, format=(string)I420 ! videoconvert ! video/x-raw, format=(string)BGR ! appsink")
-
-            except:
-                raise ("Error, Video source not found [JETSON_TX2_INT]")
-
-        else:
-
-            try:
-                camSrc = cv2.VideoCapture(platform)
-
-            except:
-                raise ("Error, Video source not found [Custom Input]")
-
-        return camSrc
-
-    @staticmethod
-    def cv_display_source(videosrc, width, height, title, istype, **kwargs):
-        """Displays a cv2.VideoCapture to a window.
-        Args:
-            videosrc: A source. Can be an image (imread) or video (VideoCapture).
-            width: Width of video. 0 to automatically set width.
-            height: Height of video. 0 to automatically set height.
-            title: Title of window.
-            istype: A SourceType representing whether the feed from the source is a video or a live feed.
-            kwarg - keyexit: Value ID of keyboard key. If this value is True then the default key will be 'q'.
-        Returns:
-            A feed from the source in a new window.
-
-        Note: If threading with display source, please use different source objects as inputs.
-        """
-        keyexit = kwargs.get('keyexit', True)
-
-        if isinstance(videosrc, cv2.VideoCapture) is not True and istype is not 2:
-            raise ("Error, object provided is not cv2.VideoCapture object")
-        elif isinstance(videosrc, cv2.VideoCapture) is True and istype is 2:
-            raise ("Error, expected image as source.")
-
-        if isinstance(videosrc, cv2.VideoCapture) is True:
-
-            if width is 0:
-                width = int(videosrc.get(3))
-
-            if height is 0:
-                height = int(videosrc.get(4))
-        elif isinstance(videosrc, np.ndarray) is True:
-
-            if width is 0:
-                width = int(videosrc.shape[1])
-
-            if height is 0:
-                height = int(videosrc.shape[0])
-
-
-        if (keyexit is True) or (keyexit is False and istype is 2):
-            keyexit = 'q'
-
-        if istype is 0:
-            fps = 10
-        elif istype is 1:
-            fps = int(videosrc.get(cv2.CAP_PROP_FPS)) * 10
-
-        windowName = "cv2WindowDisplay"
-        cv2.namedWindow(windowName, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(windowName, width, height)
-        cv2.setWindowTitle(windowName, title)
-
-        if istype is not 2:
-
-            while videosrc.isOpened():
-
-                if cv2.getWindowProperty(windowName, 0) < 0:
-                    videosrc.release()
-                ret, frame = videosrc.read()
-                cv2.imshow(windowName, frame)
-                if keyexit is not False:
-                    if cv2.waitKey(100) & 0xFF is ord(keyexit):
-                        cv2.destroyWindow(windowName)
-                        videosrc.release()
-
-                cv2.waitKey(fps)
-
-        elif istype is 2 and isinstance(videosrc, np.ndarray) is True:
-            cv2.imshow(windowName, videosrc)
-            if cv2.waitKey(0) & 0xFF is ord(keyexit):
-                cv2.destroyWindow(windowName)
-
-    @staticmethod
-    def cv_write_video_stream(videosrc, width, height, videoname, keyexit):
-        """Displays a cv2.VideoCapture to a window.
-                Args:
-                    videosrc: A VideoCapture object.
-                    width: Video width. 0 to set automatically.
-                    height: Video height. 0 to set automatically.
-                    videoname: Name of video file to be output.
-                    keyexit: Value ID of keyboard key.
-                Returns:
-                    No values, runs stream to file until key is pressed.
-                """
-        if isinstance(videosrc, cv2.VideoCapture) is not True:
-            raise ("Error, video source provided is not a cv2.VideoCapture")
-
-        if width is 0:
-            width = int(videosrc.get(3))
-
-        if height is 0:
-            height = int(videosrc.get(4))
-
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-        out = cv2.VideoWriter('%s.avi' % videoname, fourcc, 30, (width, height))
-
-        while True:
-            ret, frame = videosrc.read()
-            if ret is True:
-                out.write(frame)
-                if cv2.waitKey(1) & 0xFF is ord(keyexit):
-                    break
-
-            else:
-                break
-
-        videosrc.release()
-        out.release()
\ No newline at end of file
+import numpy as np
+import cv2
+
+from .framegrabber import FrameGrabber
+from .recorder import BackgroundRecorder, VideoSegments
+
+
+class CamLib(object):
+    class PlatformType:
+        USB_CAM_LINUX = -1
+        USB_CAM_WIN = -2
+        JETSON_TX2_INT = -3
+
+    class SourceType:
+        CAMERA = 0
+        VIDEO = 1
+        IMAGE_ELSE = 2
+
+    @staticmethod
+    def cv_video_source(platform):
+        """Gets a camera/video source.
+        Args:
+            platform: A PlatformType or a custom camera string.
+        Returns:
+            A VideoCapture object.
+        """
+
+        if platform is -1:
+
+            try:
+                camSrc = cv2.VideoCapture("/dev/video1")
+
+            except:
+                raise ("Error, Video source not found [USB_CAM_LINUX]")
+
+        elif platform is -2:
+
+            try:
+                camSrc = cv2.VideoCapture(0)
+
+            except:
+                raise ("Error, Video source not found [USB_CAM_WIN]")
+
+        elif platform is -3:
+
+            try:
+                camSrc = cv2.VideoCapture(
+                    "nvcamerasrc ! video/x-raw(memory:NVMM), width=(int)640, height=(int)480, format=(string)I420, framerate=(fraction)30/1 ! nvvidconv flip-method=0 ! video/x-raw, format=(string)I420 ! videoconvert ! video/x-raw, format=(string)BGR ! appsink")
+
+            except:
+                raise ("Error, Video source not found [JETSON_TX2_INT]")
+
+        else:
+
+            try:
+                camSrc = cv2.VideoCapture(platform)
+
+            except:
+                raise ("Error, Video source not found [Custom Input]")
+
+        return camSrc
+
+    @staticmethod
+    def cv_threaded_source(platform, buffers=3):
+        """Gets a camera/video source that captures on a background thread.
+        Args:
+            platform: A PlatformType or a custom camera string.
+            buffers: Number of preallocated frame buffers to rotate through.
+        Returns:
+            A FrameGrabber, which has the same read() contract as a VideoCapture but always returns the newest frame.
+        """
+
+        return FrameGrabber(CamLib.cv_video_source(platform), buffers)
+
+    @staticmethod
+    def cv_display_source(videosrc, width, height, title, istype, **kwargs):
+        """Displays a cv2.VideoCapture to a window.
+        Args:
+            videosrc: A source. Can be an image (imread) or video (VideoCapture).
+            width: Width of video. 0 to automatically set width.
+            height: Height of video. 0 to automatically set height.
+            title: Title of window.
+            istype: A SourceType representing whether the feed from the source is a video or a live feed.
+            kwarg - keyexit: Value ID of keyboard key. If this value is True then the default key will be 'q'.
+        Returns:
+            A feed from the source in a new window.
+
+        Note: If threading with display source, please use different source objects as inputs.
+        """
+        keyexit = kwargs.get('keyexit', True)
+
+        if isinstance(videosrc, cv2.VideoCapture) is not True and istype is not 2:
+            raise ("Error, object provided is not cv2.VideoCapture object")
+        elif isinstance(videosrc, cv2.VideoCapture) is True and istype is 2:
+            raise ("Error, expected image as source.")
+
+        if isinstance(videosrc, cv2.VideoCapture) is True:
+
+            if width is 0:
+                width = int(videosrc.get(3))
+
+            if height is 0:
+                height = int(videosrc.get(4))
+        elif isinstance(videosrc, np.ndarray) is True:
+
+            if width is 0:
+                width = int(videosrc.shape[1])
+
+            if height is 0:
+                height = int(videosrc.shape[0])
+
+
+        if (keyexit is True) or (keyexit is False and istype is 2):
+            keyexit = 'q'
+
+        if istype is 0:
+            fps = 10
+        elif istype is 1:
+            fps = int(videosrc.get(cv2.CAP_PROP_FPS)) * 10
+
+        windowName = "cv2WindowDisplay"
+        cv2.namedWindow(windowName, cv2.WINDOW_NORMAL)
+        cv2.resizeWindow(windowName, width, height)
+        cv2.setWindowTitle(windowName, title)
+
+        if istype is not 2:
+
+            while videosrc.isOpened():
+
+                if cv2.getWindowProperty(windowName, 0) < 0:
+                    videosrc.release()
+                ret, frame = videosrc.read()
+                cv2.imshow(windowName, frame)
+                if keyexit is not False:
+                    if cv2.waitKey(100) & 0xFF is ord(keyexit):
+                        cv2.destroyWindow(windowName)
+                        videosrc.release()
+
+                cv2.waitKey(fps)
+
+        elif istype is 2 and isinstance(videosrc, np.ndarray) is True:
+            cv2.imshow(windowName, videosrc)
+            if cv2.waitKey(0) & 0xFF is ord(keyexit):
+                cv2.destroyWindow(windowName)
+
+    @staticmethod
+    def cv_background_recorder(videoname, fps=30, segment=0, queue=8, policy='newest'):
+        """Gets a recorder writing MJPG video on a background thread.
+        Args:
+            videoname: Path of the video without extension, files are named <videoname>.<segment>.avi.
+            fps: Frame rate written to the files.
+            segment: Frames per file, 0 for a single file.
+            queue: Most frames waiting to be written.
+            policy: What to do with frames when the queue is full, see BackgroundRecorder.
+        Returns:
+            A BackgroundRecorder, call put() with each frame and close() at the end.
+        """
+
+        return BackgroundRecorder(VideoSegments(videoname, fps, 'MJPG', segment), queue, policy)
+
+    @staticmethod
+    def cv_write_video_stream(videosrc, width, height, videoname, keyexit):
+        """Records a cv2.VideoCapture to a file until a key is pressed or the source ends.
+                Args:
+                    videosrc: A VideoCapture object.
+                    width: Video width. 0 to set automatically.
+                    height: Video height. 0 to set automatically.
+                    videoname: Name of video file to be output, written as <videoname>.avi.
+                    keyexit: Value ID of keyboard key.
+                Returns:
+                    No values, runs stream to file until key is pressed.
+
+                Note: Frames are encoded on the calling thread. cv_background_recorder records on a background thread
+                    instead, into <videoname>.<segment>.avi files with frame-index sidecars.
+                """
+        if isinstance(videosrc, cv2.VideoCapture) is not True:
+            raise ValueError("Error, video source provided is not a cv2.VideoCapture")
+
+        if width == 0:
+            width = int(videosrc.get(3))
+
+        if height == 0:
+            height = int(videosrc.get(4))
+
+        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
+        out = cv2.VideoWriter('%s.avi' % videoname, fourcc, 30, (width, height))
+
+        while True:
+            ret, frame = videosrc.read()
+            if ret is True:
+                if frame.shape[1] != width or frame.shape[0] != height:
+                    frame = cv2.resize(frame, (width, height))
+
+                out.write(frame)
+                if cv2.waitKey(1) & 0xFF == ord(keyexit):
+                    break
+
+            else:
+                break
+
+        videosrc.release()
+        out.release()
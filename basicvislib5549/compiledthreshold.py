@@ -0,0 +1,134 @@
+import sys
+import threading
+
+import numpy as np
+import cv2
+
+from .robotvisionlib import RobotVision
+
+"""
+Lookup table that fuses RobotVision.brightness_contrast and RobotVision.hsv_threshold into a single function from a
+BGR pixel to a mask value, built once for a set of parameters and then applied to every frame in one pass.
+"""
+
+
+class CompiledThreshold:
+    """
+    Precompiled BGR to mask lookup table.
+
+    Usage: Construct with the brightness/contrast/HSV parameters used by the contour pipeline, then call apply() on
+    each frame. Call update() with the current parameters every frame; the table is only rebuilt when they change.
+        Params:
+            brightness: Brightness value for RobotVision.brightness_contrast.
+            contrast: Contrast value for RobotVision.brightness_contrast.
+            hue: A list of two numbers that are the min and max hue.
+            sat: A list of two numbers that are the min and max saturation.
+            val: A list of two numbers that are the min and max value.
+            bits: Bits kept per channel. 8 builds the full 16MB table and is bit-identical to the two-stage chain,
+                fewer bits build a (2^bits)^3 table sampled at the center of each cell.
+        Variables:
+            self.Builds: Number of times the table has been (re)built.
+    """
+
+    def __init__(self, brightness, contrast, hue, sat, val, bits=8):
+        if not 1 <= bits <= 8:
+            raise ValueError("CompiledThreshold bits must be between 1 and 8")
+
+        self.Builds = 0
+        self._key = None
+        self._bits = bits
+        self._lut = None
+        # Index buffers are per thread so one table can serve several camera workers at once.
+        self._local = threading.local()
+
+        self.update(brightness, contrast, hue, sat, val)
+
+    def update(self, brightness, contrast, hue, sat, val):
+        """Rebuilds the table if any of the parameters differ from the ones it was built with.
+        Returns:
+            True if the table was rebuilt.
+        """
+        key = (brightness, contrast, tuple(hue), tuple(sat), tuple(val))
+        if key == self._key:
+            return False
+
+        self._key = key
+        self._lut = self._build(brightness, contrast, hue, sat, val)
+        self.Builds += 1
+
+        return True
+
+    def _build(self, brightness, contrast, hue, sat, val):
+        levels = 1 << self._bits
+        shift = 8 - self._bits
+        # Sample each quantization cell at its center, for 8 bits this is every value.
+        values = (np.arange(levels, dtype=np.uint16) << shift) + ((1 << shift) >> 1)
+        values = values.astype(np.uint8)
+
+        lut = np.empty((levels, levels, levels), np.uint8)
+
+        # Table is laid out as [r, g, b] so the index of a pixel is b + levels * g + levels^2 * r.
+        # Built a slab of reds at a time so the float64 temporaries stay small.
+        slab = max(1, 4096 // levels)
+        for r0 in range(0, levels, slab):
+            r1 = min(levels, r0 + slab)
+            grid = np.empty((r1 - r0, levels, levels, 3), np.uint8)
+            grid[..., 0] = values[None, None, :]
+            grid[..., 1] = values[None, :, None]
+            grid[..., 2] = values[r0:r1, None, None]
+            grid = grid.reshape(((r1 - r0) * levels, levels, 3))
+
+            adjusted = RobotVision.brightness_contrast(grid, brightness, contrast)
+            mask = RobotVision.hsv_threshold(adjusted, hue, sat, val)
+
+            lut[r0:r1] = mask.reshape((r1 - r0, levels, levels))
+
+        return lut.reshape(-1)
+
+    def _buffers(self, shape):
+        local = self._local
+        index = getattr(local, 'index', None)
+        if index is None or index.shape[0] < shape[0] or index.shape[1] < shape[1]:
+            # np.take works on intp indices and would otherwise convert them on every call. The upper bytes are
+            # never written by mixChannels, so they stay zero. Buffers only grow, smaller frames (regions) use views.
+            grown = (max(shape[0], index.shape[0]), max(shape[1], index.shape[1])) if index is not None else shape
+            local.index = np.zeros(grown, np.intp)
+            local.scratch = np.empty(grown, np.intp)
+
+        index = local.index[:shape[0], :shape[1]]
+        scratch = local.scratch[:shape[0], :shape[1]]
+
+        return index, scratch, index.view(np.uint8).reshape(shape + (index.itemsize,))
+
+    def apply(self, frame, out=None):
+        """Thresholds a frame through the table.
+        Args:
+            frame: A BGR numpy.ndarray of uint8.
+            out: Optional uint8 numpy.ndarray of the frame's height and width to write the mask into.
+        Returns:
+            A black and white numpy.ndarray, equal to hsv_threshold(brightness_contrast(frame)) when bits is 8.
+        """
+        shape = frame.shape[:2]
+        index, scratch, indexbytes = self._buffers(shape)
+
+        if out is None:
+            out = np.empty(shape, np.uint8)
+
+        if self._bits == 8 and sys.byteorder == 'little':
+            # Copy b, g, r into the low three bytes of each index, which is b + 256 * g + 65536 * r.
+            cv2.mixChannels([frame], [indexbytes], [0, 0, 1, 1, 2, 2])
+
+        else:
+            shift = 8 - self._bits
+            bits = self._bits
+            np.right_shift(frame[..., 2], shift, out=index, dtype=np.intp)
+            np.left_shift(index, 2 * bits, out=index)
+            np.right_shift(frame[..., 1], shift, out=scratch, dtype=np.intp)
+            np.left_shift(scratch, bits, out=scratch)
+            np.bitwise_or(index, scratch, out=index)
+            np.right_shift(frame[..., 0], shift, out=scratch, dtype=np.intp)
+            np.bitwise_or(index, scratch, out=index)
+
+        np.take(self._lut, index, out=out, mode='clip')
+
+        return out
@@ -0,0 +1,173 @@
+import cv2
+
+from .framepool import FramePool
+from .robotvisionlib import RobotVision
+
+"""
+Per-frame memo of intermediate images. Several pipelines run on the same frame (contours, camshift, meanshift) each
+start by resizing, blurring or converting it to HSV; through a FrameContext the first one to need an intermediate
+computes it and the others reuse it. Everything is forgotten when the next frame arrives.
+"""
+
+
+class FrameContext:
+    """
+    Lazily computed, memoized intermediates of the current frame.
+
+    Usage: Call read(capture) or update(frame) once per frame, then pass the context to the pipelines (e.g.
+    Src.vision_assistance_contour(frame, context=context)). Pipelines call update() themselves, which is a no-op for
+    the current frame, so a new frame array also resets the context on its own. Sources that reuse their buffers
+    (FrameGrabber) hand out the same array for different frames, give update() their timestamps or use read().
+        Params:
+            pool: FramePool the intermediates are computed into, a new one if None. The buffers are overwritten on the
+                next frame, copy anything kept longer.
+        Variables:
+            self.Frame: The current frame.
+            self.Timestamp: Timestamp of the current frame, None if not given.
+            self.Frames: Number of frames seen.
+            self.Hits: Lookups that reused an intermediate.
+            self.Misses: Lookups that had to compute it.
+            self.Counts: Dict of intermediate name to its [hits, misses].
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else FramePool()
+        self._memo = {}
+
+        self.Frame = None
+        self.Timestamp = None
+        self.Frames = 0
+        self.Hits = 0
+        self.Misses = 0
+        self.Counts = {}
+
+    def update(self, frame, timestamp=None):
+        """Makes a frame the current one, dropping every intermediate of the previous frame.
+        Args:
+            frame: The new frame.
+            timestamp: Capture time of the frame, tells apart frames delivered in the same buffer.
+        Returns:
+            True if the frame is new, False if it is already the current frame.
+        """
+        if frame is self.Frame and (timestamp is None or timestamp == self.Timestamp):
+            return False
+
+        self._memo.clear()
+        self.Frame = frame
+        self.Timestamp = timestamp
+        self.Frames += 1
+
+        return True
+
+    def read(self, source):
+        """Reads the next frame of a capture and makes it the current one.
+        Args:
+            source: A cv2.VideoCapture, FrameGrabber or anything else with their read() contract.
+        Returns:
+            The (ret, frame) of the read.
+        """
+        if hasattr(source, "read_stamped"):
+            ret, frame, timestamp = source.read_stamped()
+        else:
+            ret, frame = source.read()
+            timestamp = None
+
+        if ret:
+            # Always a new frame, whatever buffer it came in.
+            self.Frame = None
+            self.update(frame, timestamp)
+
+        return ret, frame
+
+    def get(self, name, compute):
+        """Gets an intermediate of the current frame, computing it on first use.
+        Args:
+            name: Key of the intermediate, including every parameter it depends on.
+            compute: Function without arguments that computes it.
+        Returns:
+            The memoized result of compute().
+        """
+        counts = self.Counts.get(name)
+        if counts is None:
+            counts = self.Counts[name] = [0, 0]
+
+        try:
+            result = self._memo[name]
+
+        except KeyError:
+            result = self._memo[name] = compute()
+            counts[1] += 1
+            self.Misses += 1
+
+        else:
+            counts[0] += 1
+            self.Hits += 1
+
+        return result
+
+    def resized(self, width, height, interpolation=cv2.INTER_CUBIC):
+        """Gets the frame scaled to width x height."""
+        name = "resized %dx%d %d" % (width, height, interpolation)
+
+        return self.get(name, lambda: RobotVision.resize_image(self.Frame, width, height, interpolation,
+                                                               out=self.pool.get(name, (height, width, 3))))
+
+    # The steps below look up the one they start from only when computing, so every hit is a reuse by another caller.
+
+    def blurred(self, size, method, radius):
+        """Gets the frame resized to a (width, height) size and blurred, see RobotVision.blur."""
+        name = "blurred %dx%d %d %g" % (size[0], size[1], method, radius)
+
+        return self.get(name, lambda: RobotVision.blur(self.resized(*size), method, radius,
+                                                       out=self.pool.get(name, (size[1], size[0], 3))))
+
+    def adjusted(self, size, blur, brightness, contrast):
+        """Gets the blurred frame, blur being the (method, radius) of blurred(), with brightness and contrast applied,
+        see RobotVision.brightness_contrast."""
+        name = "adjusted %dx%d %d %g %g %g" % (size[0], size[1], blur[0], blur[1], brightness, contrast)
+
+        return self.get(name, lambda: RobotVision.brightness_contrast(self.blurred(size, *blur), brightness, contrast,
+                                                                      out=self.pool.get(name, (size[1], size[0], 3))))
+
+    def hsv(self, size=None, blur=None, adjust=None):
+        """Gets the HSV conversion of the frame, or of the frame resized to a (width, height) size.
+        Args:
+            size: (width, height) to resize to first, the full frame if None.
+            blur: (method, radius) to convert the blurred resized frame instead, see blurred().
+            adjust: (brightness, contrast) to convert the blurred frame with them applied, see adjusted().
+        Returns:
+            The HSV image, keyed on every step before the conversion.
+        """
+        if adjust is not None:
+            source = lambda: self.adjusted(size, blur, *adjust)
+            name = "hsv %dx%d %d %g %g %g" % (size[0], size[1], blur[0], blur[1], adjust[0], adjust[1])
+
+        elif blur is not None:
+            source = lambda: self.blurred(size, *blur)
+            name = "hsv %dx%d %d %g" % (size[0], size[1], blur[0], blur[1])
+
+        elif size is not None:
+            source = lambda: self.resized(*size)
+            name = "hsv %dx%d" % size
+
+        else:
+            source = lambda: self.Frame
+            name = "hsv %dx%d" % (self.Frame.shape[1], self.Frame.shape[0])
+
+        def convert():
+            image = source()
+            return cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self.pool.get(name, image.shape))
+
+        return self.get(name, convert)
+
+    def stats(self):
+        """Gets the hit and miss counts.
+        Returns:
+            A dict with frames, hits, misses and hit rate, and per intermediate its hits and misses.
+        """
+        lookups = self.Hits + self.Misses
+
+        return {"frames": self.Frames, "hits": self.Hits, "misses": self.Misses,
+                "hit rate": self.Hits / lookups if lookups else 0.0,
+                "intermediates": {name: {"hits": hits, "misses": misses}
+                                  for name, (hits, misses) in self.Counts.items()}}
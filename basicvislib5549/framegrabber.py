@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+
+"""
+Threaded capture wrapper that keeps grabbing from a VideoCapture in the background so the vision loop always
+receives the newest frame instead of one that has been sitting in the driver buffer.
+"""
+
+
+class FrameGrabber:
+    """
+    Latest-frame capture thread around a cv2.VideoCapture.
+
+    Usage: Wrap a source from CamLib.cv_video_source and call read() exactly like a VideoCapture.
+        Params:
+            source: A cv2.VideoCapture (or anything with read()/release()).
+            buffers: Number of preallocated frame buffers in the ring, at least 3.
+            timeout: Seconds read() waits for a new frame before giving up.
+        Variables:
+            self.Dropped: Frames that were captured but replaced by a newer one before being read.
+            self.Captured: Total frames captured by the grab thread.
+            self.Timestamp: time.monotonic() capture time of the last frame handed out by read().
+            self.Sequence: Sequence number of the last frame handed out by read().
+
+    Note: The array returned by read() stays valid until the next call to read(). Copy it if it must live longer.
+    """
+
+    def __init__(self, source, buffers=3, timeout=1.0):
+        if buffers < 3:
+            raise ValueError("FrameGrabber needs at least 3 buffers")
+
+        self._source = source
+        self._timeout = timeout
+        self._count = buffers
+        self._ring = [None] * buffers
+        self._stamps = [0.0] * buffers
+        self._seqs = [0] * buffers
+
+        width = int(source.get(3))
+        height = int(source.get(4))
+        if width > 0 and height > 0:
+            self._ring = [np.empty((height, width, 3), np.uint8) for i in range(buffers)]
+
+        self._cond = threading.Condition()
+        self._latest = -1
+        self._inuse = -1
+        self._running = True
+        self._failed = False
+
+        self.Dropped = 0
+        self.Captured = 0
+        self.Timestamp = 0.0
+        self.Sequence = 0
+
+        self._thread = threading.Thread(target=self._grab, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def _free_slot(self):
+        for i in range(self._count):
+            if i != self._latest and i != self._inuse:
+                return i
+
+    def _grab(self):
+        seq = 0
+
+        while self._running:
+            with self._cond:
+                slot = self._free_slot()
+
+            ret, frame = self._source.read(self._ring[slot]) if self._ring[slot] is not None \
+                else self._source.read()
+            stamp = time.monotonic()
+
+            if ret is not True or frame is None:
+                with self._cond:
+                    self._failed = True
+                    self._cond.notify_all()
+                break
+
+            seq += 1
+
+            with self._cond:
+                if frame is not self._ring[slot]:
+                    # First frame for this slot, or the resolution changed; adopt the array as the slot buffer.
+                    self._ring[slot] = frame
+
+                if self._latest != -1 and self._seqs[self._latest] > self.Sequence:
+                    self.Dropped += 1
+
+                self._stamps[slot] = stamp
+                self._seqs[slot] = seq
+                self._latest = slot
+                self.Captured = seq
+                self._cond.notify_all()
+
+    def read(self):
+        """Gets the newest captured frame, waiting for one that has not been returned yet.
+        Returns:
+            A (ret, frame) tuple like cv2.VideoCapture.read().
+        """
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def read_stamped(self):
+        """Gets the newest captured frame along with its capture time.
+        Returns:
+            A (ret, frame, timestamp) tuple, the timestamp being time.monotonic() at capture.
+        """
+        with self._cond:
+            newframe = self._cond.wait_for(
+                lambda: self._failed or (self._latest != -1 and self._seqs[self._latest] > self.Sequence),
+                self._timeout)
+
+            if not newframe or self._latest == -1 or self._seqs[self._latest] <= self.Sequence:
+                self._inuse = -1
+                return False, None, 0.0
+
+            self._inuse = self._latest
+            self.Sequence = self._seqs[self._inuse]
+            self.Timestamp = self._stamps[self._inuse]
+
+            return True, self._ring[self._inuse], self.Timestamp
+
+    def isOpened(self):
+        return self._running and not self._failed and self._source.isOpened()
+
+    def get(self, propId):
+        return self._source.get(propId)
+
+    def set(self, propId, value):
+        return self._source.set(propId, value)
+
+    def release(self):
+        """Stops the grab thread and releases the underlying source."""
+        self._running = False
+        self._thread.join(self._timeout + 1)
+        self._source.release()
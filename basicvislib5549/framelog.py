@@ -0,0 +1,402 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import cv2
+
+"""
+Compact, memory-mapped log of timestamped camera frames together with the NetworkTables control keys at the time of
+each frame, and a replay source that stands in for a cv2.VideoCapture.
+
+A log is two append-only files:
+    <name>.frames: The frames, back to back, raw or JPEG encoded.
+    <name>.index: A JSON header line padded to 4096 bytes, then one fixed-size record per frame with its timestamp,
+        key values and the offset and length of its frame in <name>.frames. Records of length 0 carry no frame and
+        only note that the keys changed.
+Both are memory-mapped on replay, raw frames are returned as views of the map without copying.
+"""
+
+
+class FrameLog:
+    """
+    Read access to a recorded log.
+
+        Params:
+            path: Path of the log without extension.
+        Variables:
+            self.Keys: Names of the recorded NetworkTables keys.
+            self.Encoding: 'raw' or 'jpeg'.
+            self.Index: Structured numpy array with fields t, keys, offset and length, one row per record.
+    """
+
+    HEADER = 4096
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path + '.index', 'rb') as f:
+            header = json.loads(f.read(FrameLog.HEADER).split(b'\n', 1)[0].decode())
+
+        self.Keys = header['keys']
+        self.Encoding = header['encoding']
+        self.shape = tuple(header['shape'])
+        self.fps = header['fps']
+
+        dtype = FrameLog.record_dtype(len(self.Keys))
+        count = (os.path.getsize(path + '.index') - FrameLog.HEADER) // dtype.itemsize
+        self.Index = np.memmap(path + '.index', dtype, 'r', FrameLog.HEADER, (count,)) if count > 0 \
+            else np.zeros(0, dtype)
+        self._frames = np.memmap(path + '.frames', np.uint8, 'r') if os.path.getsize(path + '.frames') > 0 \
+            else np.zeros(0, np.uint8)
+
+    @staticmethod
+    def record_dtype(keys):
+        return np.dtype([('t', '<f8'), ('keys', '<f8', (keys,)), ('offset', '<u8'), ('length', '<u4')])
+
+    def __len__(self):
+        return len(self.Index)
+
+    def frame(self, i):
+        """Gets the frame of record i, a view of the mapped file for raw logs. None for a record without a frame."""
+        offset = int(self.Index[i]['offset'])
+        length = int(self.Index[i]['length'])
+
+        if length == 0:
+            return None
+
+        data = self._frames[offset:offset + length]
+
+        if self.Encoding == 'raw':
+            return data.reshape(self.shape)
+
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    def stack(self):
+        """Gets every frame of the log as one array, for batch processing.
+        Returns:
+            A (records, frames) tuple of the indices of the records that carry a frame and an (N, H, W, 3) array of
+            their frames. Raw logs are a view of the mapped file, JPEG logs are decoded into memory.
+        """
+        records = np.flatnonzero(self.Index['length'] > 0)
+        size = int(np.prod(self.shape))
+
+        if self.Encoding == 'raw':
+            # Frames are written back to back, the frame data is already a stack of them.
+            return records, self._frames[:len(records) * size].reshape((len(records),) + self.shape)
+
+        frames = np.empty((len(records),) + self.shape, np.uint8)
+        for i, record in enumerate(records):
+            frames[i] = self.frame(record)
+
+        return records, frames
+
+    def values(self, i):
+        """Gets the key values recorded with record i as a dict, NaN for keys that were not available."""
+        return dict(zip(self.Keys, self.Index[i]['keys'].tolist()))
+
+    def seek(self, t):
+        """Gets the index of the last record at or before time t, -1 if there is none."""
+        return int(np.searchsorted(self.Index['t'], t, 'right')) - 1
+
+    def next_change(self, i, end=None):
+        """Gets the index of the first record after record i whose key values differ from those of record i.
+        Args:
+            i: Index of the record.
+            end: Index of the record to stop the search at, exclusive, None to search to the end of the log.
+        Returns:
+            The index, or None if the keys do not change.
+        """
+        keys = self.Index['keys'][i + 1:end]
+        current = self.Index[i]['keys']
+        same = (keys == current) | (np.isnan(keys) & np.isnan(current))
+        changed = np.flatnonzero(~same.all(axis=1))
+
+        return i + 1 + int(changed[0]) if len(changed) else None
+
+
+class FrameRecorder:
+    """
+    Writer of a FrameLog.
+
+    Usage: Call record() for every frame and mark() when the keys change between frames, close() when done. A log
+    cut short by a crash stays readable up to the last complete record.
+        Params:
+            path: Path of the log without extension.
+            keys: Names of the NetworkTables keys recorded with each frame.
+            encoding: 'jpeg' for compact logs, 'raw' for bit-exact frames.
+            quality: JPEG quality.
+            fps: Nominal frame rate, reported by ReplayCapture.get(cv2.CAP_PROP_FPS).
+        Variables:
+            self.Frames: Frames recorded.
+            self.Bytes: Bytes of frame data written.
+    """
+
+    def __init__(self, path, keys=("Mode", "Enabled", "Camera", "CameraStream"), encoding='jpeg', quality=90, fps=30.0):
+        if encoding not in ('raw', 'jpeg'):
+            raise ValueError("FrameRecorder encoding must be 'raw' or 'jpeg'")
+
+        self.path = path
+        self.keys = list(keys)
+        self.encoding = encoding
+        self.quality = quality
+        self.fps = fps
+        self.Frames = 0
+        self.Bytes = 0
+
+        self._record = np.zeros(1, FrameLog.record_dtype(len(self.keys)))
+        self._shape = None
+        self._lock = threading.Lock()
+        self._framesFile = open(path + '.frames', 'wb')
+        self._indexFile = open(path + '.index', 'wb')
+
+    def _header(self, shape):
+        header = json.dumps({'keys': self.keys, 'encoding': self.encoding, 'shape': list(shape),
+                             'fps': self.fps}).encode() + b'\n'
+        self._indexFile.write(header.ljust(FrameLog.HEADER, b' '))
+
+    @staticmethod
+    def _value(values, key):
+        value = values.get(key) if isinstance(values, dict) else getattr(values, key, None)
+
+        return np.nan if value is None else float(value)
+
+    def _write(self, data, timestamp, values, shape):
+        with self._lock:
+            if self._shape is None and shape is not None:
+                self._shape = shape
+                self._header(shape)
+
+            record = self._record[0]
+            record['t'] = time.monotonic() if timestamp is None else timestamp
+            record['offset'] = self.Bytes
+            record['length'] = 0 if data is None else data.nbytes
+            record['keys'] = [FrameRecorder._value(values, key) for key in self.keys] if values is not None \
+                else np.nan
+
+            if data is not None:
+                self._framesFile.write(data)
+                self.Bytes += data.nbytes
+                self.Frames += 1
+
+            # The index record goes last, so a crash never leaves a record pointing past the frame data.
+            self._framesFile.flush()
+            self._indexFile.write(self._record.tobytes())
+            self._indexFile.flush()
+
+    def record(self, frame, timestamp=None, values=None):
+        """Appends a frame.
+        Args:
+            frame: A BGR numpy.ndarray, every frame of a log has the same shape.
+            timestamp: Capture time in seconds, time.monotonic() if None.
+            values: Key values, a dict or an object with the keys as attributes (e.g. a TableState).
+        """
+        if self.encoding == 'jpeg':
+            ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            data = data.reshape(-1)
+
+        else:
+            data = np.ascontiguousarray(frame).reshape(-1)
+
+        self._write(data, timestamp, values, frame.shape)
+
+    def mark(self, values, timestamp=None):
+        """Appends a record of key values without a frame."""
+        # The header needs the frame shape, keys seen before the first frame wait for it.
+        if self._shape is not None:
+            self._write(None, timestamp, values, None)
+
+    def close(self):
+        with self._lock:
+            if self._shape is None:
+                self._shape = (0, 0, 3)
+                self._header(self._shape)
+
+            self._framesFile.close()
+            self._indexFile.close()
+
+
+class RecordingSource:
+    """
+    Wrapper of a camera source recording every frame read from it.
+
+        Params:
+            source: A cv2.VideoCapture or FrameGrabber.
+            recorder: The FrameRecorder, or a BackgroundRecorder in front of one to encode off the reading thread.
+            values: Key values recorded with each frame, usually the TableState of ConnectTable.subscribe().
+    """
+
+    def __init__(self, source, recorder, values=None):
+        self.source = source
+        self.recorder = recorder
+        self.values = values
+
+    def read_stamped(self):
+        if hasattr(self.source, 'read_stamped'):
+            ret, frame, stamp = self.source.read_stamped()
+
+        else:
+            ret, frame = self.source.read()
+            stamp = time.monotonic()
+
+        if ret:
+            self.recorder.record(frame, stamp, self.values)
+
+        return ret, frame, stamp
+
+    def read(self):
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def get(self, propId):
+        return self.source.get(propId)
+
+    def set(self, propId, value):
+        return self.source.set(propId, value)
+
+    def release(self):
+        self.source.release()
+        self.recorder.close()
+
+
+class ReplayClock:
+    """
+    Recorded time reached by a replay, shared by the ReplayCaptures of one recording so they stay in step.
+
+        Params:
+            realtime: True to wait for recorded time to pass on the wall clock, False to jump ahead as fast as asked.
+        Variables:
+            self.Time: Recorded time reached, None before the first frame.
+    """
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.Time = None
+        self._offset = None
+
+    def now(self):
+        """Gets the recorded time matching the wall clock, the time reached when not in real time."""
+        if self.realtime and self._offset is not None:
+            return time.monotonic() - self._offset
+
+        return self.Time
+
+    def advance(self, t):
+        """Moves recorded time forward to t, sleeping until then in real time."""
+        if self._offset is None:
+            self._offset = time.monotonic() - t
+
+        if self.realtime:
+            wait = t + self._offset - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        self.Time = t if self.Time is None else max(self.Time, t)
+
+
+class ReplayCapture:
+    """
+    Drop-in replacement for a cv2.VideoCapture that plays back a FrameLog.
+
+    Usage: Read it like the camera it was recorded from. As fast as possible, every recorded frame is returned in
+    order. In real time, reads wait for the next frame to be due and skip frames the reader was too slow for, like a
+    FrameGrabber.
+        Params:
+            log: A FrameLog or the path of one.
+            clock: The ReplayClock shared with the other captures of the recording, a new one if None.
+            realtime: Passed to the new ReplayClock when clock is None.
+        Variables:
+            self.Position: Index of the last record returned or sought to, -1 before the first.
+            self.Timestamp: Recorded timestamp of the last frame returned.
+            self.listeners: Functions called with the record index of each frame read, and None at the end of the log.
+    """
+
+    def __init__(self, log, clock=None, realtime=False):
+        self.log = log if isinstance(log, FrameLog) else FrameLog(log)
+        self.clock = clock if clock is not None else ReplayClock(realtime)
+        self.Position = -1
+        self.Timestamp = 0.0
+        self.listeners = []
+        self._frames = np.flatnonzero(self.log.Index['length'] > 0)
+        self._opened = len(self._frames) > 0
+
+    def _next(self):
+        # Index into self._frames of the first frame after Position.
+        i = int(np.searchsorted(self._frames, self.Position, 'right'))
+
+        if self.clock.realtime and i < len(self._frames):
+            now = self.clock.now()
+            if now is not None:
+                # Skip to the newest frame already due.
+                due = int(np.searchsorted(self.log.Index['t'][self._frames], now, 'right')) - 1
+                i = max(i, due)
+
+        return i
+
+    def read_stamped(self):
+        """Gets the next frame.
+        Returns:
+            A (ret, frame, timestamp) tuple, timestamp being the recorded capture time.
+        """
+        if not self._opened:
+            return False, None, 0.0
+
+        i = self._next()
+
+        if i >= len(self._frames):
+            self._opened = False
+
+            for listener in self.listeners:
+                listener(None)
+
+            return False, None, 0.0
+
+        position = int(self._frames[i])
+        t = float(self.log.Index[position]['t'])
+        self.clock.advance(t)
+
+        self.Position = position
+        self.Timestamp = t
+
+        for listener in self.listeners:
+            listener(position)
+
+        return True, self.log.frame(position), t
+
+    def read(self):
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def seek(self, t):
+        """Moves so the next read returns the first frame after recorded time t."""
+        self.Position = self.log.seek(t)
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, propId):
+        if propId == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.log.shape[1])
+
+        elif propId == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.log.shape[0])
+
+        elif propId == cv2.CAP_PROP_FPS:
+            return float(self.log.fps)
+
+        elif propId == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self._frames))
+
+        return 0.0
+
+    def set(self, propId, value):
+        return False
+
+    def release(self):
+        self._opened = False
@@ -0,0 +1,80 @@
+import contextlib
+import tracemalloc
+
+import numpy as np
+
+"""
+Named frame buffers that are allocated once per resolution and handed to the RobotVision 'out=' arguments, so a
+pipeline running every frame does not churn through fresh arrays.
+"""
+
+
+class FramePool:
+    """
+    Pool of reusable numpy buffers keyed by name.
+
+    Usage: Keep one pool per pipeline (or per camera) and pass pool.get(...) as the 'out' of each RobotVision call.
+        Variables:
+            self.Allocations: Number of buffers the pool has allocated, which stops growing once every resolution
+                has been seen.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.Allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Gets the buffer for a name, allocating it only when missing or the shape/type changed.
+        Args:
+            name: Key of the buffer, one per intermediate image.
+            shape: Shape of the buffer as a tuple.
+            dtype: numpy dtype of the buffer.
+        Returns:
+            A numpy.ndarray that is reused on the next call with the same arguments.
+        """
+        buffer = self._buffers.get(name)
+
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+            self.Allocations += 1
+
+        return buffer
+
+    def clear(self):
+        """Drops every buffer, they will be allocated again on the next get()."""
+        self._buffers.clear()
+
+    @contextlib.contextmanager
+    def allocation_budget(self, max_bytes=0):
+        """Checks that the block allocates no pool buffers and at most max_bytes of traced memory at peak.
+        Args:
+            max_bytes: Bytes the block may allocate on top of what was allocated on entry, e.g. for contour lists.
+        Raises:
+            AssertionError: If the budget was exceeded once the block finishes.
+
+        Note: Uses tracemalloc, which numpy and the cv2 bindings report their array data to. Meant for tests and
+        benchmarks, not for the robot.
+        """
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+
+        allocations = self.Allocations
+        tracemalloc.reset_peak()
+        current, peak = tracemalloc.get_traced_memory()
+
+        try:
+            yield self
+
+            _, peak = tracemalloc.get_traced_memory()
+
+        finally:
+            if started:
+                tracemalloc.stop()
+
+        if self.Allocations != allocations:
+            raise AssertionError("FramePool allocated %d new buffers" % (self.Allocations - allocations))
+
+        if peak - current > max_bytes:
+            raise AssertionError("Allocated %d bytes, budget is %d" % (peak - current, max_bytes))
@@ -0,0 +1,198 @@
+import numpy as np
+import cv2
+
+"""
+HSV threshold calibration from histograms. Labeled frames are reduced once to two 3D HSV histograms, of the target
+pixels and of everything else. Their summed-volume tables give the number of pixels of each inside any HSV box from 8
+lookups, so candidate thresholds are scored by the thousand without touching the frames again.
+"""
+
+
+class HsvCalibration:
+    """
+    Search for the RobotVision.hsv_threshold ranges that best separate labeled target pixels from the rest.
+
+    Usage: add() every labeled frame, then search() for the best ranges, or evaluate() a given set of them.
+        Params:
+            bins: Histogram bins of hue, saturation and value. Must divide 180, 256 and 256; ranges are found to the
+                width of a bin, 2 hue and 4 saturation/value levels by default.
+            beta: Weight of recall against precision in the F-score being maximized, above 1 favours finding every
+                target pixel, below 1 favours letting no other pixel through.
+        Variables:
+            self.Positives: Histogram of the target pixels, indexed [hue bin, saturation bin, value bin].
+            self.Negatives: Histogram of every other pixel.
+            self.Frames: Number of frames added.
+            self.Evaluated: Number of boxes scored so far.
+
+    Note: Like hsv_threshold, ranges do not wrap around the hue circle.
+    """
+
+    Ranges = (180, 256, 256)
+
+    def __init__(self, bins=(90, 64, 64), beta=1.0):
+        for count, size in zip(bins, HsvCalibration.Ranges):
+            if size % count:
+                raise ValueError("HsvCalibration bins must divide 180, 256 and 256")
+
+        self.bins = tuple(bins)
+        self.beta = beta
+        self._width = np.array([size // count for count, size in zip(bins, HsvCalibration.Ranges)])
+
+        self.Positives = np.zeros(self.bins, np.int64)
+        self.Negatives = np.zeros(self.bins, np.int64)
+        self.Frames = 0
+        self.Evaluated = 0
+
+        self._tables = None
+
+    def add(self, frame, mask, hsv=False):
+        """Adds a labeled frame to the histograms.
+        Args:
+            frame: BGR numpy.ndarray, as it is when thresholded (e.g. after the pipeline's blur and
+                brightness_contrast).
+            mask: numpy.ndarray of the frame's height and width, non-zero on the target pixels.
+            hsv: True if the frame is already converted to HSV.
+        """
+        if not hsv:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+        h, s, v = (frame[..., c].ravel() // self._width[c] for c in range(3))
+        index = (h.astype(np.int64) * self.bins[1] + s) * self.bins[2] + v
+        target = np.asarray(mask).ravel() != 0
+
+        size = self.Positives.size
+        self.Positives += np.bincount(index[target], minlength=size).reshape(self.bins)
+        self.Negatives += np.bincount(index[~target], minlength=size).reshape(self.bins)
+        self.Frames += 1
+        self._tables = None
+
+    @staticmethod
+    def _summed_volume(histogram):
+        # table[i, j, k] is the count of every bin below (i, j, k), with a zero plane in front of each axis.
+        table = np.zeros(tuple(n + 1 for n in histogram.shape), np.int64)
+        table[1:, 1:, 1:] = histogram.cumsum(0).cumsum(1).cumsum(2)
+
+        return table
+
+    def _box_sums(self, table, lo, hi):
+        # Inclusion-exclusion over the 8 corners of each box [lo, hi] (inclusive bins).
+        h0, s0, v0 = lo.T
+        h1, s1, v1 = hi.T + 1
+
+        return (table[h1, s1, v1] - table[h0, s1, v1] - table[h1, s0, v1] - table[h1, s1, v0]
+                + table[h0, s0, v1] + table[h0, s1, v0] + table[h1, s0, v0] - table[h0, s0, v0])
+
+    def score(self, lo, hi):
+        """Scores boxes of bins.
+        Args:
+            lo: (n, 3) integer numpy.ndarray of the first hue, saturation and value bin of each box.
+            hi: (n, 3) integer numpy.ndarray of the last bins, inclusive.
+        Returns:
+            The (F-score, precision, recall) numpy.ndarrays of the boxes, empty boxes scoring 0.
+        """
+        if self._tables is None:
+            self._tables = (HsvCalibration._summed_volume(self.Positives),
+                            HsvCalibration._summed_volume(self.Negatives))
+
+        lo = np.atleast_2d(lo)
+        hi = np.atleast_2d(hi)
+        valid = (lo <= hi).all(axis=1)
+        hi = np.where(valid[:, None], hi, lo)
+
+        positives, negatives = self._tables
+        tp = np.where(valid, self._box_sums(positives, lo, hi), 0).astype(np.float64)
+        fp = np.where(valid, self._box_sums(negatives, lo, hi), 0)
+        total = positives[-1, -1, -1]
+        self.Evaluated += len(lo)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = tp / total if total else np.zeros_like(tp)
+            b2 = self.beta ** 2
+            fscore = np.where(tp > 0, (1 + b2) * precision * recall / (b2 * precision + recall), 0.0)
+
+        return fscore, precision, recall
+
+    def _to_bins(self, hue, sat, val):
+        ranges = np.array([hue, sat, val], np.int64)
+        limits = np.array(self.bins) - 1
+
+        return np.minimum(ranges[:, 0] // self._width, limits), np.minimum(ranges[:, 1] // self._width, limits)
+
+    def _to_ranges(self, lo, hi):
+        lo = lo * self._width
+        hi = (hi + 1) * self._width - 1
+
+        return [[int(lo[c]), int(hi[c])] for c in range(3)]
+
+    def evaluate(self, hue, sat, val):
+        """Scores hsv_threshold ranges, rounded to the bins.
+        Returns:
+            A dict of the F-score, precision and recall.
+        """
+        lo, hi = self._to_bins(hue, sat, val)
+        fscore, precision, recall = self.score(lo[None], hi[None])
+
+        return {"fscore": float(fscore[0]), "precision": float(precision[0]), "recall": float(recall[0])}
+
+    def search(self, restarts=32, seed=5549, start=None):
+        """Finds the ranges with the highest F-score by coordinate ascent from several starting boxes. Every step
+        scores all values of one bound at once.
+        Args:
+            restarts: Number of random starting boxes, on top of the spread of the target pixels and 'start'.
+            seed: Seed of the random starting boxes.
+            start: Optional (hue, sat, val) ranges to also start from, e.g. the current thresholds.
+        Returns:
+            A (hue, sat, val) tuple of [min, max] lists for RobotVision.hsv_threshold.
+        """
+        if not self.Positives.any():
+            raise ValueError("HsvCalibration has no target pixels to search for")
+
+        starts = [self._spread()]
+        if start is not None:
+            starts.append(np.concatenate(self._to_bins(*start)))
+
+        rng = np.random.default_rng(seed)
+        bins = np.array(self.bins)
+        for i in range(restarts):
+            a, b = rng.integers(0, bins), rng.integers(0, bins)
+            starts.append(np.concatenate((np.minimum(a, b), np.maximum(a, b))))
+
+        best, bestScore = None, -1.0
+        for box in starts:
+            box, score = self._ascend(np.array(box, np.int64))
+            if score > bestScore:
+                best, bestScore = box, score
+
+        return tuple(self._to_ranges(best[:3], best[3:]))
+
+    def _spread(self):
+        # Box of the 1st to 99th percentile of the target pixels along each channel.
+        box = []
+        for axis in range(3):
+            counts = self.Positives.sum(axis=tuple(a for a in range(3) if a != axis)).cumsum()
+            box.append(np.searchsorted(counts, counts[-1] * 0.01))
+            box.append(np.searchsorted(counts, counts[-1] * 0.99))
+
+        return np.array(box[0::2] + box[1::2], np.int64)
+
+    def _ascend(self, box):
+        score = self.score(box[None, :3], box[None, 3:])[0][0]
+        improved = True
+
+        while improved:
+            improved = False
+
+            for bound in range(6):
+                channel = bound % 3
+                candidates = np.repeat(box[None], self.bins[channel], axis=0)
+                candidates[:, bound] = np.arange(self.bins[channel])
+
+                scores = self.score(candidates[:, :3], candidates[:, 3:])[0]
+                i = int(scores.argmax())
+
+                if scores[i] > score:
+                    box, score = candidates[i], scores[i]
+                    improved = True
+
+        return box, score
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+
+"""
+Lightweight hot-path timers. Each stage keeps a rolling window of its most recent durations in a fixed-size ring, so
+memory does not grow however long the robot runs. A disabled Metrics hands out a shared no-op timer.
+"""
+
+
+class RollingHistogram:
+    """
+    Fixed-memory window of the most recent samples of one stage.
+
+    Usage: add() samples in seconds, read percentiles with summary().
+        Params:
+            window: Number of most recent samples kept.
+        Variables:
+            self.Count: Total samples ever added.
+            self.Total: Sum of every sample ever added, in seconds.
+            self.Max: Largest sample in the current window.
+    """
+
+    def __init__(self, window=256):
+        self._samples = np.zeros(window, np.float64)
+        self._window = window
+        self.Count = 0
+        self.Total = 0.0
+
+    def add(self, seconds):
+        self._samples[self.Count % self._window] = seconds
+        self.Count += 1
+        self.Total += seconds
+
+    @property
+    def Max(self):
+        return float(self._samples[:min(self.Count, self._window)].max()) if self.Count else 0.0
+
+    def summary(self):
+        """Gets the statistics of the current window.
+        Returns:
+            A dict with count, mean, p50, p95, p99 and max, durations in milliseconds.
+        """
+        samples = self._samples[:min(self.Count, self._window)] * 1000
+
+        if len(samples) == 0:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+
+        return {"count": self.Count, "mean": float(samples.mean()), "p50": float(p50), "p95": float(p95),
+                "p99": float(p99), "max": float(samples.max())}
+
+
+class _StageTimer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._histogram.add(time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return None
+
+
+class Metrics:
+    """
+    Collection of per-stage rolling histograms.
+
+    Usage: Wrap each hot-path stage in 'with metrics.timer("stage"):', or record() a duration measured elsewhere.
+        Params:
+            enabled: When False every timer is a shared no-op and nothing is recorded.
+            window: Samples kept per stage.
+        Variables:
+            self.Enabled: Whether timings are being recorded.
+
+    Note: A stage's timer must not be entered from two threads at once; give each thread its own stage names.
+    """
+
+    _null = _NullTimer()
+
+    def __init__(self, enabled=True, window=256):
+        self.Enabled = enabled
+        self._window = window
+        self._histograms = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._prefix = ""
+
+    def scoped(self, prefix):
+        """Gets a Metrics that records into this one with every stage name prefixed, e.g. one per worker thread."""
+        scoped = Metrics(self.Enabled, self._window)
+        scoped._histograms = self._histograms
+        scoped._lock = self._lock
+        scoped._prefix = self._prefix + prefix + " "
+
+        return scoped
+
+    def _histogram(self, stage):
+        stage = self._prefix + stage
+        histogram = self._histograms.get(stage)
+
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, RollingHistogram(self._window))
+
+        return histogram
+
+    def timer(self, stage):
+        """Gets the context manager timing a stage."""
+        if not self.Enabled:
+            return Metrics._null
+
+        timer = self._timers.get(stage)
+
+        if timer is None:
+            timer = self._timers[stage] = _StageTimer(self._histogram(stage))
+
+        return timer
+
+    def record(self, stage, seconds):
+        """Adds a duration measured by the caller to a stage."""
+        if self.Enabled:
+            self._histogram(stage).add(seconds)
+
+    def summary(self):
+        """Gets the summary of every stage, see RollingHistogram.summary()."""
+        with self._lock:
+            stages = list(self._histograms.items())
+
+        return {stage: histogram.summary() for stage, histogram in stages}
+
+    def text(self):
+        """Gets the summary as plain text, one 'stage statistic value' line per statistic."""
+        lines = []
+
+        for stage, summary in sorted(self.summary().items()):
+            for key, value in summary.items():
+                lines.append("%s %s %g" % (stage.replace(" ", "_"), key, value))
+
+        return "\n".join(lines) + "\n"
+
+
+# Shared disabled instance for callers that were not given one.
+Metrics.Disabled = Metrics(enabled=False)
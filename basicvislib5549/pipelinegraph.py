@@ -0,0 +1,294 @@
+import collections
+import concurrent.futures
+import json
+
+import cv2
+
+from .compiledthreshold import CompiledThreshold
+from .metrics import Metrics
+from .robotvisionlib import RobotVision
+
+"""
+Declarative vision pipelines. A pipeline is a DAG of RobotVision stages with their parameters, given as a dict or
+loaded from a JSON file, so a new variant is a config change instead of another hand-written static method:
+
+    {
+        "nodes": [
+            {"name": "resized", "stage": "resize_image", "inputs": ["frame"],
+             "params": {"width": 280, "height": 210, "interpolation": "cv2.INTER_CUBIC"}},
+            {"name": "blurred", "stage": "blur", "inputs": ["resized"],
+             "params": {"method": "RobotVision.BlurType.BOX_BLUR", "radius": 5}},
+            ...
+        ],
+        "outputs": ["targets"]
+    }
+
+Inputs name either another node or a value given to run(), "frame" by default. String parameters starting with
+"cv2." or "RobotVision." name that constant. Before running, identical nodes are merged, nodes no output depends on
+are dropped and brightness_contrast -> hsv_threshold chains are fused into one CompiledThreshold lookup. Nodes that do
+not depend on each other run on a thread pool.
+"""
+
+
+Node = collections.namedtuple("Node", ["name", "stage", "inputs", "params"])
+
+
+def _same_shape(inputs, params):
+    return inputs[0].shape
+
+
+def _mask_shape(inputs, params):
+    return inputs[0].shape[:2]
+
+
+def _resized_shape(inputs, params):
+    return (int(params["height"]), int(params["width"])) + inputs[0].shape[2:]
+
+
+class PipelineGraph:
+    """
+    Compiled pipeline DAG.
+
+    Usage: Construct with a config (or from_file()) once, then run() it on each frame.
+        Params:
+            config: Dict with a "nodes" list of {"name", "stage", "inputs", "params"} and an "outputs" list of node
+                names, see the module docstring.
+            metrics: Metrics every node is timed into under its name, Metrics.Disabled if None.
+            pool: Optional FramePool that stages with an 'out=' argument write into, per node name.
+            workers: Threads for independent nodes, 0 to run every node on the calling thread. None for as many as
+                the widest level of the graph.
+            fuse: False to keep brightness_contrast and hsv_threshold separate.
+        Variables:
+            self.Nodes: The compiled nodes in run order, as Node namedtuples.
+            self.Levels: Lists of the names of nodes that only depend on earlier levels, and run in parallel.
+            self.Merged: Dict of the name of every node removed as a duplicate to the node it was merged into.
+            self.Dropped: Names of the nodes no output depends on.
+            self.Fused: Names of the fused nodes, each replacing a brightness_contrast and hsv_threshold pair.
+    """
+
+    # Stages registered by name, any other stage is the RobotVision static method of that name.
+    Stages = {}
+
+    # Output shape of the stages that take an 'out=' buffer, from their inputs and parameters.
+    OutShapes = {"resize_image": _resized_shape, "blur": _same_shape, "brightness_contrast": _same_shape,
+                 "hsv_threshold": _mask_shape, "compiled_threshold": _mask_shape}
+
+    def __init__(self, config, metrics=None, pool=None, workers=None, fuse=True):
+        self.metrics = metrics if metrics is not None else Metrics.Disabled
+        self.pool = pool
+        self.outputs = list(config["outputs"])
+        requested = list(self.outputs)
+
+        nodes = [Node(n["name"], n["stage"], tuple(n.get("inputs", ("frame",))),
+                      {key: PipelineGraph._resolve(value) for key, value in n.get("params", {}).items()})
+                 for n in config["nodes"]]
+
+        self.Merged = {}
+        self.Dropped = []
+        self.Fused = []
+
+        nodes = self._order(nodes)
+        nodes = self._merge(nodes)
+        if fuse:
+            nodes = self._fuse(nodes)
+        nodes = self._prune(nodes)
+
+        self.Nodes = nodes
+        # Requested output name to the node that computes it after merging.
+        self._outputs = list(zip(requested, self.outputs))
+        self.Levels = self._levels(nodes)
+
+        self._functions = {node.name: self._function(node) for node in nodes}
+        self._nodes = {node.name: node for node in nodes}
+
+        if workers is None:
+            workers = max(len(level) for level in self.Levels) if self.Levels else 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers, "PipelineGraph") if workers > 1 else None
+
+    @staticmethod
+    def from_file(path, **kwargs):
+        """Loads a PipelineGraph from a JSON config file, kwargs are passed to the constructor."""
+        with open(path) as f:
+            return PipelineGraph(json.load(f), **kwargs)
+
+    @staticmethod
+    def register(name, function):
+        """Adds a stage that is not a RobotVision method, called as function(*inputs, **params)."""
+        PipelineGraph.Stages[name] = function
+
+    @staticmethod
+    def _resolve(value):
+        if isinstance(value, str) and value.startswith(("cv2.", "RobotVision.")):
+            scope = {"cv2": cv2, "RobotVision": RobotVision}
+            first, *path = value.split(".")
+            value = scope[first]
+            for part in path:
+                value = getattr(value, part)
+
+        return value
+
+    def _order(self, nodes):
+        """Sorts the nodes so every node comes after its inputs."""
+        names = {}
+        for node in nodes:
+            if node.name in names:
+                raise ValueError("PipelineGraph node '%s' is declared twice" % node.name)
+            names[node.name] = node
+
+        ordered = []
+        state = {}
+
+        def visit(node, path):
+            if state.get(node.name) == 2:
+                return
+            if state.get(node.name) == 1:
+                raise ValueError("PipelineGraph has a cycle through '%s'" % " -> ".join(path + [node.name]))
+
+            state[node.name] = 1
+            for name in node.inputs:
+                if name in names:
+                    visit(names[name], path + [node.name])
+            state[node.name] = 2
+            ordered.append(node)
+
+        for node in nodes:
+            visit(node, [])
+
+        for name in self.outputs:
+            if name not in names:
+                raise ValueError("PipelineGraph output '%s' is not a node" % name)
+
+        return ordered
+
+    def _merge(self, nodes):
+        """Merges nodes that run the same stage with the same parameters on the same inputs."""
+        seen = {}
+        merged = []
+
+        for node in nodes:
+            node = node._replace(inputs=tuple(self.Merged.get(name, name) for name in node.inputs))
+            key = (node.stage, node.inputs, json.dumps(node.params, sort_keys=True, default=repr))
+
+            if key in seen:
+                self.Merged[node.name] = seen[key]
+                continue
+
+            seen[key] = node.name
+            merged.append(node)
+
+        self.outputs = [self.Merged.get(name, name) for name in self.outputs]
+
+        return merged
+
+    def _consumers(self, nodes):
+        consumers = collections.Counter(name for node in nodes for name in node.inputs)
+        consumers.update(self.outputs)
+
+        return consumers
+
+    def _fuse(self, nodes):
+        """Replaces each hsv_threshold of a brightness_contrast used nowhere else by a compiled_threshold."""
+        byname = {node.name: node for node in nodes}
+        consumers = self._consumers(nodes)
+        removed = set()
+        fused = []
+
+        for node in nodes:
+            source = byname.get(node.inputs[0]) if node.stage == "hsv_threshold" and node.inputs else None
+
+            if source is not None and source.stage == "brightness_contrast" and consumers[source.name] == 1:
+                params = dict(source.params)
+                params.update(node.params)
+                node = Node(node.name, "compiled_threshold", source.inputs, params)
+                removed.add(source.name)
+                self.Fused.append(node.name)
+
+            fused.append(node)
+
+        return [node for node in fused if node.name not in removed]
+
+    def _prune(self, nodes):
+        """Drops the nodes no output depends on."""
+        byname = {node.name: node for node in nodes}
+        needed = set()
+        pending = list(self.outputs)
+
+        while pending:
+            name = pending.pop()
+            if name in needed or name not in byname:
+                continue
+            needed.add(name)
+            pending.extend(byname[name].inputs)
+
+        self.Dropped = [node.name for node in nodes if node.name not in needed]
+
+        return [node for node in nodes if node.name in needed]
+
+    @staticmethod
+    def _levels(nodes):
+        depth = {}
+        levels = []
+
+        for node in nodes:
+            level = max([depth[name] + 1 for name in node.inputs if name in depth], default=0)
+            depth[node.name] = level
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(node.name)
+
+        return levels
+
+    def _function(self, node):
+        if node.stage == "compiled_threshold":
+            # Every fused node gets its own table, built once here.
+            p = node.params
+            table = CompiledThreshold(p["brightness"], p["contrast"], p["hue"], p["sat"], p["val"])
+
+            return lambda frame, out=None, **params: table.apply(frame, out=out)
+
+        function = PipelineGraph.Stages.get(node.stage)
+        if function is None:
+            function = getattr(RobotVision, node.stage, None)
+        if function is None:
+            raise ValueError("PipelineGraph node '%s' has unknown stage '%s'" % (node.name, node.stage))
+
+        return function
+
+    def _run_node(self, name, values):
+        node = self._nodes[name]
+        inputs = [values[i] for i in node.inputs]
+        params = node.params
+
+        shape = PipelineGraph.OutShapes.get(node.stage) if self.pool is not None else None
+        if shape is not None:
+            params = dict(params, out=self.pool.get(name, shape(inputs, params)))
+
+        with self.metrics.timer(name):
+            return self._functions[name](*inputs, **params)
+
+    def run(self, frame=None, **inputs):
+        """Runs the pipeline.
+        Args:
+            frame: Value of the "frame" input.
+            inputs: Values of any other inputs the nodes name.
+        Returns:
+            A dict of every output name to its value. Outputs written into the pool are overwritten by the next run.
+        """
+        values = dict(inputs, frame=frame)
+
+        for level in self.Levels:
+            if self._executor is None or len(level) == 1:
+                for name in level:
+                    values[name] = self._run_node(name, values)
+
+            else:
+                for name, value in zip(level, self._executor.map(lambda name: self._run_node(name, values), level)):
+                    values[name] = value
+
+        return {name: values[node] for name, node in self._outputs}
+
+    def close(self):
+        """Stops the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
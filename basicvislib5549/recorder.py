@@ -0,0 +1,321 @@
+import collections
+import glob
+import logging
+import threading
+import time
+
+import numpy as np
+import cv2
+
+"""
+Background recording. The vision loop hands a frame over by copying it into a preallocated buffer, a writer thread
+encodes and writes it, so recording never waits on the disk or the encoder.
+"""
+
+
+class BackgroundRecorder:
+    """
+    Bounded queue of frames in front of a writer, drained by a background thread.
+
+    Usage: Call put() with each frame to record, close() when done. The frame may be reused as soon as put() returns.
+        Params:
+            writer: Anything with record(frame, timestamp, values), mark(values, timestamp) and close(), a
+                VideoSegments or a FrameRecorder.
+            queue: Most frames waiting to be written.
+            policy: What put() does when the queue is full:
+                'newest': Drop the frame being put, the frames already queued are written.
+                'oldest': Drop the oldest queued frame to make room, so the newest frames are written.
+                'block': Wait for room, the caller is slowed down to the writer's pace and nothing is dropped.
+        Variables:
+            self.Queued: Frames accepted by put().
+            self.Written: Frames the writer has finished.
+            self.Dropped: Frames dropped by the policy.
+            self.HighWater: Most frames that were waiting at once.
+            self.Errors: Calls to the writer that raised, logged and skipped. Frames among them count as Dropped.
+    """
+
+    Policies = ('newest', 'oldest', 'block')
+
+    def __init__(self, writer, queue=8, policy='newest'):
+        if policy not in BackgroundRecorder.Policies:
+            raise ValueError("BackgroundRecorder policy must be one of %s" % (BackgroundRecorder.Policies,))
+        if queue < 1:
+            raise ValueError("BackgroundRecorder needs a queue of at least 1")
+
+        self.writer = writer
+        self.queue = queue
+        self.policy = policy
+
+        self.Queued = 0
+        self.Written = 0
+        self.Dropped = 0
+        self.HighWater = 0
+        self.Errors = 0
+
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._waiting = 0
+        # One buffer per queue slot and one for the frame being written.
+        self._free = [None] * (queue + 1)
+        self._running = True
+
+        self._thread = threading.Thread(target=self._write, name="BackgroundRecorder", daemon=True)
+        self._thread.start()
+
+    def _buffer(self, frame):
+        buffer = self._free.pop()
+
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = np.empty_like(frame)
+
+        return buffer
+
+    def put(self, frame, timestamp=None, values=None):
+        """Queues a frame.
+        Args:
+            frame: A numpy.ndarray, copied before returning.
+            timestamp: Capture time in seconds, time.monotonic() if None.
+            values: Passed to the writer. Anything but a dict (e.g. a TableState) is passed as a snapshot of its
+                attributes at the time of put().
+        Returns:
+            True if the frame was queued, False if it was dropped.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        values = BackgroundRecorder._snapshot(values)
+
+        with self._cond:
+            if not self._running:
+                return False
+
+            if self._waiting >= self.queue:
+                if self.policy == 'newest':
+                    self.Dropped += 1
+                    return False
+
+                elif self.policy == 'oldest':
+                    self._free.append(self._pop_frame())
+                    self.Dropped += 1
+
+                else:
+                    self._cond.wait_for(lambda: self._waiting < self.queue or not self._running)
+                    if not self._running:
+                        return False
+
+            buffer = self._buffer(frame)
+            np.copyto(buffer, frame)
+
+            self._pending.append((buffer, timestamp, values))
+            self._waiting += 1
+            self.Queued += 1
+            self.HighWater = max(self.HighWater, self._waiting)
+            self._cond.notify_all()
+
+        return True
+
+    record = put
+
+    def mark(self, values, timestamp=None):
+        """Queues a call to the writer's mark(), never dropped and kept in order with the frames."""
+        values = BackgroundRecorder._snapshot(values)
+
+        with self._cond:
+            if self._running:
+                self._pending.append((None, time.monotonic() if timestamp is None else timestamp, values))
+                self._cond.notify_all()
+
+    @staticmethod
+    def _snapshot(values):
+        if values is None or isinstance(values, dict):
+            return values
+
+        return dict(vars(values))
+
+    def _pop_frame(self):
+        for i, (buffer, timestamp, values) in enumerate(self._pending):
+            if buffer is not None:
+                del self._pending[i]
+                self._waiting -= 1
+                return buffer
+
+    def _write(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    break
+
+                buffer, timestamp, values = self._pending.popleft()
+
+                if buffer is not None:
+                    self._waiting -= 1
+
+            if buffer is None:
+                try:
+                    self.writer.mark(values, timestamp)
+
+                except Exception:
+                    # A failing writer must not stop the thread, or the queue fills and every frame is dropped.
+                    logging.exception("BackgroundRecorder failed to mark")
+                    with self._cond:
+                        self.Errors += 1
+
+                continue
+
+            try:
+                self.writer.record(buffer, timestamp, values)
+
+            except Exception:
+                # A failing writer must not take the vision loop down, count it as dropped.
+                logging.exception("BackgroundRecorder failed to record a frame")
+                with self._cond:
+                    self.Dropped += 1
+                    self.Errors += 1
+
+            else:
+                with self._cond:
+                    self.Written += 1
+
+            with self._cond:
+                self._free.append(buffer)
+                self._cond.notify_all()
+
+    def pending(self):
+        """Gets the number of frames waiting to be written."""
+        with self._cond:
+            return self._waiting
+
+    def close(self):
+        """Writes the frames still queued, then stops the thread and closes the writer."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        self._thread.join()
+        self.writer.close()
+
+
+class VideoSegments:
+    """
+    Video writer that starts a new file every few frames and writes a frame-index sidecar next to each.
+
+    Usage: Files are named <path>.<segment>.avi, with <path>.<segment>.idx holding one (frame, t) record per frame
+    written, frame being the number of the frame since the start of the recording. locate() uses the sidecars to find
+    a frame without decoding any video.
+        Params:
+            path: Path of the recording without extension.
+            fps: Frame rate written to the files.
+            fourcc: Four-character code of the codec.
+            segment: Frames per file, 0 for a single file.
+        Variables:
+            self.Frames: Frames written.
+            self.Segments: Files started.
+    """
+
+    Sidecar = np.dtype([('frame', '<u8'), ('t', '<f8')])
+
+    def __init__(self, path, fps=30, fourcc='MJPG', segment=0):
+        self.path = path
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.segment = segment
+        self.Frames = 0
+        self.Segments = 0
+
+        self._writer = None
+        self._sidecar = None
+        self._inSegment = 0
+        self._record = np.zeros(1, VideoSegments.Sidecar)
+
+    @staticmethod
+    def name(path, segment):
+        return "%s.%04d" % (path, segment)
+
+    def _start(self, frame):
+        self._finish()
+
+        name = VideoSegments.name(self.path, self.Segments)
+        height, width = frame.shape[:2]
+        self._writer = cv2.VideoWriter(name + '.avi', self.fourcc, self.fps, (width, height))
+        self._sidecar = open(name + '.idx', 'wb')
+        self._inSegment = 0
+        self.Segments += 1
+
+    def _finish(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._sidecar.close()
+            self._writer = None
+
+    def record(self, frame, timestamp=None, values=None):
+        """Writes a frame, starting a new file when the current one is full."""
+        if self._writer is None or (self.segment > 0 and self._inSegment >= self.segment):
+            self._start(frame)
+
+        self._writer.write(frame)
+
+        self._record[0] = (self.Frames, time.monotonic() if timestamp is None else timestamp)
+        self._sidecar.write(self._record.tobytes())
+        self._sidecar.flush()
+
+        self._inSegment += 1
+        self.Frames += 1
+
+    def mark(self, values, timestamp=None):
+        return
+
+    def close(self):
+        self._finish()
+
+    @staticmethod
+    def locate(path, frame=None, timestamp=None):
+        """Finds the file holding a frame of a recording, by frame number or as the last frame at or before a time.
+        Returns:
+            A (video file, frame within the file) tuple, or None if the recording does not have it.
+        """
+        sidecars = []
+        indexes = []
+
+        for sidecar in sorted(glob.glob(path + '.[0-9][0-9][0-9][0-9].idx')):
+            index = np.fromfile(sidecar, VideoSegments.Sidecar)
+            if len(index) > 0:
+                sidecars.append(sidecar)
+                indexes.append(index)
+
+        if not indexes:
+            return None
+
+        if frame is not None:
+            key, value = 'frame', frame
+        else:
+            key, value = 't', timestamp
+
+        # The last file starting at or before the frame, then the frame within it.
+        segment = int(np.searchsorted([index[key][0] for index in indexes], value, 'right')) - 1
+        if segment < 0:
+            return None
+
+        index = indexes[segment]
+        i = int(np.searchsorted(index[key], value, 'right')) - 1
+
+        if frame is not None and int(index['frame'][i]) != frame:
+            return None
+
+        return sidecars[segment][:-len('.idx')] + '.avi', i
+
+    @staticmethod
+    def open(path, frame=None, timestamp=None):
+        """Opens the file holding a frame of a recording, positioned so the next read() returns that frame.
+        Returns:
+            A cv2.VideoCapture, or None if the recording does not have the frame.
+        """
+        located = VideoSegments.locate(path, frame, timestamp)
+
+        if located is None:
+            return None
+
+        capture = cv2.VideoCapture(located[0])
+        capture.set(cv2.CAP_PROP_POS_FRAMES, located[1])
+
+        return capture
@@ -1,249 +1,375 @@
-import numpy as np
-import cv2
-import imutils
-
-
-class RobotVision:
-    class BlurType:
-        BOX_BLUR = 1
-        GAUSSIAN_BLUR = 2
-        MEDIAN_FILTER = 3
-
-    class FlipMode:
-        HORIZONTAL = 0
-        VERTICAL = 1
-        BOTH = -1
-
-    @staticmethod
-    def rotate_image(input, rotation, flip):
-        """
-        :param input: A numpy.ndarray
-        :param rotation: Degrees of rotation, including 90, -90 degrees and full flipping.
-        :param flip: Mode of flipping.
-        :return: A rotated frame
-        """
-        if flip is not False:
-            input = cv2.flip(input, flip)
-
-        rotated = imutils.rotate(input, rotation)
-
-        return rotated
-
-    @staticmethod
-    def resize_image(input, width, height, interpolation):
-        """Scales and image to an exact size.
-        Args:
-            input: A numpy.ndarray.
-            width: The desired width in pixels.
-            height: The desired height in pixels.
-            interpolation: Opencv enum for the type of interpolation.
-        Returns:
-            A numpy.ndarray of the new size.
-        """
-        return cv2.resize(input, ((int)(width), (int)(height)), 0, 0, interpolation)
-
-    @staticmethod
-    def blur(src, method, radius):
-        """Softens an image using one of several filters.
-        Args:
-            src: The source mat (numpy.ndarray).
-            method: The BlurType to perform represented as an int.
-            radius: The radius for the blur as a float.
-        Returns:
-            A numpy.ndarray that has been blurred.
-        """
-        if (method is 1):
-            ksize = int(2 * round(radius) + 1)
-            return cv2.blur(src, (ksize, ksize))
-        elif (method is 2):
-            ksize = int(6 * round(radius) + 1)
-            return cv2.GaussianBlur(src, (ksize, ksize), round(radius))
-        elif (method is 3):
-            ksize = int(2 * round(radius) + 1)
-            return cv2.medianBlur(src, ksize)
-        else:
-            return cv2.bilateralFilter(src, -1, round(radius), round(radius))
-
-    @staticmethod
-    def hsv_threshold(input, hue, sat, val):
-        """Segment an image based on hue, saturation, and value ranges.
-        Args:
-            input: A BGR numpy.ndarray.
-            hue: A list of two numbers the are the min and max hue.
-            sat: A list of two numbers the are the min and max saturation.
-            val: A list of two numbers the are the min and max value.
-        Returns:
-            A black and white numpy.ndarray.
-        """
-        out = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
-        return cv2.inRange(out, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1]))
-
-    @staticmethod
-    def find_contours(input, external_only):
-        """Sets the values of pixels in a binary image to their distance to the nearest black pixel.
-        Args:
-            input: A numpy.ndarray.
-            external_only: A boolean. If true only external contours are found.
-        Return:
-            A list of numpy.ndarray where each one represents a contour.
-        """
-        if (external_only):
-            mode = cv2.RETR_EXTERNAL
-        else:
-            mode = cv2.RETR_LIST
-        method = cv2.CHAIN_APPROX_SIMPLE
-        im2, contours, hierarchy = cv2.findContours(input, mode=mode, method=method)
-        return contours
-
-    @staticmethod
-    def filter_contours(input_contours, min_area, min_perimeter, min_width, max_width,
-                        min_height, max_height, solidity, max_vertex_count, min_vertex_count,
-                        min_ratio, max_ratio):
-        """Filters out contours that do not meet certain criteria.
-        Args:
-            input_contours: Contours as a list of numpy.ndarray.
-            min_area: The minimum area of a contour that will be kept.
-            min_perimeter: The minimum perimeter of a contour that will be kept.
-            min_width: Minimum width of a contour.
-            max_width: MaxWidth maximum width.
-            min_height: Minimum height.
-            max_height: Maximimum height.
-            solidity: The minimum and maximum solidity of a contour.
-            min_vertex_count: Minimum vertex Count of the contours.
-            max_vertex_count: Maximum vertex Count.
-            min_ratio: Minimum ratio of width to height.
-            max_ratio: Maximum ratio of width to height.
-        Returns:
-            Contours as a list of numpy.ndarray.
-        """
-        output = []
-        for contour in input_contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            if (w < min_width or w > max_width):
-                continue
-            if (h < min_height or h > max_height):
-                continue
-            area = cv2.contourArea(contour)
-            if (area < min_area):
-                continue
-            if (cv2.arcLength(contour, True) < min_perimeter):
-                continue
-            hull = cv2.convexHull(contour)
-            solid = 100 * area / cv2.contourArea(hull)
-            if (solid < solidity[0] or solid > solidity[1]):
-                continue
-            if (len(contour) < min_vertex_count or len(contour) > max_vertex_count):
-                continue
-            ratio = (float)(w) / h
-            if (ratio < min_ratio or ratio > max_ratio):
-                continue
-            output.append(contour)
-        return output
-
-    @staticmethod
-    def convex_hulls(input_contours):
-        """Computes the convex hulls of contours.
-        Args:
-            input_contours: A list of numpy.ndarray that each represent a contour.
-        Returns:
-            A list of numpy.ndarray that each represent a contour.
-        """
-        output = []
-        for contour in input_contours:
-            output.append(cv2.convexHull(contour))
-        return output
-
-    @staticmethod
-    def contour_centers(input_contours):
-        """Computes the convex hulls of contours.
-        Args:
-            input_contours: A list of numpy.ndarray that each represent a contour.
-        Returns:
-            A list of cartesian coordinates representing the center of contours.
-        """
-        output = []
-        for c in input_contours:
-            M = cv2.moments(c)
-            cX = int(M["m10"] / M["m00"])
-            cY = int(M["m01"] / M["m00"])
-            output.append([cX, cY])
-
-        return output
-
-    @staticmethod
-    def contour_bounding_box(input_contours):
-        """Computes the convex hulls of contours.
-        Args:
-            input_contours: A list of numpy.ndarray that each represent a contour.
-        Returns:
-            A list of coordinates X and Y (From top-left), dimensions width and height for each contour.
-        """
-        output = []
-        for c in input_contours:
-            x, y, w, h = cv2.boundingRect(c)
-            output.append([x, y, w, h])
-
-        return output
-
-    # noinspection PyIncorrectDocstring,PyIncorrectDocstring,PyIncorrectDocstring,PyIncorrectDocstring
-    @staticmethod
-    def meanshift_cv(input, window, roi_hist):
-        """
-        :param input: Input frame.
-        :param window: window for meanShift to locate in.
-        :param roi_hist: Input mask for meanshift.
-        :return: Bounding box (and new window), center of the evaluated meanshift.
-        """
-
-        track_window = window
-
-        term_crit = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
-
-        hsv = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
-        dst = cv2.calcBackProject([hsv], [0], roi_hist, [0, 180], 1)
-        # apply meanshift to get the new location
-        ret, track_window = cv2.meanShift(dst, track_window, term_crit)
-        # give dimensions
-        x, y, w, h = track_window
-
-        return (x, y, w, h), ((w / 2) + x, (h / 2) + y)
-
-    @staticmethod
-    def camshift_cv(input, window, roi_hist):
-        """
-        :param input: Input video source.
-        :param window: window for CamShift to locate in.
-        :param roi_hist: Input mask for camshift.
-        :return: Bounding box (and new window) and points of the evaluated CamShift.
-        """
-
-        track_window = window
-
-        term_crit = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
-
-        hsv = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
-        dst = cv2.calcBackProject([hsv], [0], roi_hist, [0, 180], 1)
-        # apply meanshift to get the new location
-        rect, track_window = cv2.CamShift(dst, track_window, term_crit)
-        # give points
-        pts = cv2.boxPoints(rect)
-        pts = np.int0(pts)
-        x, y, w, h = track_window
-
-        return (x, y, w, h), pts
-
-    @staticmethod
-    def brightness_contrast(frame, brightness, contrast):
-        """
-        :param frame: Input frame for brightness and contrast
-        :param brightness: Brightness value
-        :param contrast: Contrast value
-        :return: Frame processed by contrast and brightness operations
-        """
-
-        frame = np.int16(frame)
-        frame = frame * (contrast / 127 + 1) - contrast + brightness
-        frame = np.clip(frame, 0, 255)
-        frame = np.uint8(frame)
-
-        return frame
+import numpy as np
+import cv2
+
+
+class RobotVision:
+    class BlurType:
+        BOX_BLUR = 1
+        GAUSSIAN_BLUR = 2
+        MEDIAN_FILTER = 3
+
+    class FlipMode:
+        HORIZONTAL = 0
+        VERTICAL = 1
+        BOTH = -1
+
+    # One row per contour, see contour_features().
+    ContourFeatures = np.dtype([('x', np.int32), ('y', np.int32), ('w', np.int32), ('h', np.int32),
+                                ('area', np.float64), ('perimeter', np.float64), ('hull_area', np.float64),
+                                ('solidity', np.float64), ('vertices', np.int32), ('ratio', np.float64),
+                                ('cx', np.float64), ('cy', np.float64)])
+
+    _bc_tables = {}
+
+    @staticmethod
+    def rotate_image(input, rotation, flip, out=None):
+        """
+        :param input: A numpy.ndarray
+        :param rotation: Degrees of rotation, including 90, -90 degrees and full flipping.
+        :param flip: Mode of flipping.
+        :param out: Optional numpy.ndarray of the input's shape to write the rotated frame into.
+        :return: A rotated frame
+        """
+        if out is None:
+            if flip is not False:
+                input = cv2.flip(input, flip)
+
+            # Only this path needs imutils, which pulls in urllib and http on import.
+            import imutils
+
+            rotated = imutils.rotate(input, rotation)
+
+            return rotated
+
+        # Same transform as imutils.rotate, with the flip folded into the affine matrix so it is a single warp.
+        (h, w) = input.shape[:2]
+        matrix = np.vstack((cv2.getRotationMatrix2D((w / 2, h / 2), rotation, 1.0), [0, 0, 1]))
+
+        if flip is not False:
+            flipmatrix = np.eye(3)
+            if flip in (RobotVision.FlipMode.VERTICAL, RobotVision.FlipMode.BOTH):
+                flipmatrix[0] = [-1, 0, w - 1]
+            if flip in (RobotVision.FlipMode.HORIZONTAL, RobotVision.FlipMode.BOTH):
+                flipmatrix[1] = [0, -1, h - 1]
+            matrix = matrix.dot(flipmatrix)
+
+        return cv2.warpAffine(input, matrix[:2], (w, h), dst=out)
+
+    @staticmethod
+    def resize_image(input, width, height, interpolation, out=None):
+        """Scales and image to an exact size.
+        Args:
+            input: A numpy.ndarray.
+            width: The desired width in pixels.
+            height: The desired height in pixels.
+            interpolation: Opencv enum for the type of interpolation.
+            out: Optional numpy.ndarray of the new size to write into.
+        Returns:
+            A numpy.ndarray of the new size.
+        """
+        return cv2.resize(input, ((int)(width), (int)(height)), dst=out, interpolation=interpolation)
+
+    @staticmethod
+    def blur(src, method, radius, out=None):
+        """Softens an image using one of several filters.
+        Args:
+            src: The source mat (numpy.ndarray).
+            method: The BlurType to perform represented as an int.
+            radius: The radius for the blur as a float.
+            out: Optional numpy.ndarray of the source's shape to write into.
+        Returns:
+            A numpy.ndarray that has been blurred.
+        """
+        if (method is 1):
+            ksize = int(2 * round(radius) + 1)
+            return cv2.blur(src, (ksize, ksize), dst=out)
+        elif (method is 2):
+            ksize = int(6 * round(radius) + 1)
+            return cv2.GaussianBlur(src, (ksize, ksize), round(radius), dst=out)
+        elif (method is 3):
+            ksize = int(2 * round(radius) + 1)
+            return cv2.medianBlur(src, ksize, dst=out)
+        else:
+            return cv2.bilateralFilter(src, -1, round(radius), round(radius), dst=out)
+
+    @staticmethod
+    def hsv_threshold(input, hue, sat, val, out=None, hsv=None):
+        """Segment an image based on hue, saturation, and value ranges.
+        Args:
+            input: A BGR numpy.ndarray.
+            hue: A list of two numbers the are the min and max hue.
+            sat: A list of two numbers the are the min and max saturation.
+            val: A list of two numbers the are the min and max value.
+            out: Optional single channel numpy.ndarray to write the mask into.
+            hsv: Optional numpy.ndarray of the input's shape used for the intermediate HSV image.
+        Returns:
+            A black and white numpy.ndarray.
+        """
+        hsv = cv2.cvtColor(input, cv2.COLOR_BGR2HSV, dst=hsv)
+        return cv2.inRange(hsv, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1]), dst=out)
+
+    @staticmethod
+    def find_contours(input, external_only, offset=(0, 0)):
+        """Sets the values of pixels in a binary image to their distance to the nearest black pixel.
+        Args:
+            input: A numpy.ndarray.
+            external_only: A boolean. If true only external contours are found.
+            offset: (x, y) added to every contour point, for inputs that are a region of a larger image.
+        Return:
+            A list of numpy.ndarray where each one represents a contour.
+        """
+        if (external_only):
+            mode = cv2.RETR_EXTERNAL
+        else:
+            mode = cv2.RETR_LIST
+        method = cv2.CHAIN_APPROX_SIMPLE
+        # OpenCV 3 returns (image, contours, hierarchy), later versions only (contours, hierarchy).
+        contours = cv2.findContours(input, mode=mode, method=method, offset=offset)[-2]
+        return contours
+
+    @staticmethod
+    def filter_contours(input_contours, min_area, min_perimeter, min_width, max_width,
+                        min_height, max_height, solidity, max_vertex_count, min_vertex_count,
+                        min_ratio, max_ratio):
+        """Filters out contours that do not meet certain criteria.
+        Args:
+            input_contours: Contours as a list of numpy.ndarray.
+            min_area: The minimum area of a contour that will be kept.
+            min_perimeter: The minimum perimeter of a contour that will be kept.
+            min_width: Minimum width of a contour.
+            max_width: MaxWidth maximum width.
+            min_height: Minimum height.
+            max_height: Maximimum height.
+            solidity: The minimum and maximum solidity of a contour.
+            min_vertex_count: Minimum vertex Count of the contours.
+            max_vertex_count: Maximum vertex Count.
+            min_ratio: Minimum ratio of width to height.
+            max_ratio: Maximum ratio of width to height.
+        Returns:
+            Contours as a list of numpy.ndarray.
+        """
+        output, features, hulls = RobotVision.filter_contour_features(
+            input_contours, min_area, min_perimeter, min_width, max_width, min_height, max_height, solidity,
+            max_vertex_count, min_vertex_count, min_ratio, max_ratio)
+        return output
+
+    @staticmethod
+    def _contour_table(input_contours):
+        count = len(input_contours)
+        table = np.zeros(count, RobotVision.ContourFeatures)
+
+        if count > 0:
+            # Bounding boxes for all contours at once from the concatenated points, same as cv2.boundingRect.
+            table['vertices'] = np.fromiter(map(len, input_contours), np.int32, count)
+            points = np.concatenate(input_contours).reshape(-1, 2)
+            starts = np.zeros(count, np.intp)
+            np.cumsum(table['vertices'][:-1], out=starts[1:])
+            low = np.minimum.reduceat(points, starts)
+            high = np.maximum.reduceat(points, starts)
+            table['x'], table['y'] = low.T
+            table['w'], table['h'] = (high - low + 1).T
+            table['ratio'] = table['w'] / table['h']
+
+        return table
+
+    @staticmethod
+    def _contour_hulls(input_contours, table, index):
+        hulls = [cv2.convexHull(input_contours[i]) for i in index]
+        table['hull_area'][index] = [cv2.contourArea(hull) for hull in hulls]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table['solidity'][index] = 100 * table['area'][index] / table['hull_area'][index]
+
+        return hulls
+
+    @staticmethod
+    def _contour_centroids(table, index, hulls):
+        for i, hull in zip(index, hulls):
+            M = cv2.moments(hull)
+            if M["m00"] != 0:
+                table['cx'][i] = M["m10"] / M["m00"]
+                table['cy'][i] = M["m01"] / M["m00"]
+            else:
+                table['cx'][i] = table['x'][i] + table['w'][i] / 2
+                table['cy'][i] = table['y'][i] + table['h'][i] / 2
+
+    @staticmethod
+    def contour_features(input_contours):
+        """Computes every contour feature once per contour.
+        Args:
+            input_contours: A list of numpy.ndarray that each represent a contour.
+        Returns:
+            A (features, hulls) tuple. features is a numpy structured array of RobotVision.ContourFeatures with one
+            row per contour, the centroid being that of the convex hull. hulls is a list of the convex hulls.
+        """
+        table = RobotVision._contour_table(input_contours)
+        index = np.arange(len(table))
+
+        table['area'] = [cv2.contourArea(c) for c in input_contours]
+        table['perimeter'] = [cv2.arcLength(c, True) for c in input_contours]
+        hulls = RobotVision._contour_hulls(input_contours, table, index)
+        RobotVision._contour_centroids(table, index, hulls)
+
+        return table, hulls
+
+    @staticmethod
+    def filter_contour_features(input_contours, min_area, min_perimeter, min_width, max_width,
+                                min_height, max_height, solidity, max_vertex_count, min_vertex_count,
+                                min_ratio, max_ratio):
+        """Filters contours like filter_contours, computing each feature once into a columnar table.
+        The cheap criteria (bounding box, vertex count, ratio) are applied to every contour first, area and
+        perimeter only to the survivors of those, and convex hulls only to the survivors of all of them.
+        Args:
+            Same as filter_contours.
+        Returns:
+            A (contours, features, hulls) tuple of the kept contours, a RobotVision.ContourFeatures structured
+            array with one row per kept contour and a list of their convex hulls.
+        """
+        table = RobotVision._contour_table(input_contours)
+
+        keep = ((table['w'] >= min_width) & (table['w'] <= max_width) &
+                (table['h'] >= min_height) & (table['h'] <= max_height) &
+                (table['vertices'] >= min_vertex_count) & (table['vertices'] <= max_vertex_count) &
+                (table['ratio'] >= min_ratio) & (table['ratio'] <= max_ratio))
+        index = np.flatnonzero(keep)
+
+        table['area'][index] = [cv2.contourArea(input_contours[i]) for i in index]
+        index = index[table['area'][index] >= min_area]
+
+        table['perimeter'][index] = [cv2.arcLength(input_contours[i], True) for i in index]
+        index = index[table['perimeter'][index] >= min_perimeter]
+
+        hulls = RobotVision._contour_hulls(input_contours, table, index)
+
+        # NaN solidity (zero area hull) fails both comparisons and is dropped.
+        solid = (table['solidity'][index] >= solidity[0]) & (table['solidity'][index] <= solidity[1])
+        hulls = [hull for hull, ok in zip(hulls, solid) if ok]
+        index = index[solid]
+
+        RobotVision._contour_centroids(table, index, hulls)
+
+        return [input_contours[i] for i in index], table[index], hulls
+
+    @staticmethod
+    def convex_hulls(input_contours):
+        """Computes the convex hulls of contours.
+        Args:
+            input_contours: A list of numpy.ndarray that each represent a contour.
+        Returns:
+            A list of numpy.ndarray that each represent a contour.
+        """
+        output = []
+        for contour in input_contours:
+            output.append(cv2.convexHull(contour))
+        return output
+
+    @staticmethod
+    def contour_centers(input_contours):
+        """Computes the convex hulls of contours.
+        Args:
+            input_contours: A list of numpy.ndarray that each represent a contour.
+        Returns:
+            A list of cartesian coordinates representing the center of contours.
+        """
+        output = []
+        for c in input_contours:
+            M = cv2.moments(c)
+            cX = int(M["m10"] / M["m00"])
+            cY = int(M["m01"] / M["m00"])
+            output.append([cX, cY])
+
+        return output
+
+    @staticmethod
+    def contour_bounding_box(input_contours):
+        """Computes the convex hulls of contours.
+        Args:
+            input_contours: A list of numpy.ndarray that each represent a contour.
+        Returns:
+            A list of coordinates X and Y (From top-left), dimensions width and height for each contour.
+        """
+        output = []
+        for c in input_contours:
+            x, y, w, h = cv2.boundingRect(c)
+            output.append([x, y, w, h])
+
+        return output
+
+    # noinspection PyIncorrectDocstring,PyIncorrectDocstring,PyIncorrectDocstring,PyIncorrectDocstring
+    @staticmethod
+    def meanshift_cv(input, window, roi_hist, hsv=None):
+        """
+        :param input: Input frame.
+        :param window: window for meanShift to locate in.
+        :param roi_hist: Input mask for meanshift.
+        :param hsv: Optional HSV conversion of the input, e.g. from a FrameContext, so it is not converted again.
+        :return: Bounding box (and new window), center of the evaluated meanshift.
+        """
+
+        track_window = window
+
+        term_crit = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+
+        if hsv is None:
+            hsv = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
+
+        dst = cv2.calcBackProject([hsv], [0], roi_hist, [0, 180], 1)
+        # apply meanshift to get the new location
+        ret, track_window = cv2.meanShift(dst, track_window, term_crit)
+        # give dimensions
+        x, y, w, h = track_window
+
+        return (x, y, w, h), ((w / 2) + x, (h / 2) + y)
+
+    @staticmethod
+    def camshift_cv(input, window, roi_hist, hsv=None):
+        """
+        :param input: Input video source.
+        :param window: window for CamShift to locate in.
+        :param roi_hist: Input mask for camshift.
+        :param hsv: Optional HSV conversion of the input, e.g. from a FrameContext, so it is not converted again.
+        :return: Bounding box (and new window) and points of the evaluated CamShift.
+        """
+
+        track_window = window
+
+        term_crit = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+
+        if hsv is None:
+            hsv = cv2.cvtColor(input, cv2.COLOR_BGR2HSV)
+
+        dst = cv2.calcBackProject([hsv], [0], roi_hist, [0, 180], 1)
+        # apply meanshift to get the new location
+        rect, track_window = cv2.CamShift(dst, track_window, term_crit)
+        # give points
+        pts = cv2.boxPoints(rect)
+        pts = np.intp(pts)
+        x, y, w, h = track_window
+
+        return (x, y, w, h), pts
+
+    @staticmethod
+    def brightness_contrast(frame, brightness, contrast, out=None):
+        """
+        :param frame: Input frame for brightness and contrast
+        :param brightness: Brightness value
+        :param contrast: Contrast value
+        :param out: Optional uint8 numpy.ndarray of the frame's shape to write into
+        :return: Frame processed by contrast and brightness operations
+        """
+
+        if out is not None:
+            # Per-channel uint8 -> uint8 map, so a 256 entry table gives the same result without temporaries.
+            table = RobotVision._bc_tables.get((brightness, contrast))
+            if table is None:
+                table = RobotVision.brightness_contrast(np.arange(256, dtype=np.uint8), brightness, contrast)
+                RobotVision._bc_tables[(brightness, contrast)] = table
+
+            return cv2.LUT(frame, table, dst=out)
+
+        frame = np.int16(frame)
+        frame = frame * (contrast / 127 + 1) - contrast + brightness
+        frame = np.clip(frame, 0, 255)
+        frame = np.uint8(frame)
+
+        return frame
@@ -0,0 +1,390 @@
+import atexit
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import cv2
+
+from .camlib import CamLib
+
+"""
+Frames shared between processes without copying. A SharedFrameRing is a ring of frame slots in a
+multiprocessing.shared_memory segment: the producer captures straight into a free slot and publishes it with a
+sequence number, readers get a view of the newest slot and pin it until their next read, so it is never overwritten
+while in use. Only the small control block is touched under a lock, the frames themselves are never copied.
+
+ProcessCamera runs the capture of a camera in its own process on top of a ring, with the read() contract of a
+FrameGrabber, so the vision loop and the streaming process do not share a GIL with the capture.
+"""
+
+
+class SharedFrameRing:
+    """
+    Ring of frames in shared memory.
+
+    Usage: Construct in the parent process and pass to child processes as an argument of multiprocessing.Process,
+    which attaches them to the same segment. The producer calls claim(), fills the slot and calls publish() (or
+    write()), each consumer reads through its own reader().
+        Params:
+            shape: Shape of every frame, e.g. (480, 640, 3).
+            slots: Number of frame slots, at least readers + 2 (the newest frame, the one being written and one
+                pinned by each reader).
+            readers: Number of readers.
+            name: Name of the segment, random if None. A segment of the same name left behind by a killed process is
+                replaced.
+            context: multiprocessing context the lock is made for, spawn by default.
+        Variables:
+            self.name: Name of the segment.
+
+    The creator unlinks the segment in close(), at exit, and multiprocessing's resource tracker unlinks it if the
+    creator is killed.
+    """
+
+    # Control block: sequence of the newest frame, its slot, the producer state, the size of the frames the producer
+    # could not fit, then the sequence of every slot and the slot pinned by every reader.
+    _HEAD, _LATEST, _STATE, _WIDTH, _HEIGHT, _FIELDS = 0, 1, 2, 3, 4, 6
+
+    # Producer states, MISMATCH ends like ENDED when the frames do not have the shape of the ring.
+    OPENING, RUNNING, ENDED, MISMATCH = 0, 1, 2, 3
+
+    def __init__(self, shape, slots=4, readers=2, name=None, context=None):
+        if slots < readers + 2:
+            raise ValueError("SharedFrameRing needs at least readers + 2 slots")
+
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.readers = readers
+        self._cond = (context or multiprocessing.get_context("spawn")).Condition()
+        self._creator = True
+
+        size = SharedFrameRing._layout(self.shape, slots, readers)[-1]
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        except FileExistsError:
+            # Left behind by a process that was killed along with its resource tracker.
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        self.name = self._shm.name
+        self._map()
+        self._control[:] = 0
+        self._control[SharedFrameRing._FIELDS + slots:] = -1
+
+        atexit.register(self.close)
+
+    @staticmethod
+    def _layout(shape, slots, readers):
+        control = (SharedFrameRing._FIELDS + slots + readers) * 8
+        stamps = slots * 8
+        # Frames start on a cache line.
+        frames = (control + stamps + 63) // 64 * 64
+
+        return control, frames, frames + slots * int(np.prod(shape))
+
+    def _map(self):
+        control, frames = SharedFrameRing._layout(self.shape, self.slots, self.readers)[:2]
+        buffer = self._shm.buf
+        fields = SharedFrameRing._FIELDS
+
+        self._control = np.ndarray((fields + self.slots + self.readers,), np.int64, buffer)
+        self._seqs = self._control[fields:fields + self.slots]
+        self._pins = self._control[fields + self.slots:]
+        self._stamps = np.ndarray((self.slots,), np.float64, buffer, control)
+        self._frames = np.ndarray((self.slots,) + self.shape, np.uint8, buffer, frames)
+
+    def __getstate__(self):
+        return self.name, self.shape, self.slots, self.readers, self._cond
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.slots, self.readers, self._cond = state
+        self._creator = False
+        self._shm = shared_memory.SharedMemory(self.name)
+        self._map()
+
+    @property
+    def Sequence(self):
+        """Sequence number of the newest frame, 0 before the first."""
+        return int(self._control[SharedFrameRing._HEAD])
+
+    @property
+    def State(self):
+        """SharedFrameRing.OPENING, RUNNING, ENDED or MISMATCH."""
+        return int(self._control[SharedFrameRing._STATE])
+
+    @property
+    def Mismatch(self):
+        """(width, height) of the frames that did not fit the ring, None unless the state is MISMATCH."""
+        if self.State != SharedFrameRing.MISMATCH:
+            return None
+
+        return int(self._control[SharedFrameRing._WIDTH]), int(self._control[SharedFrameRing._HEIGHT])
+
+    def set_state(self, state):
+        """Sets the producer state, waking readers waiting for a frame."""
+        with self._cond:
+            self._control[SharedFrameRing._STATE] = state
+            self._cond.notify_all()
+
+    def set_mismatch(self, shape):
+        """Ends the producer on a frame of another shape than the ring's, recording its size for Mismatch."""
+        with self._cond:
+            self._control[SharedFrameRing._WIDTH] = shape[1]
+            self._control[SharedFrameRing._HEIGHT] = shape[0]
+            self._control[SharedFrameRing._STATE] = SharedFrameRing.MISMATCH
+            self._cond.notify_all()
+
+    def wait_state(self, timeout=None):
+        """Waits until the producer is no longer opening.
+        Returns:
+            The state.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._control[SharedFrameRing._STATE] != SharedFrameRing.OPENING, timeout)
+
+        return self.State
+
+    def claim(self):
+        """Gets a slot for the producer to write the next frame into.
+        Returns:
+            A (slot, view) tuple, the view is the slot's frame in shared memory.
+        """
+        with self._cond:
+            latest = self._control[SharedFrameRing._LATEST] if self.Sequence > 0 else -1
+            free = [slot for slot in range(self.slots) if slot != latest and slot not in self._pins]
+            # The oldest free slot, one left claimed by a failed read has sequence -1.
+            slot = min(free, key=lambda s: self._seqs[s])
+            self._seqs[slot] = -1
+
+        return slot, self._frames[slot]
+
+    def publish(self, slot, timestamp):
+        """Makes a claimed slot the newest frame."""
+        with self._cond:
+            head = self._control[SharedFrameRing._HEAD] + 1
+            self._control[SharedFrameRing._HEAD] = head
+            self._control[SharedFrameRing._LATEST] = slot
+            self._seqs[slot] = head
+            self._stamps[slot] = timestamp
+            self._cond.notify_all()
+
+    def write(self, frame, timestamp=None):
+        """Copies a frame into the ring, for producers that cannot capture into a claimed slot."""
+        slot, view = self.claim()
+        np.copyto(view, frame)
+        self.publish(slot, time.monotonic() if timestamp is None else timestamp)
+
+    def reader(self, index):
+        """Gets reader number index, each consumer uses its own."""
+        return RingReader(self, index)
+
+    def close(self):
+        """Detaches from the segment, and unlinks it in the creator."""
+        if self._shm is None:
+            return
+
+        # Views of the segment must go before it can be closed.
+        self._control = self._seqs = self._pins = self._stamps = self._frames = None
+        shm, self._shm = self._shm, None
+
+        try:
+            shm.close()
+        except BufferError:
+            # A frame handed out by a reader is still referenced, the mapping goes with the process.
+            pass
+
+        if self._creator:
+            atexit.unregister(self.close)
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingReader:
+    """
+    Consumer side of a SharedFrameRing.
+
+    Usage: Obtained from SharedFrameRing.reader() and read exactly like a FrameGrabber.
+        Variables:
+            self.Sequence: Sequence number of the last frame handed out by read().
+            self.Timestamp: Capture time of the last frame handed out by read().
+            self.Dropped: Frames published but replaced by a newer one before this reader read them.
+
+    Note: The array returned by read() is a view of the shared slot, it stays valid until the next call to read().
+    """
+
+    def __init__(self, ring, index):
+        if not 0 <= index < ring.readers:
+            raise ValueError("SharedFrameRing has no reader %d" % index)
+
+        self.ring = ring
+        self.index = index
+        self.Sequence = 0
+        self.Timestamp = 0.0
+        self.Dropped = 0
+
+    def read_stamped(self, timeout=1.0):
+        """Gets the newest frame, waiting for one newer than the last read.
+        Returns:
+            A (ret, frame, timestamp) tuple, (False, None, 0.0) on timeout or once the producer has ended.
+        """
+        ring = self.ring
+
+        with ring._cond:
+            def ready():
+                return (ring._control[SharedFrameRing._HEAD] > self.Sequence or
+                        ring._control[SharedFrameRing._STATE] >= SharedFrameRing.ENDED)
+
+            if not ring._cond.wait_for(ready, timeout) or ring._control[SharedFrameRing._HEAD] <= self.Sequence:
+                return False, None, 0.0
+
+            slot = int(ring._control[SharedFrameRing._LATEST])
+            seq = int(ring._seqs[slot])
+            ring._pins[self.index] = slot
+
+            if self.Sequence > 0:
+                self.Dropped += seq - self.Sequence - 1
+            self.Sequence = seq
+            self.Timestamp = float(ring._stamps[slot])
+
+        return True, ring._frames[slot], self.Timestamp
+
+    def read(self):
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def release(self):
+        """Unpins the last frame."""
+        with self.ring._cond:
+            self.ring._pins[self.index] = -1
+
+
+def _capture(ring, device, opener, stop):
+    # Runs in the capture process until stopped, the capture fails or the parent goes away.
+    parent = multiprocessing.parent_process()
+    source = None
+
+    try:
+        source = opener(device)
+        if not source.isOpened():
+            return
+
+        # Cameras that cannot capture at the size of the ring are caught by the shape check.
+        source.set(cv2.CAP_PROP_FRAME_WIDTH, ring.shape[1])
+        source.set(cv2.CAP_PROP_FRAME_HEIGHT, ring.shape[0])
+
+        while not stop.is_set() and parent.is_alive():
+            slot, view = ring.claim()
+            ret, frame = source.read(view)
+
+            if ret is not True or frame is None:
+                break
+
+            if frame is not view:
+                # Captures that cannot fill the given buffer allocate their own.
+                if frame.shape != view.shape:
+                    ring.set_mismatch(frame.shape)
+                    break
+                np.copyto(view, frame)
+
+            ring.publish(slot, time.monotonic())
+
+            # Opening only ends with the first frame, so a camera of the wrong size fails to open.
+            if ring.State == SharedFrameRing.OPENING:
+                ring.set_state(SharedFrameRing.RUNNING)
+
+    finally:
+        if ring.State != SharedFrameRing.MISMATCH:
+            ring.set_state(SharedFrameRing.ENDED)
+
+        if source is not None:
+            source.release()
+        ring.close()
+
+
+class ProcessCamera:
+    """
+    Camera captured in its own process into a SharedFrameRing.
+
+    Usage: Use as a CameraManager opener, e.g. CameraManager(lambda device: ProcessCamera(rings[device], device)).
+    Has the read()/read_stamped() contract of a FrameGrabber, reading through reader 0 of the ring. The ring outlives
+    the camera, so another process reading from it keeps working across reconnects.
+        Params:
+            ring: The SharedFrameRing of the camera, its shape is the capture resolution.
+            device: The device path or PlatformType.
+            opener: Picklable function from a device to a cv2.VideoCapture-like source, run in the capture process.
+            timeout: Seconds to wait for the camera to open, and read() for a frame.
+            reader: The ring reader used by read().
+        Variables:
+            self.Captured: Frames captured, like FrameGrabber.Captured.
+            self.Error: Why the capture stopped when its frames did not fit the ring, None otherwise. ManagedCamera
+                reports it as its own Error.
+    """
+
+    def __init__(self, ring, device, opener=CamLib.cv_video_source, timeout=10.0, reader=0):
+        self.ring = ring
+        self.device = device
+        self.timeout = timeout
+        self._reader = ring.reader(reader)
+        self._start = ring.Sequence
+
+        context = multiprocessing.get_context("spawn")
+        ring.set_state(SharedFrameRing.OPENING)
+        self._stop = context.Event()
+        self._process = context.Process(target=_capture, args=(ring, device, opener, self._stop),
+                                        name="ProcessCamera %s" % device, daemon=True)
+        self._process.start()
+
+        # Spawning and opening take a while, ManagedCamera calls this on its own thread.
+        deadline = time.monotonic() + timeout
+        while ring.wait_state(0.1) == SharedFrameRing.OPENING and self._process.is_alive() and \
+                time.monotonic() < deadline:
+            pass
+
+    @property
+    def Captured(self):
+        return self.ring.Sequence - self._start
+
+    @property
+    def Error(self):
+        mismatch = self.ring.Mismatch
+        if mismatch is None:
+            return None
+
+        return "%s captures %dx%d frames, its ring holds %dx%d" % ((self.device,) + mismatch +
+                                                                    (self.ring.shape[1], self.ring.shape[0]))
+
+    def read_stamped(self):
+        return self._reader.read_stamped(min(self.timeout, 1.0))
+
+    def read(self):
+        ret, frame, stamp = self.read_stamped()
+
+        return ret, frame
+
+    def isOpened(self):
+        return self._process.is_alive() and self.ring.State == SharedFrameRing.RUNNING
+
+    def get(self, propId):
+        return {3: float(self.ring.shape[1]), 4: float(self.ring.shape[0])}.get(propId, 0.0)
+
+    def set(self, propId, value):
+        # Properties of a camera in another process cannot be set from here.
+        return False
+
+    def release(self):
+        """Stops the capture process. The ring is left to its creator."""
+        self._stop.set()
+        self._process.join(2.0)
+
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(1.0)
+
+        self.ring.set_state(SharedFrameRing.ENDED)
+        self._reader.release()
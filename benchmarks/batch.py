@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src import Src, ContourBatch
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of ContourBatch against calling Src.vision_assistance_contour on every frame of a memory-mapped stack of
+synthetic frames, and a check that both find the same targets.
+
+    python -m benchmarks.batch --frames 2000 --workers 4
+"""
+
+
+def run_loop(frames):
+    results = []
+    start = time.perf_counter()
+
+    for frame in frames:
+        results.append(Src.vision_assistance_contour(frame, compiled=True))
+
+    return time.perf_counter() - start, results
+
+
+def run_batch(frames, workers, chunk):
+    batch = ContourBatch(workers=workers, chunk=chunk)
+    # Worker startup is not part of the throughput.
+    batch.process(frames, 0, 1)
+
+    start = time.perf_counter()
+    result = batch.process(frames)
+    elapsed = time.perf_counter() - start
+    batch.close()
+
+    return elapsed, result
+
+
+def same(results, batch):
+    """Checks the batch result against the per-frame ones."""
+    frames, targets = batch
+
+    for i, (center, centers, bboxes) in enumerate(results):
+        rows = targets[frames['start'][i]:frames['start'][i] + frames['count'][i]]
+        if (not np.allclose(center, (frames['x'][i], frames['y'][i])) or
+                not np.array_equal(centers, np.stack((rows['cx'], rows['cy']), axis=1).astype(int)) or
+                not np.array_equal(bboxes, np.stack((rows['x'], rows['y'], rows['w'], rows['h']), axis=1))):
+            return False
+
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batch processing of a frame stack.")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() - 1))
+    parser.add_argument("--chunk", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    scene = SyntheticTargets(args.width, args.height, noise=8.0, clutter=20)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frames.npy")
+        stack = np.lib.format.open_memmap(path, 'w+', np.uint8, (args.frames, args.height, args.width, 3))
+        for i in range(args.frames):
+            stack[i] = scene.frame(i)
+        stack.flush()
+        del stack
+
+        frames = np.load(path, mmap_mode='r')
+        Src.vision_assistance_contour(frames[0], compiled=True)
+
+        loopTime, results = run_loop(frames)
+        batchTime, batch = run_batch(frames, args.workers, args.chunk)
+        serialTime, serial = run_batch(frames, 0, args.chunk)
+        del frames
+
+    print("%d frames at %dx%d, memory-mapped" % (args.frames, args.width, args.height))
+    print("    %-28s %10s %10s" % ("", "s", "frames/s"))
+    print("    %-28s %10.2f %10.0f" % ("vision_assistance_contour", loopTime, args.frames / loopTime))
+    print("    %-28s %10.2f %10.0f" % ("ContourBatch, in process", serialTime, args.frames / serialTime))
+    print("    %-28s %10.2f %10.0f" % ("ContourBatch, %d workers" % args.workers, batchTime, args.frames / batchTime))
+    print("    same targets: %s, %d targets" % (same(results, batch) and same(results, serial), len(batch.targets)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
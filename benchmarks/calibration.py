@@ -0,0 +1,103 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import RobotVision, HsvCalibration
+from src import Src
+from src.calibrate import CURRENT, preprocess
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of HsvCalibration on synthetic frames labeled with the true target polygons. Reports the histogram build
+time, how many threshold boxes are scored per second, the search time, and checks the histogram scores against
+running hsv_threshold on held-out frames.
+
+    python -m benchmarks.calibration --frames 60
+"""
+
+
+def label(scene, index):
+    """Gets the true target mask of a frame, at the processing resolution."""
+    width, height = Src.CONTOUR_SIZE
+    scale = (width / scene.width, height / scene.height)
+    mask = np.zeros((height, width), np.uint8)
+
+    for strip in scene.target_points(index):
+        cv2.fillConvexPoly(mask, np.round(strip * scale).astype(np.int32), 255)
+
+    return mask
+
+
+def measured(frames, masks, hue, sat, val):
+    """Gets the F-score, precision and recall of ranges by thresholding the frames."""
+    tp = fp = total = 0
+
+    for frame, mask in zip(frames, masks):
+        found = RobotVision.hsv_threshold(frame, hue, sat, val) != 0
+        target = mask != 0
+        tp += np.count_nonzero(found & target)
+        fp += np.count_nonzero(found & ~target)
+        total += np.count_nonzero(target)
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / total if total else 0.0
+    fscore = 2 * precision * recall / (precision + recall) if tp else 0.0
+
+    return fscore, precision, recall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HSV threshold calibration.")
+    parser.add_argument("--frames", type=int, default=60, help="labeled frames, as many again are held out")
+    parser.add_argument("--boxes", type=int, default=100000, help="random boxes scored for the rate")
+    args = parser.parse_args(argv)
+
+    scene = SyntheticTargets(640, 480, noise=8.0, clutter=40)
+    frames = [preprocess(scene.frame(i)) for i in range(2 * args.frames)]
+    masks = [label(scene, i) for i in range(2 * args.frames)]
+
+    calibration = HsvCalibration()
+    start = time.perf_counter()
+    for frame, mask in zip(frames[:args.frames], masks[:args.frames]):
+        calibration.add(frame, mask)
+    build = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    bins = np.array(calibration.bins)
+    a, b = rng.integers(0, bins, (args.boxes, 3)), rng.integers(0, bins, (args.boxes, 3))
+    calibration.score(a[:1], b[:1])
+    start = time.perf_counter()
+    calibration.score(np.minimum(a, b), np.maximum(a, b))
+    rate = args.boxes / (time.perf_counter() - start)
+
+    evaluated = calibration.Evaluated
+    start = time.perf_counter()
+    hue, sat, val = calibration.search(start=CURRENT)
+    search = time.perf_counter() - start
+
+    print("%d labeled frames at %dx%d" % (args.frames, Src.CONTOUR_SIZE[0], Src.CONTOUR_SIZE[1]))
+    print("    histograms      %8.2f ms per frame" % (build / args.frames * 1000))
+    print("    scoring         %8.0f boxes per second" % rate)
+    print("    search          %8.1f ms, %d boxes" % (search * 1000, calibration.Evaluated - evaluated))
+
+    print("    %-10s %-10s %-10s %-10s %22s %22s" % ("", "hue", "sat", "val", "F/P/R histogram", "F/P/R held out"))
+    for name, ranges in (("current", CURRENT), ("calibrated", (hue, sat, val))):
+        score = calibration.evaluate(*ranges)
+        held = measured(frames[args.frames:], masks[args.frames:], *ranges)
+        print("    %-10s %-10s %-10s %-10s %6.3f %6.3f %6.3f   %6.3f %6.3f %6.3f" % (
+            name, ranges[0], ranges[1], ranges[2], score["fscore"], score["precision"], score["recall"], *held))
+
+    # Bin-aligned ranges are scored exactly, check against thresholding the same frames.
+    exact = measured(frames[:args.frames], masks[:args.frames], hue, sat, val)
+    if abs(exact[0] - calibration.evaluate(hue, sat, val)["fscore"]) > 1e-9:
+        print("Histogram score differs from hsv_threshold")
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
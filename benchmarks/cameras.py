@@ -0,0 +1,116 @@
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+from basicvislib5549 import CameraManager, FrameGrabber
+
+"""
+Benchmark of CameraManager with simulated cameras. Compares getting a camera for a new mode from the manager with
+opening it again, and times how long a camera that is unplugged takes to deliver frames again once plugged back in.
+
+There is no camera here, a simulated one delivers frames at --fps and takes --open seconds to open, a stand-in for a
+V4L2 device.
+
+    python -m benchmarks.cameras --open 0.5
+"""
+
+
+class SimulatedCamera:
+    """VideoCapture stand-in that can be unplugged, see SimulatedCamera.Plugged."""
+
+    # Shared by every instance, like the USB port.
+    Plugged = threading.Event()
+
+    def __init__(self, device, fps, opened):
+        time.sleep(opened)
+        self._period = 1 / fps
+        self._next = time.monotonic()
+        self._open = SimulatedCamera.Plugged.is_set()
+
+    def read(self, image=None):
+        self._next += self._period
+        time.sleep(max(0.0, self._next - time.monotonic()))
+
+        if not SimulatedCamera.Plugged.is_set():
+            self._open = False
+            return False, None
+
+        if image is None:
+            image = np.zeros((480, 640, 3), np.uint8)
+
+        return True, image
+
+    def isOpened(self):
+        return self._open
+
+    def get(self, propId):
+        return {3: 640, 4: 480}.get(propId, 0)
+
+    def set(self, propId, value):
+        return False
+
+    def release(self):
+        self._open = False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the camera manager.")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--open", type=float, default=0.5, help="stand-in seconds to open a camera")
+    parser.add_argument("--unplugged", type=float, default=2.0, help="seconds the camera stays unplugged")
+    args = parser.parse_args(argv)
+
+    def opener(device):
+        return FrameGrabber(SimulatedCamera(device, args.fps, args.open))
+
+    SimulatedCamera.Plugged.set()
+    cameras = CameraManager(opener, minBackoff=0.1, maxBackoff=1.0)
+
+    start = time.perf_counter()
+    camera = cameras.open("/dev/video1")
+    camera.wait()
+    print("first open                  %8.1f ms" % ((time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    shared = cameras.open("/dev/video1")
+    ret, frame = shared.read()
+    print("mode switch, shared camera  %8.1f ms to the first frame" % ((time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    reopened = opener("/dev/video1")
+    ret, frame = reopened.read()
+    reopened.release()
+    print("mode switch, reopened       %8.1f ms to the first frame" % ((time.perf_counter() - start) * 1000))
+
+    time.sleep(1.0)
+    camera.status()
+    time.sleep(1.0)
+    print("frame rate                  %8.1f fps" % camera.status()["fps"])
+
+    SimulatedCamera.Plugged.clear()
+    while camera.read()[0]:
+        pass
+    print("unplugged                   connected=%s" % camera.Connected)
+
+    deadline = time.monotonic() + args.unplugged
+    while time.monotonic() < deadline:
+        camera.read()
+        time.sleep(0.01)
+
+    SimulatedCamera.Plugged.set()
+    start = time.perf_counter()
+    while not camera.read()[0]:
+        time.sleep(0.001)
+    print("plugged back in             %8.1f ms to the first frame, backoff %.2f s, %d connects, %d disconnects" % (
+        (time.perf_counter() - start) * 1000, camera.Backoff, camera.Connects, camera.Disconnects))
+
+    cameras.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import argparse
+import sys
+import threading
+import time
+
+from comms.nettable import TableState
+from comms.scheduler import LoopScheduler
+
+"""
+Checks that an idle TXClient-style loop costs next to no CPU, and that a running one holds its rate. Uses a local
+TableState in place of NetworkTables, toggled from a second thread.
+
+    python -m benchmarks.idle --seconds 3
+"""
+
+
+def loop(state, scheduler, seconds):
+    """Runs the TXClient main-loop pattern for a while.
+    Returns:
+        A (iterations, cpu seconds) tuple.
+    """
+    iterations = 0
+    end = time.monotonic() + seconds
+    cpu = time.process_time()
+
+    while time.monotonic() < end:
+        version = state.Version
+        iterations += 1
+
+        if state.Enabled is True:
+            scheduler.pace()
+
+        else:
+            scheduler.idle(version)
+
+    return iterations, time.process_time() - cpu
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure idle CPU use and pacing of the main loop scheduler.")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=30.0)
+    parser.add_argument("--max-idle-cpu", type=float, default=0.02, help="allowed CPU fraction while idle")
+    args = parser.parse_args(argv)
+
+    state = TableState()
+    state.set("Enabled", False)
+    scheduler = LoopScheduler(state, args.rate, heartbeat=0.5)
+
+    iterations, cpu = loop(state, scheduler, args.seconds)
+    idle = cpu / args.seconds
+    print("idle      %6d iterations  %5.2f%% CPU" % (iterations, idle * 100))
+
+    threading.Timer(0.1, state.set, ("Enabled", True)).start()
+    iterations, cpu = loop(state, scheduler, args.seconds)
+    print("running   %6d iterations  %5.1f/s (target %g)  missed %d" % (
+        iterations, iterations / args.seconds, args.rate, scheduler.Missed))
+
+    if idle > args.max_idle_cpu:
+        print("FAIL: idle loop used %.2f%% CPU" % (idle * 100))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
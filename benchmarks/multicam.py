@@ -0,0 +1,106 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+
+from src import Src, CameraWorkers
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of processing several cameras in turn on one thread against CameraWorkers. The cameras are file-backed:
+synthetic frames are written to MJPG files first, so decoding stands in for the capture cost.
+
+    python -m benchmarks.multicam --cameras 2 --frames 300
+"""
+
+
+def write_videos(directory, cameras, frames, width, height):
+    """Writes one synthetic MJPG video per camera.
+    Returns:
+        The list of video paths.
+    """
+    paths = []
+
+    for camera in range(cameras):
+        path = os.path.join(directory, "camera%d.avi" % camera)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+        scene = SyntheticTargets(width, height, noise=6.0, clutter=20, seed=5549 + camera)
+
+        for frame in scene.frames(frames):
+            writer.write(frame)
+
+        writer.release()
+        paths.append(path)
+
+    return paths
+
+
+def sequential(paths, frames):
+    sources = [cv2.VideoCapture(path) for path in paths]
+    start = time.perf_counter()
+
+    for i in range(frames):
+        for source in sources:
+            ret, frame = source.read()
+            Src.vision_assistance_contour(frame, compiled=True)
+
+    elapsed = time.perf_counter() - start
+
+    for source in sources:
+        source.release()
+
+    return frames / elapsed
+
+
+def parallel(paths, frames):
+    sources = [cv2.VideoCapture(path) for path in paths]
+    workers = CameraWorkers(sources, compiled=True)
+    start = time.perf_counter()
+
+    for i in range(frames):
+        workers.process()
+
+    elapsed = time.perf_counter() - start
+    workers.close()
+
+    for source in sources:
+        source.release()
+
+    return frames / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sequential against parallel multi-camera processing.")
+    parser.add_argument("--cameras", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="multicam")
+
+    try:
+        paths = write_videos(directory, args.cameras, args.frames, args.width, args.height)
+        # Build the shared threshold table before timing.
+        Src.vision_assistance_contour(SyntheticTargets(args.width, args.height).frame(0), compiled=True)
+
+        seq = sequential(paths, args.frames)
+        par = parallel(paths, args.frames)
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("%d cameras, %d frames each at %dx%d" % (args.cameras, args.frames, args.width, args.height))
+    print("    sequential     %7.1f sets/s" % seq)
+    print("    CameraWorkers  %7.1f sets/s" % par)
+    print("    speedup        %7.2fx" % (par / seq))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import sys
+import threading
+
+from comms.nettable import ConnectTable
+
+"""
+Checks ConnectTable against a local stand-in for NetworkTables, no server needed: batched writes only send changed
+values, a key the dashboard overwrites is written again when the client puts it back, and a failed connection
+attempt does not count as connected.
+
+    python -m benchmarks.nettable
+"""
+
+
+class LocalTable:
+    """Table of the stand-in, remote() writes a value like the dashboard would."""
+
+    def __init__(self):
+        self.values = {}
+        self.listeners = {}
+        self.Puts = 0
+
+    def getValue(self, key, default):
+        return self.values.get(key, default)
+
+    def putValue(self, key, value):
+        self.Puts += 1
+        self._set(key, value)
+
+    def remote(self, key, value):
+        self._set(key, value)
+
+    def _set(self, key, value):
+        self.values[key] = value
+        for listener in self.listeners.get(key, ()):
+            listener(self, key, value, False)
+
+    def addEntryListener(self, listener, immediateNotify=True, key=None, localNotify=True):
+        self.listeners.setdefault(key, []).append(listener)
+
+
+class LocalNetworkTables:
+    """Stand-in for the NetworkTables class of pynetworktables, connect() connects it."""
+
+    def __init__(self, connected=True):
+        self.table = LocalTable()
+        self.Flushes = 0
+        self.connected = connected
+        self.listeners = []
+
+    def initialize(self, server=None):
+        pass
+
+    def addConnectionListener(self, listener, immediateNotify=True):
+        self.listeners.append(listener)
+        if immediateNotify:
+            listener(self.connected, "local")
+
+    def connect(self, connected=True):
+        self.connected = connected
+        for listener in self.listeners:
+            listener(connected, "local")
+
+    def getTable(self, name):
+        return self.table
+
+    def flush(self):
+        self.Flushes += 1
+
+
+def main(argv=None):
+    networktables = LocalNetworkTables()
+    client = ConnectTable(networktables=networktables)
+    state = client.subscribe({"Number": 0})
+    table = networktables.table
+    failures = []
+
+    client.putBatch({"tableExists": True})
+    client.flush()
+    client.putBatch({"tableExists": True})
+    client.flush()
+    if table.Puts != 1:
+        failures.append("an unchanged value was written again (%d puts)" % table.Puts)
+
+    # The dashboard sets Number, the client resets it, twice over.
+    for attempt in range(2):
+        table.remote("Number", 1)
+        if state.Number != 1:
+            failures.append("the state missed a remote write")
+
+        client.putBatch({"Number": 0})
+        client.flush()
+        if table.getValue("Number", None) != 0:
+            failures.append("reset %d of a key the dashboard overwrote was not written" % (attempt + 1))
+
+    # Failed attempts are reported with connected=False, only a real connection ends wait().
+    offline = LocalNetworkTables(connected=False)
+    connecting = ConnectTable(networktables=offline, wait=False)
+    offline.connect(False)
+    if connecting.wait(0.1):
+        failures.append("a failed connection attempt counted as connected")
+
+    threading.Timer(0.1, offline.connect).start()
+    if not connecting.wait(2.0):
+        failures.append("wait() did not return once connected")
+
+    for failure in failures:
+        print("FAIL: %s" % failure)
+
+    if not failures:
+        print("ok: %d puts, %d flushes" % (table.Puts, networktables.Flushes))
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
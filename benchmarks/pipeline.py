@@ -0,0 +1,217 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import RobotVision, FramePool, FrameContext, PipelineGraph
+from src import Src
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of the vision pipeline on synthetic frames. Times every RobotVision stage of Src.vision_assistance_contour
+on its own, the whole contour and camshift pipelines, and writes the results as JSON so two commits can be compared.
+
+    python -m benchmarks.pipeline --out before.json
+    python -m benchmarks.pipeline --out after.json --compare before.json
+"""
+
+
+class StageTimes:
+    """Per-stage frame times of one scene, in seconds."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+        return result
+
+    def summary(self):
+        """Gets fps and mean/p50/p95/p99 milliseconds per stage."""
+        summary = {}
+
+        for stage, samples in self.samples.items():
+            samples = np.array(samples) * 1000
+            mean = samples.mean()
+            summary[stage] = {
+                "frames": len(samples),
+                "mean_ms": mean,
+                "p50_ms": np.percentile(samples, 50),
+                "p95_ms": np.percentile(samples, 95),
+                "p99_ms": np.percentile(samples, 99),
+                "fps": 1000 / mean if mean > 0 else float('inf'),
+            }
+
+        return summary
+
+
+def _camshift_model(scene, size=None):
+    frame = scene.frame(0)
+    strip = np.round(scene.target_points(0)[0]).astype(np.int32)
+
+    if size is not None:
+        # Window and histogram of the frame resized to size, like Src.vision_assistance_camshift(size=size) sees it.
+        strip = np.round(strip * (size[0] / frame.shape[1], size[1] / frame.shape[0])).astype(np.int32)
+        frame = RobotVision.resize_image(frame, size[0], size[1], cv2.INTER_CUBIC)
+
+    mask = np.zeros(frame.shape[:2], np.uint8)
+    cv2.fillConvexPoly(mask, strip, 255)
+
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    roi_hist = cv2.calcHist([hsv], [0], mask, [180], [0, 180])
+    cv2.normalize(roi_hist, roi_hist, 0, 255, cv2.NORM_MINMAX)
+
+    return cv2.boundingRect(strip), roi_hist
+
+
+def _shared(frame, window, roi_hist, context=None):
+    """Runs the contour pipeline and camshift at CONTOUR_SIZE, two consumers of one frame that both resize it."""
+    Src.vision_assistance_contour(frame, compiled=True, context=context)
+    return Src.vision_assistance_camshift(frame, window, roi_hist, context=context, size=Src.CONTOUR_SIZE)[0]
+
+
+def run_scene(scene, frames, warmup=5):
+    """Runs every stage over the frames of a scene.
+    Args:
+        scene: A SyntheticTargets.
+        frames: Number of timed frames.
+        warmup: Untimed frames run first, so table builds and lazy initialization are not counted.
+    Returns:
+        A dict of stage name to summary, see StageTimes.summary().
+    """
+    rv = RobotVision
+    times = StageTimes()
+    pool = FramePool()
+    context = FrameContext()
+    graph = PipelineGraph(Src.CONTOUR_GRAPH, pool=FramePool())
+    images = [scene.frame(i) for i in range(frames + warmup)]
+    window, roi_hist = _camshift_model(scene)
+    small, small_hist = _camshift_model(scene, Src.CONTOUR_SIZE)
+
+    for i, frame in enumerate(images):
+        if i == warmup:
+            times = StageTimes()
+            context = FrameContext()
+
+        resized = times.time("resize_image", rv.resize_image, frame, *Src.CONTOUR_SIZE, cv2.INTER_CUBIC)
+        blurred = times.time("blur", rv.blur, resized, rv.BlurType.BOX_BLUR, Src.CONTOUR_BLUR)
+        adjusted = times.time("brightness_contrast", rv.brightness_contrast, blurred, *Src.CONTOUR_THRESHOLD[:2])
+        mask = times.time("hsv_threshold", rv.hsv_threshold, adjusted, *Src.CONTOUR_THRESHOLD[2:])
+        times.time("compiled_threshold", Src.compiled_threshold(*Src.CONTOUR_THRESHOLD).apply, blurred)
+        contours = times.time("find_contours", rv.find_contours, mask, False)
+        times.time("filter_contour_features", rv.filter_contour_features, contours, *Src.CONTOUR_FILTER)
+
+        times.time("vision_assistance_contour", Src.vision_assistance_contour, frame)
+        times.time("vision_assistance_contour[compiled,pool]", Src.vision_assistance_contour, frame,
+                   compiled=True, pool=pool)
+        times.time("vision_assistance_graph[compiled,pool]", Src.vision_assistance_graph, frame, graph)
+        window = times.time("vision_assistance_camshift", Src.vision_assistance_camshift, frame, window,
+                            roi_hist)[0]
+        times.time("contour + camshift", _shared, frame, small, small_hist)
+        small = times.time("contour + camshift[context]", _shared, frame, small, small_hist, context)
+
+        if window[2] <= 0 or window[3] <= 0:
+            window, roi_hist = _camshift_model(scene)
+        if small[2] <= 0 or small[3] <= 0:
+            small, small_hist = _camshift_model(scene, Src.CONTOUR_SIZE)
+
+    graph.close()
+
+    return times.summary(), context.stats()
+
+
+def _metadata():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Prints the p50 change of every stage against a baseline.
+    Returns:
+        The list of (scene, stage, ratio) that got slower than 1 + tolerance.
+    """
+    regressions = []
+
+    for name, stages in results["scenes"].items():
+        for stage, summary in stages.items():
+            base = baseline["scenes"].get(name, {}).get(stage)
+            if base is None or base["p50_ms"] <= 0:
+                continue
+
+            ratio = summary["p50_ms"] / base["p50_ms"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                regressions.append((name, stage, ratio))
+                flag = "  REGRESSION"
+
+            print("%-32s %-42s %8.3f -> %8.3f ms  %+6.1f%%%s" % (
+                name, stage, base["p50_ms"], summary["p50_ms"], (ratio - 1) * 100, flag))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the vision pipeline on synthetic frames.")
+    parser.add_argument("--frames", type=int, default=100, help="timed frames per scene")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="p50 slowdown reported as a regression")
+    parser.add_argument("--quick", action="store_true", help="only run the 640x480 noisy cluttered scene")
+    args = parser.parse_args(argv)
+
+    scenes = SyntheticTargets.scenes()
+    if args.quick:
+        scenes = {name: scene for name, scene in scenes.items() if name == "640x480_noise8_clutter40"}
+
+    results = {"meta": _metadata(), "scenes": {}}
+
+    for name, scene in scenes.items():
+        summary, shared = run_scene(scene, args.frames)
+        results["scenes"][name] = summary
+
+        print(name)
+        for stage, stats in summary.items():
+            print("    %-42s %8.1f fps  p50 %7.3f  p95 %7.3f  p99 %7.3f ms" % (
+                stage, stats["fps"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]))
+
+        # Only a lookup by the other pipeline can hit, each one computes an intermediate at most once per frame.
+        print("    context: %d hits, %d misses over %d frames" % (shared["hits"], shared["misses"], shared["frames"]))
+        for intermediate, counts in shared["intermediates"].items():
+            print("        %-40s %6d hits %6d misses" % (intermediate, counts["hits"], counts["misses"]))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        if compare(results, baseline, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from src import Src, PyramidDetector
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of PyramidDetector against Src.vision_assistance_contour. Both run on the same synthetic frames, the centers
+of the contour pipeline are scaled from its processing resolution back to the frame's, and every found strip center is
+compared with the true one in full-resolution pixels. The pyramid is also run as a mode of the contour pipeline,
+reporting in its pixels like the other modes.
+
+    python -m benchmarks.pyramid --frames 120 --scale 0.28 0.4
+"""
+
+
+def errors(found, expected):
+    """Gets the distance of each true strip center to the nearest found one, None if fewer than two were found."""
+    found = np.asarray(found, float)
+    if len(found) < 2:
+        return None
+
+    return np.linalg.norm(found[:, None] - expected[None], axis=2).min(axis=0)
+
+
+def run(detect, frames, expected, scale):
+    found = []
+    start = time.perf_counter()
+
+    for frame in frames:
+        found.append(detect(frame)[1])
+
+    elapsed = (time.perf_counter() - start) / len(frames)
+    distances = [errors(np.asarray(centers, float).reshape(-1, 2) * scale + (scale - 1) / 2, truth)
+                 for centers, truth in zip(found, expected)]
+    distances = [d for d in distances if d is not None]
+
+    return elapsed, len(distances), np.concatenate(distances) if distances else np.zeros(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PyramidDetector against the contour pipeline.")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--scale", type=float, nargs=2, default=(0.28, 0.6),
+                        help="Range of the target width as a fraction of the frame width.")
+    parser.add_argument("--factor", type=int, default=4, help="Downsampling of the coarse pass.")
+    parser.add_argument("--clutter", type=int, default=20, help="Blobs scattered around the targets.")
+    args = parser.parse_args(argv)
+
+    scene = SyntheticTargets(args.width, args.height, noise=8.0, clutter=args.clutter, scale=tuple(args.scale))
+    frames = list(scene.frames(args.frames))
+    expected = [np.array([strip.mean(axis=0) for strip in scene.target_points(i)]) for i in range(args.frames)]
+    detector = PyramidDetector(factor=args.factor)
+
+    # Build the shared threshold table and the buffers before timing.
+    Src.vision_assistance_contour(frames[0], compiled=True)
+    detector.process(frames[0])
+    detector.CoarseOnly = detector.Refined = detector.Grown = detector.FullFrames = 0
+
+    contourScale = np.array([args.width / Src.CONTOUR_SIZE[0], args.height / Src.CONTOUR_SIZE[1]])
+    rows = [("contour %dx%d" % Src.CONTOUR_SIZE,) + run(lambda frame: Src.vision_assistance_contour(
+                frame, compiled=True), frames, expected, contourScale),
+            ("pyramid /%d" % args.factor,) + run(detector.process, frames, expected, np.ones(2)),
+            ("pyramid mode",) + run(lambda frame: Src.vision_assistance_contour(frame, pyramid=detector), frames,
+                                    expected, contourScale)]
+
+    print("%d frames at %dx%d, targets %.2f-%.2f of the width" % (args.frames, args.width, args.height, *args.scale))
+    print("    %-18s %8s %8s %12s %12s" % ("", "ms", "found", "mean err px", "max err px"))
+    for name, elapsed, found, distances in rows:
+        print("    %-18s %8.2f %8d %12.2f %12.2f" % (name, elapsed * 1000, found,
+                                                     distances.mean() if len(distances) else np.nan,
+                                                     distances.max() if len(distances) else np.nan))
+    print("    pyramid: %d frames refined in windows, %d windows grown, %d frames in full, %d without candidates" % (
+        detector.Refined, detector.Grown, detector.FullFrames, detector.CoarseOnly))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import argparse
+import sys
+import time
+
+from comms.quality import QualityController
+from src import Src
+from .synthetic import SyntheticTargets
+
+"""
+Runs the TXClient single camera loop on synthetic frames under a load step: for the middle phase the pipeline is made
+that many times slower, as on a CPU shared with a busy process. Prints the quality level and frame time once a second,
+showing the controller step down under load and back up afterwards. The stream levels have no cost here since nothing
+is streamed.
+
+First checks the controller on synthetic frame times, without running anything: under constant load it settles on a
+level and does not step up, once the load is gone it goes back to full quality.
+
+    python -m benchmarks.quality --seconds 6 --slowdown 20
+"""
+
+
+def burn(seconds):
+    """Keeps the CPU busy for a while, like competing work would."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def simulate(quality, cost, frames, skipped=0):
+    """Feeds the controller frame times of a pipeline costing cost seconds per detection at full resolution, with the
+    TXClient cadence.
+    Returns:
+        A (steps up, skipped) tuple, skipped to carry the cadence on.
+    """
+    recovers = quality.Recovers
+
+    for i in range(frames):
+        level = quality.Current
+        detect = skipped == 0
+        skipped = (skipped + 1) % level.detectEvery
+        # Processing scales with the pixels, plus the capture and publishing that every frame pays.
+        quality.update(0.0005 + (cost * level.processScale ** 2 if detect else 0.0))
+
+    return quality.Recovers - recovers, skipped
+
+
+def check_constant_load(period):
+    """Checks that quality holds steady under constant load and recovers without it.
+    Returns:
+        A list of failures.
+    """
+    failures = []
+
+    # Over budget at full resolution only, over it at 0.75 too, and over the frame period on every detection.
+    for factor in (1.2, 1.5, 1.9):
+        quality = QualityController(0.8 * period, window=15)
+        ups, skipped = simulate(quality, factor * 0.8 * period, 3000)
+        settled = quality.Current.name
+
+        if quality.Level == 0:
+            failures.append("%.1fx the budget: quality was not lowered" % factor)
+        elif ups:
+            failures.append("%.1fx the budget: %d steps up under constant load, %d down" % (
+                factor, ups, quality.Degrades))
+
+        ups, skipped = simulate(quality, 0.002, 3000, skipped)
+        if quality.Level != 0:
+            failures.append("%.1fx the budget: still at '%s' once the load was gone" % (factor, quality.Current.name))
+
+        print("    %.1fx the budget: settled at '%s' after %d steps down, back to full in %d steps up" % (
+            factor, settled, quality.Degrades, ups))
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the adaptive quality levels under a simulated load step.")
+    parser.add_argument("--seconds", type=float, default=6.0, help="length of each phase: before, under and after load")
+    parser.add_argument("--rate", type=float, default=30.0)
+    parser.add_argument("--slowdown", type=float, default=20.0, help="pipeline cost multiplier under load")
+    parser.add_argument("--window", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    period = 1.0 / args.rate
+    print("synthetic frame times at %g/s" % args.rate)
+    failures = check_constant_load(period)
+    for failure in failures:
+        print("FAIL: %s" % failure)
+    if failures:
+        return 1
+
+    frames = list(SyntheticTargets(moving=True).frames(60))
+    quality = QualityController(0.8 * period, window=args.window)
+    skipped = 0
+    total = 3 * args.seconds
+    start = time.monotonic()
+    report = start + 1.0
+    index = 0
+    missed = 0
+
+    print("budget %.1f ms at %g/s, pipeline %gx slower from %gs to %gs" % (
+        quality.budget * 1000, args.rate, args.slowdown, args.seconds, 2 * args.seconds))
+    print("    %6s %24s %10s %8s" % ("s", "level", "frame ms", "missed"))
+
+    while time.monotonic() - start < total:
+        begin = time.perf_counter()
+        level = quality.Current
+
+        # Same cadence as TXClient._detect.
+        if skipped == 0:
+            Src.vision_assistance_contour(frames[index % len(frames)], compiled=True, contours=True,
+                                          scale=level.processScale)
+
+            if args.seconds <= time.monotonic() - start < 2 * args.seconds:
+                burn((args.slowdown - 1) * (time.perf_counter() - begin))
+        skipped = (skipped + 1) % level.detectEvery
+
+        elapsed = time.perf_counter() - begin
+        quality.update(elapsed)
+        index += 1
+
+        if elapsed > period:
+            missed += 1
+        else:
+            time.sleep(period - elapsed)
+
+        if time.monotonic() >= report:
+            print("    %6.0f %24s %10.2f %8d" % (report - start, quality.Current.name, quality.FrameTime * 1000,
+                                                 missed))
+            report += 1.0
+
+    print("%d steps down, %d steps up" % (quality.Degrades, quality.Recovers))
+
+    if quality.Degrades == 0 or quality.Recovers == 0:
+        print("FAIL: quality did not step down under load and back up after it")
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import FrameGrabber, ProcessCamera, SharedFrameRing
+from src import Src
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of the multi-process layout against the single-process loop. Both run the same three stages for --seconds:
+a simulated MJPEG camera decoding at --fps, the contour pipeline on the newest frame, and a dashboard stream stand-in
+rotating and JPEG encoding the newest frame at --stream fps (VideoStream needs cscore, which the benchmark does not).
+
+    single:  FrameGrabber thread, vision loop and stream thread in one process
+    process: ProcessCamera capturing into a SharedFrameRing, the vision loop, and a stream process reading the ring
+
+Also checks that the segment of a ring is removed when the client that created it is killed.
+
+    python -m benchmarks.sharedring --seconds 5
+"""
+
+
+class SimulatedCapture:
+    """VideoCapture stand-in delivering JPEG-decoded synthetic frames at a fixed rate."""
+
+    def __init__(self, device, fps=30.0, width=640, height=480):
+        scene = SyntheticTargets(width, height, noise=8.0, clutter=20, moving=True)
+        self._jpegs = [cv2.imencode('.jpg', scene.frame(i))[1] for i in range(30)]
+        self._period = 1 / fps
+        self._next = time.monotonic()
+        self._count = 0
+
+    def read(self, image=None):
+        self._next += self._period
+        time.sleep(max(0.0, self._next - time.monotonic()))
+
+        frame = cv2.imdecode(self._jpegs[self._count % len(self._jpegs)], cv2.IMREAD_COLOR)
+        self._count += 1
+
+        if image is not None:
+            np.copyto(image, frame)
+            return True, image
+
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def get(self, propId):
+        return {3: 640, 4: 480}.get(propId, 0)
+
+    def set(self, propId, value):
+        return False
+
+    def release(self):
+        pass
+
+
+def open_simulated(device, fps=30.0):
+    return SimulatedCapture(device, fps)
+
+
+def encode(frame):
+    """Stream stand-in for VideoStream's rotate, scale and MJPEG encode."""
+    rotated = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+
+    return cv2.imencode('.jpg', cv2.resize(rotated, (240, 320), interpolation=cv2.INTER_AREA))[1]
+
+
+def stream_reader(ring, fps, sent, stop):
+    # The stream process of the multi-process layout.
+    reader = ring.reader(1)
+    last = 0.0
+
+    while not stop.is_set():
+        wait = last + 1.0 / fps - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        last = time.monotonic()
+
+        ret, frame, stamp = reader.read_stamped(0.5)
+        if ret:
+            encode(frame)
+            sent.value += 1
+
+    reader.release()
+
+
+def vision(read, seconds):
+    """Runs the contour pipeline on the newest frame for a while.
+    Returns:
+        (frames, latencies) of the vision loop, latency from capture to result.
+    """
+    latencies = []
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        ret, frame, stamp = read()
+        if not ret:
+            continue
+
+        Src.vision_assistance_contour(frame, compiled=True, contours=True)
+        latencies.append(time.monotonic() - stamp)
+
+    return len(latencies), np.array(latencies)
+
+
+def run_single(args):
+    grabber = FrameGrabber(SimulatedCapture(None, args.fps))
+    latest = [None]
+    sent = [0]
+    stop = threading.Event()
+
+    def stream():
+        last = 0.0
+        while not stop.is_set():
+            wait = last + 1.0 / args.stream - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            last = time.monotonic()
+
+            frame = latest[0]
+            if frame is not None:
+                encode(frame)
+                sent[0] += 1
+
+    def read():
+        ret, frame, stamp = grabber.read_stamped()
+        # VideoStream.putFrame copies the frame for its thread.
+        latest[0] = frame.copy() if ret else None
+        return ret, frame, stamp
+
+    thread = threading.Thread(target=stream, daemon=True)
+    thread.start()
+    frames, latencies = vision(read, args.seconds)
+    stop.set()
+    thread.join()
+    grabber.release()
+
+    return frames, latencies, sent[0], grabber.Captured
+
+
+def run_process(args):
+    context = multiprocessing.get_context("spawn")
+    ring = SharedFrameRing((480, 640, 3), slots=4, readers=2)
+    camera = ProcessCamera(ring, None, open_simulated)
+    sent = context.Value('q', 0)
+    stop = context.Event()
+    streamer = context.Process(target=stream_reader, args=(ring, args.stream, sent, stop), daemon=True)
+    streamer.start()
+
+    frames, latencies = vision(camera.read_stamped, args.seconds)
+    captured = camera.Captured
+
+    stop.set()
+    streamer.join()
+    camera.release()
+    ring.close()
+
+    return frames, latencies, sent.value, captured
+
+
+# A client with a ring and a capture process, killed once it runs. It is started as its own interpreter like
+# TXClient, processes started with multiprocessing share the resource tracker of this one.
+CRASHED = """
+import time
+from basicvislib5549 import ProcessCamera, SharedFrameRing
+from benchmarks.sharedring import open_simulated
+ring = SharedFrameRing((480, 640, 3))
+camera = ProcessCamera(ring, None, open_simulated)
+print(ring.name, flush=True)
+time.sleep(60)
+"""
+
+
+def check_cleanup():
+    """Kills a client that created a ring and waits for its segment to be removed.
+    Returns:
+        Seconds until the segment was gone, None if it was not within 5 seconds.
+    """
+    client = subprocess.Popen([sys.executable, "-c", CRASHED], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    name = client.stdout.readline().strip()
+
+    client.send_signal(signal.SIGKILL)
+    client.wait()
+    start = time.monotonic()
+
+    while time.monotonic() - start < 5.0:
+        if not os.path.exists(os.path.join("/dev/shm", name)):
+            return time.monotonic() - start
+        time.sleep(0.01)
+
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shared-memory multi-process layout.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=30.0, help="simulated camera frame rate")
+    parser.add_argument("--stream", type=float, default=15.0, help="stream frame rate")
+    args = parser.parse_args(argv)
+
+    Src.vision_assistance_contour(np.zeros((480, 640, 3), np.uint8), compiled=True)
+
+    print("%.0f s, camera at %.0f fps, stream at %.0f fps, %d cores" % (args.seconds, args.fps, args.stream,
+                                                                       os.cpu_count()))
+    print("    %-10s %10s %10s %12s %12s %10s" % ("", "captured", "vision", "latency p50", "latency p99",
+                                                  "streamed"))
+    for name, run in (("single", run_single), ("process", run_process)):
+        frames, latencies, sent, captured = run(args)
+        print("    %-10s %10d %10d %9.1f ms %9.1f ms %10d" % (name, captured, frames,
+                                                             np.percentile(latencies, 50) * 1000,
+                                                             np.percentile(latencies, 99) * 1000, sent))
+
+    removed = check_cleanup()
+    print("    segment of a killed client removed %s" % ("after %.2f s" % removed if removed is not None else
+                                                         "NOT within 5 s"))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+_started = time.perf_counter()
+
+"""
+Benchmark of TXClient's startup, time from process start to the first processed frame. Each variant runs in a fresh
+interpreter so imports and OpenCV's lazy initialization are cold:
+
+    lazy:        connect, then open the camera and build the tables on the first frame (the old startup)
+    sequential:  connect, open both cameras and warm up, one after the other
+    concurrent:  the same phases at once, like TXClient now does
+
+There is no roboRIO or camera here, so connecting is a sleep of --connect seconds and opening a camera opens a video
+file and sleeps --open seconds, stand-ins for the latency of the real ones.
+
+    python -m benchmarks.startup --connect 1.0 --open 0.5
+"""
+
+
+def _child(variant, videos, connect, opened):
+    import numpy as np
+    from basicvislib5549 import CamLib
+    import comms
+    from src import Src, TargetSolver
+
+    loaded = [name for name in ("cscore", "networktables", "imutils", "http.server") if name in sys.modules]
+    startup = comms.Startup(_started)
+    startup.record("imports", _started)
+    solver = TargetSolver.from_fov(60.0)
+    sources = {}
+
+    def connect_table():
+        time.sleep(connect)
+
+    def open_camera(path):
+        source = CamLib.cv_threaded_source(path)
+        time.sleep(opened)
+        sources[path] = source
+
+    def warmup():
+        Src.vision_assistance_contour(np.zeros((480, 640, 3), np.uint8), compiled=True)
+        solver.undistort_points(np.zeros((1, 2), int))
+
+    phases = [("connect", connect_table, ())]
+    if variant != "lazy":
+        phases += [("open %d" % i, open_camera, (path,)) for i, path in enumerate(videos)]
+        phases.append(("warm-up", warmup, ()))
+
+    for name, function, args in phases:
+        startup.start(name, function, *args)
+        if variant != "concurrent":
+            startup.wait(name)
+    startup.wait()
+
+    ready = time.perf_counter()
+    start = time.perf_counter()
+    if videos[0] not in sources:
+        open_camera(videos[0])
+    ret, frame = sources[videos[0]].read()
+    Src.vision_assistance_contour(frame, compiled=True)
+    startup.record("first frame", start)
+
+    for source in sources.values():
+        source.release()
+
+    return {"phases": startup.Phases, "ready": ready - _started, "total": time.perf_counter() - _started,
+            "loaded": loaded}
+
+
+def _videos(directory):
+    import cv2
+    from .synthetic import SyntheticTargets
+
+    scene = SyntheticTargets(640, 480)
+    paths = []
+
+    for camera in range(2):
+        path = os.path.join(directory, "video%d.avi" % camera)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (640, 480))
+        for frame in scene.frames(60):
+            writer.write(frame)
+        writer.release()
+        paths.append(path)
+
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark TXClient startup.")
+    parser.add_argument("--connect", type=float, default=1.0, help="stand-in seconds to connect to the roboRIO")
+    parser.add_argument("--open", type=float, default=0.5, help="stand-in seconds to open a camera")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--videos", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_child(args.child, args.videos, args.connect, args.open)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        videos = _videos(directory)
+
+        for variant in ("lazy", "sequential", "concurrent"):
+            output = subprocess.check_output([sys.executable, "-W", "ignore", "-m", "benchmarks.startup",
+                                              "--child", variant, "--videos"] + videos +
+                                             ["--connect", str(args.connect), "--open", str(args.open)])
+            result = json.loads(output.decode().strip().splitlines()[-1])
+
+            print("%s: ready %.3f s, first frame processed %.3f s" % (variant, result["ready"], result["total"]))
+            for name, (start, end) in sorted(result["phases"].items(), key=lambda item: item[1][0]):
+                print("    %-12s %7.3f %7.3f %7.3f s" % (name, start, end, end - start))
+
+        print("optional modules loaded by the imports: %s" % (", ".join(result["loaded"]) or "none"))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import numpy as np
+import cv2
+
+"""
+Deterministic synthetic frames for benchmarking the vision pipeline without a camera. Each frame holds a pair of
+retroreflective-tape-like strips, tilted towards each other like the 2019 targets, over a dark background with sensor
+noise and bright clutter.
+"""
+
+
+class SyntheticTargets:
+    """
+    Generator of synthetic target frames.
+
+    Usage: Construct with the scene parameters and call frame(i) or iterate frames(n). The same arguments always give
+    the same frames.
+        Params:
+            width: Frame width in pixels.
+            height: Frame height in pixels.
+            noise: Standard deviation of the gaussian sensor noise.
+            clutter: Number of bright clutter blobs (lights, reflections) per frame.
+            seed: Seed of the random generator.
+            moving: True for a target that moves smoothly from frame to frame, False for an independent random pose
+                per frame.
+            scale: (min, max) width of the target pair as a fraction of the frame width, for random poses. Small
+                values give far away targets.
+        Variables:
+            self.Color: BGR color of the lit tape, inside the contour pipeline's HSV range after brightness_contrast.
+    """
+
+    Color = (250, 235, 60)
+
+    def __init__(self, width=640, height=480, noise=4.0, clutter=10, seed=5549, moving=False, scale=(0.3, 0.6)):
+        self.width = width
+        self.height = height
+        self.noise = noise
+        self.clutter = clutter
+        self.seed = seed
+        self.moving = moving
+        self.scale = scale
+
+    def pose(self, index):
+        """Gets the target pose of a frame.
+        Returns:
+            A (center x, center y, scale, skew) tuple, center in pixels and scale as a fraction of the frame width.
+        """
+        if self.moving:
+            # A slow sweep across the frame, like a robot turning towards the target while driving up to it.
+            phase = 2 * np.pi * index
+            cx = self.width * (0.5 + 0.2 * np.sin(phase / 120))
+            cy = self.height * (0.5 + 0.1 * np.sin(phase / 90))
+            scale = 0.45 + 0.1 * np.sin(phase / 200)
+            skew = 15 * np.sin(phase / 150)
+
+            return cx, cy, scale, skew
+
+        rng = np.random.default_rng((self.seed, index))
+        cx = self.width * rng.uniform(0.25, 0.75)
+        cy = self.height * rng.uniform(0.35, 0.65)
+        scale = rng.uniform(*self.scale)
+        skew = rng.uniform(-20, 20)
+
+        return cx, cy, scale, skew
+
+    def target_points(self, index):
+        """Gets the corner points of both strips of a frame.
+        Returns:
+            A list of two (4, 2) float32 numpy.ndarray, left strip first.
+        """
+        cx, cy, scale, skew = self.pose(index)
+        span = self.width * scale
+        # 2019 tape: 2 x 5.5 in strips tilted 14.5 degrees, 8 in apart at their closest point.
+        unit = span / 14.6
+        strips = []
+
+        for side, tilt in ((-1, 14.5), (1, -14.5)):
+            rect = ((cx + side * 5.3 * unit, cy), (2 * unit, 5.5 * unit), tilt + skew * 0.25)
+            strips.append(cv2.boxPoints(rect).astype(np.float32))
+
+        return strips
+
+    def frame(self, index):
+        """Renders a frame.
+        Args:
+            index: Frame number, frames are independent of each other.
+        Returns:
+            A BGR numpy.ndarray of uint8.
+        """
+        rng = np.random.default_rng((self.seed, index, 1))
+        frame = np.empty((self.height, self.width, 3), np.uint8)
+        frame[:] = (30, 25, 20)
+
+        for i in range(self.clutter):
+            center = (int(rng.integers(0, self.width)), int(rng.integers(0, self.height)))
+            axes = (int(rng.integers(2, max(3, self.width // 40))), int(rng.integers(2, max(3, self.height // 40))))
+            color = tuple(int(c) for c in rng.integers(120, 256, 3))
+            cv2.ellipse(frame, center, axes, float(rng.uniform(0, 180)), 0, 360, color, -1)
+
+        for strip in self.target_points(index):
+            cv2.fillConvexPoly(frame, np.round(strip).astype(np.int32), self.Color, cv2.LINE_AA)
+
+        if self.noise > 0:
+            noise = rng.normal(0, self.noise, frame.shape)
+            frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+        return frame
+
+    def frames(self, count):
+        """Yields count consecutive frames starting at 0."""
+        for i in range(count):
+            yield self.frame(i)
+
+    @staticmethod
+    def scenes(resolutions=((320, 240), (640, 480)), noises=(0.0, 8.0), clutters=(0, 40), seed=5549):
+        """Gets a SyntheticTargets for every combination of the given scene parameters.
+        Returns:
+            A dict of scene name to SyntheticTargets.
+        """
+        scenes = {}
+
+        for width, height in resolutions:
+            for noise in noises:
+                for clutter in clutters:
+                    name = "%dx%d_noise%g_clutter%d" % (width, height, noise, clutter)
+                    scenes[name] = SyntheticTargets(width, height, noise, clutter, seed)
+
+        return scenes
@@ -0,0 +1,92 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from src import Src, TargetTracker
+from .synthetic import SyntheticTargets
+
+"""
+Benchmark of TargetTracker against running the full contour pipeline on every frame, on a target moving smoothly
+across synthetic frames. Reports the frame rate, how often the full detector ran, whether target identities held, and
+the frame-to-frame jitter of the reported average center around the true path.
+
+    python -m benchmarks.tracking --frames 300 --every 5
+"""
+
+
+def truth(scene, frames):
+    """Gets the true target center of every frame, at the processing resolution."""
+    sx = Src.CONTOUR_SIZE[0] / scene.width
+    sy = Src.CONTOUR_SIZE[1] / scene.height
+
+    return np.array([np.concatenate(scene.target_points(i)).mean(axis=0) * (sx, sy) for i in range(frames)])
+
+
+def jitter(centers, expected):
+    """Gets the standard deviation of the frame-to-frame change of the error, in pixels."""
+    error = np.asarray(centers) - expected
+
+    return float(np.linalg.norm(np.diff(error, axis=0), axis=1).std())
+
+
+def run_full(frames):
+    centers = []
+    start = time.perf_counter()
+
+    for frame in frames:
+        center, found, bboxes = Src.vision_assistance_contour(frame, compiled=True)
+        centers.append(center)
+
+    return len(frames) / (time.perf_counter() - start), centers
+
+
+def run_tracker(frames, every, fps):
+    tracker = TargetTracker(every=every, compiled=True)
+    centers = []
+    ids = set()
+    start = time.perf_counter()
+
+    for i, frame in enumerate(frames):
+        center, found, bboxes = tracker.process(frame, i / fps)
+        centers.append(center)
+        ids.update(target.id for target in tracker.Targets)
+
+    return len(frames) / (time.perf_counter() - start), centers, tracker, ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark TargetTracker against per-frame detection.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--every", type=int, default=5, help="Full detection cadence of the tracker.")
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate the frames are stamped at.")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args(argv)
+
+    scene = SyntheticTargets(args.width, args.height, noise=8.0, clutter=20, moving=True)
+    frames = list(scene.frames(args.frames))
+    expected = truth(scene, args.frames)
+
+    # Build the shared threshold table before timing.
+    Src.vision_assistance_contour(frames[0], compiled=True)
+
+    fullRate, fullCenters = run_full(frames)
+    trackRate, trackCenters, tracker, ids = run_tracker(frames, args.every, args.fps)
+
+    # The tracker reports targets once confirmed, compare the frames both have.
+    skip = tracker.confirm
+
+    print("%d frames at %dx%d, full detection every %d frames" % (args.frames, args.width, args.height, args.every))
+    print("    %-14s %8s %10s %10s %8s" % ("", "fps", "detections", "jitter px", "ids"))
+    print("    %-14s %8.1f %10d %10.3f %8s" % ("every frame", fullRate, args.frames,
+                                             jitter(fullCenters[skip:], expected[skip:]), "-"))
+    print("    %-14s %8.1f %10d %10.3f %8d" % ("TargetTracker", trackRate, tracker.Detections,
+                                             jitter(trackCenters[skip:], expected[skip:]), len(ids)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
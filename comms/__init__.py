@@ -1,2 +1,30 @@
-from .nettable import ConnectTable
-from .camserver import VideoStream
\ No newline at end of file
+import importlib
+
+# Members are imported on first use, so a client that never streams does not load cscore and one that replays does not
+# load networktables.
+_members = {
+    "ConnectTable": ".nettable",
+    "VideoStream": ".camserver",
+    "StreamProcess": ".streamprocess",
+    "Diagnostics": ".diagnostics",
+    "LoopScheduler": ".scheduler",
+    "QualityController": ".quality",
+    "QualityLevel": ".quality",
+    "ReplayTable": ".replay",
+    "Startup": ".startup",
+}
+
+
+def __getattr__(name):
+    module = _members.get(name)
+    if module is None:
+        raise AttributeError("module 'comms' has no attribute '%s'" % name)
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_members))
\ No newline at end of file
@@ -1,32 +1,151 @@
-import numpy as np
-import cscore as cs
-import logging
-
-"""
-Class creates a server which streams video to a sink or server. In this case,
-OpenCV frames by calling 'putFrame' in TXClient.
-"""
-
-
-class VideoStream:
-    Instances = 0
-
-    def __init__(self):
-        try:
-            logging.basicConfig(level=logging.DEBUG)
-            self.streamFailure = None
-            self._source = cs.CvSource(("video%d" % VideoStream.Instances), cs.VideoMode.PixelFormat.kMJPEG)
-
-        except Exception:
-            self.streamFailure = True
-
-        else:
-            self.streamFailure = False
-            VideoStream._iterInstances()
-
-    def putFrame(self, cv_frame: np.ndarray):
-        self._source.putFrame(cv_frame)
-
-    @classmethod
-    def _iterInstances(cls):
-        cls.Instances += 1
+import numpy as np
+import cv2
+import cscore as cs
+import logging
+import threading
+import time
+
+"""
+Class creates a server which streams video to a sink or server. In this case,
+OpenCV frames by calling 'putFrame' in TXClient.
+
+Streaming runs on its own thread: putFrame only copies the frame into a single "latest frame wins" slot, and the
+stream thread rotates, downscales and encodes at its own resolution and frame rate cap.
+"""
+
+
+class VideoStream:
+    """
+    Dashboard video stream.
+
+        Params:
+            width: Width of the streamed frames, None to keep the (rotated) frame width.
+            height: Height of the streamed frames, None to keep the (rotated) frame height.
+            fps: Most frames per second sent to the dashboard, 0 for no cap.
+            rotation: Rotation of the frames put from now on, one of 0, 90, -90 and 180 degrees counterclockwise. It is
+                applied on the stream thread, but each frame keeps the rotation it was put with.
+            asynchronous: False to encode on the caller's thread like before.
+            scale: Factor applied to the streamed size on top of width and height, to lower the resolution under load.
+        Variables:
+            self.Sent: Frames sent to the dashboard.
+            self.Replaced: Frames handed to putFrame that were replaced by a newer one before being sent.
+    """
+
+    Instances = 0
+
+    # Exact quarter turns, counterclockwise like RobotVision.rotate_image.
+    _rotations = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, -90: cv2.ROTATE_90_CLOCKWISE, 270: cv2.ROTATE_90_CLOCKWISE,
+                  180: cv2.ROTATE_180, -180: cv2.ROTATE_180}
+
+    def __init__(self, width=None, height=None, fps=15, rotation=0, asynchronous=True, scale=1.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.rotation = rotation
+        self.scale = scale
+        self.Sent = 0
+        self.Replaced = 0
+
+        self._cond = threading.Condition()
+        self._slot = None
+        self._work = None
+        # Rotation of the frame in each buffer, as it was when the frame was put.
+        self._slotRotation = 0
+        self._workRotation = 0
+        self._fresh = False
+        self._running = asynchronous
+        self._thread = None
+
+        try:
+            logging.basicConfig(level=logging.DEBUG)
+            self.streamFailure = None
+            self._source = cs.CvSource(("video%d" % VideoStream.Instances), cs.VideoMode.PixelFormat.kMJPEG)
+
+        except Exception:
+            self.streamFailure = True
+
+        else:
+            self.streamFailure = False
+            VideoStream._iterInstances()
+
+        if asynchronous:
+            self._thread = threading.Thread(target=self._stream, name="VideoStream", daemon=True)
+            self._thread.start()
+
+    def putFrame(self, cv_frame: np.ndarray):
+        """Hands a frame to the stream. Never waits for encoding, a frame not yet sent is replaced by this one."""
+        if self._thread is None:
+            self._send(cv_frame, self.rotation)
+            return
+
+        with self._cond:
+            if self._slot is None or self._slot.shape != cv_frame.shape or self._slot.dtype != cv_frame.dtype:
+                self._slot = np.empty_like(cv_frame)
+
+            # The caller may reuse its buffer as soon as this returns.
+            np.copyto(self._slot, cv_frame)
+            self._slotRotation = self.rotation
+
+            if self._fresh:
+                self.Replaced += 1
+
+            self._fresh = True
+            self._cond.notify()
+
+    def _prepare(self, frame, rotation):
+        rotation = VideoStream._rotations.get(rotation)
+        if rotation is not None:
+            frame = cv2.rotate(frame, rotation)
+
+        height, width = frame.shape[:2]
+        size = (self.width or width, self.height or height)
+        if self.scale != 1.0:
+            size = (max(1, int(size[0] * self.scale)), max(1, int(size[1] * self.scale)))
+        if size != (width, height):
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+        return frame
+
+    def _send(self, frame, rotation):
+        self._source.putFrame(self._prepare(frame, rotation))
+        self.Sent += 1
+
+    def _stream(self):
+        last = 0.0
+
+        while self._running:
+            with self._cond:
+                self._cond.wait_for(lambda: self._fresh or not self._running)
+                if not self._running:
+                    break
+
+            # Hold off for the fps cap first, so the frame sent is the newest one at that time.
+            if self.fps > 0:
+                wait = last + 1.0 / self.fps - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            last = time.monotonic()
+
+            with self._cond:
+                # Swap so putFrame can fill the other buffer while this one is encoded.
+                self._slot, self._work = self._work, self._slot
+                self._slotRotation, self._workRotation = self._workRotation, self._slotRotation
+                self._fresh = False
+
+            try:
+                self._send(self._work, self._workRotation)
+            except Exception:
+                logging.exception("VideoStream failed to send a frame")
+
+    def close(self):
+        """Stops the stream thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    @classmethod
+    def _iterInstances(cls):
+        cls.Instances += 1
@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+"""
+Publishes the hot-path Metrics of TXClient: summary numbers to a diagnostics subtable through a ConnectTable, and the
+full per-stage statistics over an optional local HTTP endpoint ('/' as text, '/json' as JSON).
+"""
+
+
+class Diagnostics:
+    """
+    Publisher of a basicvislib5549.Metrics.
+
+    Usage: Construct with the metrics and the ConnectTable, then call publish() once per loop iteration. It only
+    writes to NetworkTables once every period seconds.
+        Params:
+            metrics: The basicvislib5549.Metrics to publish.
+            connectTable: A ConnectTable, or None to skip NetworkTables.
+            subtable: Name of the subtable the summaries are written to.
+            period: Seconds between NetworkTables updates.
+            port: Port of the local HTTP endpoint, None to not serve one.
+        Variables:
+            self.Server: The HTTPServer of the endpoint, if any.
+    """
+
+    def __init__(self, metrics, connectTable=None, subtable='Diagnostics', period=1.0, port=None):
+        self.metrics = metrics
+        self.period = period
+        self._last = 0.0
+        self._table = connectTable.table.getSubTable(subtable) if connectTable is not None else None
+        self.Server = None
+
+        if port is not None:
+            self.serve(port)
+
+    def publish(self, force=False):
+        """Writes p50/p95/max of every stage to the subtable, at most once per period."""
+        now = time.monotonic()
+
+        if self._table is None or not self.metrics.Enabled or (not force and now - self._last < self.period):
+            return
+
+        self._last = now
+
+        for stage, summary in self.metrics.summary().items():
+            self._table.putNumber("%s p50" % stage, summary["p50"])
+            self._table.putNumber("%s p95" % stage, summary["p95"])
+            self._table.putNumber("%s max" % stage, summary["max"])
+
+    def serve(self, port, host='127.0.0.1'):
+        """Starts the local metrics endpoint on a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/json'):
+                    body = json.dumps(metrics.summary()).encode()
+                    kind = 'application/json'
+                else:
+                    body = metrics.text().encode()
+                    kind = 'text/plain'
+
+                self.send_response(200)
+                self.send_header('Content-Type', kind)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        self.Server = HTTPServer((host, port), Handler)
+        threading.Thread(target=self.Server.serve_forever, name="Diagnostics", daemon=True).start()
+
+    def close(self):
+        if self.Server is not None:
+            self.Server.shutdown()
+            self.Server.server_close()
+            self.Server = None
@@ -1,51 +1,155 @@
-import threading
-from networktables import NetworkTables
-
-"""
-Class to facilitate automatic secure connection to a NetworkTable table host.
-Construct it to make available a networktables table.
-"""
-
-
-class ConnectTable:
-    """
-    Class facilitating connectivity to a Network Table
-
-    Usage: Construct this object in order to establish connection and set up a network table quickly.
-        Params:
-        **kwargs:
-            tableName: The name of a table that is to be connected to/set up.
-            server: The hostname or address of a server that hosts a NetworkTable.
-        Variables:
-            self.Connected: Becomes true once a connection has been established.
-            self.Table: The NetworkTable. Once this class has been constructed, this can be called with -
-                - *ConnectTable*.Table and be issued getTable associated commands. (putBoolean, getInteger, etc.)
-    """
-
-    def __init__(self, **kwargs):
-        tableName = kwargs.get('tableName', 'SmartDashboard')
-        server = kwargs.get('server', '10.55.49.2')
-
-        cond = threading.Condition()
-        notified = [False]
-        self.Connected = False
-
-        def connectionListener(connected, info):
-            print(info, '; Connected=%s' % connected)
-            with cond:
-                notified[0] = True
-                cond.notify()
-
-        NetworkTables.initialize(server=server)
-        NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-        with cond:
-            print("Waiting")
-            if not notified[0]:
-                cond.wait()
-
-        self.Connected = True
-
-        print("Connected!")
-
-        self.table = NetworkTables.getTable(tableName)
+import threading
+
+"""
+Class to facilitate automatic secure connection to a NetworkTable table host.
+Construct it to make available a networktables table.
+"""
+
+
+class ConnectTable:
+    """
+    Class facilitating connectivity to a Network Table
+
+    Usage: Construct this object in order to establish connection and set up a network table quickly.
+        Params:
+        **kwargs:
+            tableName: The name of a table that is to be connected to/set up.
+            server: The hostname or address of a server that hosts a NetworkTable.
+            wait: False to return right away and connect in the background, see wait(). Values put before the
+                connection is up are sent once it is.
+            networktables: The NetworkTables implementation, pynetworktables by default. A local stand-in can be
+                given to run without a server.
+        Variables:
+            self.Connected: Becomes true once a connection has been established.
+            self.Table: The NetworkTable. Once this class has been constructed, this can be called with -
+                - *ConnectTable*.Table and be issued getTable associated commands. (putBoolean, getInteger, etc.)
+            self.State: The TableState of the keys passed to subscribe(), None until then.
+    """
+
+    def __init__(self, **kwargs):
+        tableName = kwargs.get('tableName', 'SmartDashboard')
+        server = kwargs.get('server', '10.55.49.2')
+        wait = kwargs.get('wait', True)
+
+        NetworkTables = kwargs.get('networktables')
+        if NetworkTables is None:
+            # Imported here so replaying (which only needs TableState) does not load networktables.
+            from networktables import NetworkTables
+        self._networktables = NetworkTables
+
+        self._cond = threading.Condition()
+        self.Connected = False
+
+        def connectionListener(connected, info):
+            print(info, '; Connected=%s' % connected)
+            if not connected:
+                # Disconnects and failed attempts are reported too, wait() keeps waiting through them.
+                return
+
+            with self._cond:
+                if not self.Connected:
+                    print("Connected!")
+                self.Connected = True
+                self._cond.notify_all()
+
+        NetworkTables.initialize(server=server)
+        NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
+
+        self.table = NetworkTables.getTable(tableName)
+
+        self.State = None
+        self._pending = {}
+        self._written = {}
+        self._subscribed = set()
+
+        if wait:
+            self.wait()
+
+    def wait(self, timeout=None):
+        """Blocks until the connection is established.
+        Args:
+            timeout: Seconds to wait at most, None to wait for as long as it takes.
+        Returns:
+            self.Connected.
+        """
+        with self._cond:
+            if not self.Connected:
+                print("Waiting")
+            self._cond.wait_for(lambda: self.Connected, timeout)
+
+        return self.Connected
+
+    def subscribe(self, defaults):
+        """Keeps a local snapshot of keys up to date through entry listeners, so reading them is an attribute access.
+        Args:
+            defaults: A dict of key to the value used until the key is first seen.
+        Returns:
+            The TableState, also available as self.State.
+        """
+        if self.State is None:
+            self.State = TableState()
+
+        for key, default in defaults.items():
+            self._subscribed.add(key)
+            self.State.set(key, self.table.getValue(key, default))
+            self.table.addEntryListener(self._entryListener, immediateNotify=True, key=key, localNotify=True)
+
+        return self.State
+
+    def _entryListener(self, table, key, value, isNew):
+        self.State.set(key, value)
+
+    def putBatch(self, values):
+        """Stages values to be written by the next flush().
+        Args:
+            values: A dict of key to number, boolean, string or list of numbers.
+        """
+        self._pending.update(values)
+
+    def flush(self):
+        """Writes the staged values that changed since they were last written and sends them right away. Subscribed
+        keys are compared with the table instead, since the dashboard may have written them in between."""
+        if not self._pending:
+            return
+
+        for key, value in self._pending.items():
+            written = self.table.getValue(key, None) if key in self._subscribed else self._written.get(key)
+
+            if written != value:
+                self.table.putValue(key, value)
+                self._written[key] = value
+
+        self._pending.clear()
+        self._networktables.flush()
+
+
+class TableState:
+    """
+    Snapshot of subscribed NetworkTable keys.
+
+    Usage: Obtained from ConnectTable.subscribe(). Read keys as attributes (state.Mode) or items (state["Mode"]).
+        Variables:
+            self.Version: Incremented on every change, so a loop can tell whether anything changed.
+            self.Changed: threading.Condition notified on every change.
+    """
+
+    def __init__(self):
+        self.Version = 0
+        self.Changed = threading.Condition()
+
+    def set(self, key, value):
+        with self.Changed:
+            setattr(self, key, value)
+            self.Version += 1
+            self.Changed.notify_all()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def wait(self, version, timeout=None):
+        """Blocks until the state changes after version, or timeout seconds pass.
+        Returns:
+            True if it changed.
+        """
+        with self.Changed:
+            return self.Changed.wait_for(lambda: self.Version != version, timeout)
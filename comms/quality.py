@@ -0,0 +1,130 @@
+import collections
+
+import numpy as np
+
+"""
+Adaptive quality for TXClient. The controller watches the time each loop iteration spends working against a budget
+and steps through quality levels: the stream gets fewer frames, then smaller ones, then the vision pipeline runs at
+a lower resolution, then detection skips every other frame. It steps back up when the frame time estimated for the
+better level leaves headroom, waiting longer before the next attempt each time a step up had to be undone.
+"""
+
+
+QualityLevel = collections.namedtuple("QualityLevel", ["name", "streamFps", "streamScale", "processScale",
+                                                       "detectEvery"])
+
+
+class QualityController:
+    """
+    Frame-time budget keeper.
+
+    Usage: Call update() with the working time of every running iteration, apply self.Current to the stream and the
+    pipeline when it returns True, and publish() once per iteration.
+        Params:
+            budget: Seconds an iteration may spend working, e.g. 80% of the frame period.
+            table: Optional ConnectTable the level is published to.
+            levels: QualityLevel tuple from the best to the cheapest, QualityController.Levels by default.
+            window: Iterations measured before each decision, and after a change before the next one. The mean
+                working time of the window is held against the budget, so skipping detection on some frames counts.
+            headroom: Fraction of the budget the frame time estimated for the better level must stay under to step
+                back up, see estimate().
+            maxPatience: Most windows waited before a step up, after steps up keep being undone.
+        Variables:
+            self.Level: Index of the current level.
+            self.Current: The current QualityLevel.
+            self.FrameTime: Mean working time of the last window, in seconds.
+            self.Degrades: Steps down so far.
+            self.Recovers: Steps up so far.
+    """
+
+    Levels = (
+        QualityLevel("full", 15.0, 1.0, 1.0, 1),
+        QualityLevel("stream fps", 7.5, 1.0, 1.0, 1),
+        QualityLevel("stream resolution", 7.5, 0.5, 1.0, 1),
+        QualityLevel("processing resolution", 7.5, 0.5, 0.75, 1),
+        QualityLevel("alternate detection", 7.5, 0.5, 0.75, 2),
+    )
+
+    def __init__(self, budget, table=None, levels=None, window=30, headroom=0.6, maxPatience=16):
+        self.budget = budget
+        self.table = table
+        self.levels = levels if levels is not None else QualityController.Levels
+        self.window = window
+        self.headroom = headroom
+        self.maxPatience = maxPatience
+
+        self.Level = 0
+        self.Current = self.levels[0]
+        self.FrameTime = 0.0
+        self.Degrades = 0
+        self.Recovers = 0
+
+        self._times = np.zeros(window, np.float64)
+        self._count = 0
+        self._since = 0
+        self._patience = 1
+        self._recovered = False
+
+    def _set(self, level):
+        self.Level = level
+        self.Current = self.levels[level]
+        self._since = 0
+        self._count = 0
+
+    def update(self, seconds):
+        """Adds the working time of an iteration.
+        Returns:
+            True if the level changed.
+        """
+        self._times[self._count % self.window] = seconds
+        self._count += 1
+        self._since += 1
+
+        if self._count < self.window:
+            return False
+
+        self.FrameTime = float(self._times.mean())
+
+        if self.FrameTime > self.budget and self.Level < len(self.levels) - 1:
+            if self._recovered and self._since <= 2 * self.window:
+                # The last step up did not fit, wait longer before the next one.
+                self._patience = min(self._patience * 2, self.maxPatience)
+
+            self._recovered = False
+            self.Degrades += 1
+            self._set(self.Level + 1)
+
+            return True
+
+        if self.Level > 0 and self._since >= self.window * self._patience and \
+                self.estimate(self.Level - 1) < self.budget * self.headroom:
+            self._recovered = True
+            self.Recovers += 1
+            self._set(self.Level - 1)
+
+            return True
+
+        if self._since >= self.window * self.maxPatience:
+            # Stable for long, the next step up is tried sooner again.
+            self._patience = max(1, self._patience // 2)
+            self._since = self.window
+
+        return False
+
+    def estimate(self, level):
+        """Estimates the frame time at another level from the one measured at the current level. Frames that skip
+        detection are taken to cost nothing and processing to scale with the pixels, which overestimates going up: at
+        'alternate detection' the mean is about half the cost of a detection, so stepping up needs twice the room.
+        Returns:
+            The estimated frame time in seconds.
+        """
+        current, other = self.Current, self.levels[level]
+
+        return self.FrameTime * current.detectEvery / other.detectEvery * \
+            (other.processScale / current.processScale) ** 2
+
+    def publish(self):
+        """Stages the level, its name and the frame time in milliseconds to the table."""
+        if self.table is not None:
+            self.table.putBatch({"Quality Level": self.Level, "Quality": self.Current.name,
+                                 "Frame Time": self.FrameTime * 1000})
@@ -0,0 +1,183 @@
+import math
+
+from .nettable import TableState
+
+"""
+Stand-in for ConnectTable that plays back the NetworkTables keys of a recording made with
+basicvislib5549.FrameRecorder, so TXClient can run against match data without a robot.
+
+The keys follow the replayed frames: after a frame is read, they hold the values recorded with it. While the client
+idles, waiting on the TableState skips ahead to the next recorded change of the keys.
+"""
+
+
+class ReplayTable:
+    """
+    NetworkTable replay.
+
+    Usage: Construct with the ReplayCaptures of a recording and use in place of a ConnectTable.
+        Params:
+            captures: The basicvislib5549.ReplayCaptures, the keys are read from the log of the first.
+        Variables:
+            self.Connected: True until the first capture reaches the end of its log.
+            self.table: Stand-in for the NetworkTable, values written to it are kept in self.Written.
+            self.State: The TableState of the keys passed to subscribe(), None until then.
+            self.Written: Last value written to each key.
+    """
+
+    def __init__(self, captures, **kwargs):
+        self.captures = list(captures)
+        if not self.captures:
+            raise ValueError("ReplayTable needs the ReplayCapture of at least one FrameRecorder log")
+
+        self.capture = self.captures[0]
+        self.log = self.capture.log
+        self.Connected = len(self.log) > 0
+        self.table = _ReplayEntries(self)
+        self.State = None
+        self.Written = {}
+        self._defaults = {}
+
+        self.capture.listeners.append(self._advance)
+
+    def value(self, key, default, position=None):
+        """Gets the value of key at a record, the current one if position is None, as the type of default."""
+        if key not in self.log.Keys or len(self.log) == 0:
+            return self.Written.get(key, default)
+
+        if position is None:
+            position = max(self.capture.Position, 0)
+
+        value = self.log.Index[position]['keys'][self.log.Keys.index(key)]
+
+        if math.isnan(value):
+            return default
+
+        # NetworkTables numbers are floats, only booleans need their type back.
+        return bool(value) if isinstance(default, bool) else float(value)
+
+    def _update(self, position=None):
+        for key, default in self._defaults.items():
+            value = self.value(key, default, position)
+            if getattr(self.State, key, None) != value:
+                self.State.set(key, value)
+
+    def _advance(self, position):
+        if position is None:
+            self.Connected = False
+
+            if self.State is not None:
+                with self.State.Changed:
+                    self.State.Changed.notify_all()
+
+        elif self.State is not None:
+            length = self.log.Index['length']
+            following = position + 1
+
+            while following < len(length) and length[following] == 0:
+                following += 1
+
+            # Keys that changed before the next frame was captured apply from now, as they did on the robot.
+            change = self.log.next_change(position, following)
+            if change is not None:
+                self.capture.Position = position = change
+
+            self._update(position)
+
+    def skip(self, timeout=None):
+        """Moves every capture to the next recorded change of the keys, in real time waiting at most timeout.
+        Returns:
+            True if the keys changed.
+        """
+        if not self.Connected:
+            return False
+
+        position = max(self.capture.Position, 0)
+        change = self.log.next_change(position)
+
+        if change is None:
+            self.Connected = False
+            return False
+
+        t = float(self.log.Index[change]['t'])
+        clock = self.capture.clock
+        now = clock.now()
+
+        if clock.realtime and now is not None and timeout is not None and t - now > timeout:
+            clock.advance(now + timeout)
+            return False
+
+        clock.advance(t)
+
+        for capture in self.captures:
+            capture.seek(t)
+
+        # The next read returns the frame recorded with the change, if it has one.
+        self.capture.Position = change - 1
+        self._update(change)
+
+        return True
+
+    def subscribe(self, defaults):
+        """Same as ConnectTable.subscribe, with the values recorded at the start of the log."""
+        if self.State is None:
+            self.State = _ReplayState(self)
+
+        self._defaults.update(defaults)
+
+        for key, default in defaults.items():
+            self.State.set(key, self.value(key, default))
+
+        return self.State
+
+    def wait(self, timeout=None):
+        return self.Connected
+
+    def putBatch(self, values):
+        self.Written.update(values)
+
+    def flush(self):
+        return
+
+
+class _ReplayState(TableState):
+    """TableState whose wait() skips ahead in the recording instead of waiting for the network."""
+
+    def __init__(self, replay):
+        TableState.__init__(self)
+        self._replay = replay
+
+    def wait(self, version, timeout=None):
+        if self.Version != version:
+            return True
+
+        return self._replay.skip(timeout)
+
+
+class _ReplayEntries:
+    """The subset of the NetworkTable interface TXClient uses."""
+
+    def __init__(self, replay):
+        self._replay = replay
+
+    def getValue(self, key, defaultValue):
+        return self._replay.value(key, defaultValue)
+
+    getNumber = getValue
+    getBoolean = getValue
+    getString = getValue
+
+    def putValue(self, key, value):
+        self._replay.Written[key] = value
+        return True
+
+    putNumber = putValue
+    putBoolean = putValue
+    putString = putValue
+    putNumberArray = putValue
+
+    def addEntryListener(self, listener, immediateNotify=True, key=None, localNotify=False):
+        return
+
+    def getSubTable(self, key):
+        return self
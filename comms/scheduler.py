@@ -0,0 +1,71 @@
+import time
+
+"""
+Main-loop pacing for TXClient. While idle the loop blocks on NetworkTables state changes instead of spinning, while
+running it is paced to a target rate and deadlines it misses are counted.
+"""
+
+
+class LoopScheduler:
+    """
+    Scheduler of a loop driven by a TableState.
+
+    Usage: Call idle(version) when there is nothing to do, with the state version read at the top of the iteration,
+    and pace() at the end of every running iteration.
+        Params:
+            state: The TableState from ConnectTable.subscribe().
+            rate: Target iterations per second while running, usually the camera frame rate. 0 to not pace.
+            heartbeat: Longest time idle() blocks, so periodic work (diagnostics, tableExists) still happens.
+        Variables:
+            self.Iterations: Running iterations paced so far.
+            self.Missed: Running iterations that finished after their deadline.
+            self.Late: Seconds the last iteration finished after its deadline, 0 if on time.
+    """
+
+    def __init__(self, state, rate=30.0, heartbeat=1.0):
+        self.state = state
+        self.heartbeat = heartbeat
+        self.Iterations = 0
+        self.Missed = 0
+        self.Late = 0.0
+        self._deadline = None
+        self.setRate(rate)
+
+    def setRate(self, rate):
+        """Changes the target rate, taking effect from the next iteration."""
+        self.rate = rate
+        self._period = 1.0 / rate if rate > 0 else 0.0
+        self._deadline = None
+
+    def idle(self, version):
+        """Blocks until the state changes after version, or the heartbeat passes.
+        Returns:
+            True if the state changed.
+        """
+        # Pacing restarts from the first running iteration after idling.
+        self._deadline = None
+
+        return self.state.wait(version, self.heartbeat)
+
+    def pace(self):
+        """Sleeps until the next deadline of the target rate, recording whether this one was missed."""
+        now = time.monotonic()
+        self.Iterations += 1
+
+        if self._period <= 0:
+            return
+
+        if self._deadline is None:
+            self._deadline = now + self._period
+            return
+
+        self.Late = max(0.0, now - self._deadline)
+
+        if self.Late > 0:
+            self.Missed += 1
+            # Do not try to catch up on missed frames, start a new period from now.
+            self._deadline = now + self._period
+
+        else:
+            time.sleep(self._deadline - now)
+            self._deadline += self._period
@@ -0,0 +1,102 @@
+import threading
+import time
+
+"""
+Concurrent startup. Connecting to the roboRIO, opening the cameras and warming up the pipeline each spend most of their
+time waiting on something else, so they are started together and the client is ready when the slowest one is, not
+after the sum of them.
+"""
+
+
+class Startup:
+    """
+    Runner of concurrent startup phases.
+
+    Usage: Construct as early as possible, start() every phase, then wait() for them before the main loop.
+        Params:
+            started: time.perf_counter() the phases are timed from, the construction time if None.
+        Variables:
+            self.Phases: Dict of phase name to its (start, end) in seconds since 'started', end is None while running.
+            self.Errors: Dict of phase name to the exception it raised.
+    """
+
+    def __init__(self, started=None):
+        self._started = started if started is not None else time.perf_counter()
+        self._threads = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+        self.Phases = {}
+        self.Errors = {}
+
+    def elapsed(self):
+        """Gets the seconds since 'started'."""
+        return time.perf_counter() - self._started
+
+    def record(self, name, start, end=None):
+        """Adds a phase timed elsewhere, e.g. the imports.
+        Args:
+            start: time.perf_counter() the phase started at.
+            end: time.perf_counter() the phase ended at, now if None.
+        """
+        end = end if end is not None else time.perf_counter()
+
+        with self._lock:
+            self.Phases[name] = (start - self._started, end - self._started)
+
+    def start(self, name, function, *args, **kwargs):
+        """Runs a phase on its own thread, function(*args, **kwargs)."""
+
+        def run():
+            start = time.perf_counter()
+
+            try:
+                result = function(*args, **kwargs)
+
+            except Exception as e:
+                with self._lock:
+                    self.Errors[name] = e
+                result = None
+
+            with self._lock:
+                self._results[name] = result
+                self.Phases[name] = (start - self._started, time.perf_counter() - self._started)
+
+        with self._lock:
+            self.Phases[name] = (self.elapsed(), None)
+
+        thread = self._threads[name] = threading.Thread(target=run, name="Startup %s" % name, daemon=True)
+        thread.start()
+
+    def wait(self, name=None, timeout=None):
+        """Waits for a phase, or every phase.
+        Args:
+            name: The phase, None for all of them.
+            timeout: Seconds to wait at most for each phase.
+        Returns:
+            The result of the phase, None if it raised or is still running. A dict of every result for all of them.
+        """
+        names = [name] if name is not None else list(self._threads)
+
+        for phase in names:
+            self._threads[phase].join(timeout)
+
+        with self._lock:
+            if name is not None:
+                return self._results.get(name)
+
+            return dict(self._results)
+
+    def report(self):
+        """Gets the phases as text, one 'name start end duration' line per phase in order of start."""
+        lines = []
+
+        for name, (start, end) in sorted(self.Phases.items(), key=lambda item: item[1][0]):
+            if end is None:
+                lines.append("%-16s %7.3f       - running" % (name, start))
+            else:
+                error = "  %s: %s" % (type(self.Errors[name]).__name__, self.Errors[name]) if name in self.Errors \
+                    else ""
+                lines.append("%-16s %7.3f %7.3f %7.3f s%s" % (name, start, end, end - start, error))
+
+        return "\n".join(lines)
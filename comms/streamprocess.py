@@ -0,0 +1,102 @@
+import multiprocessing
+import time
+
+"""
+Dashboard streaming in its own process. The process reads the camera frames straight from the SharedFrameRings of
+the cameras (see basicvislib5549.ProcessCamera), so neither the frames nor the rotating, scaling and encoding pass
+through the vision process, and the stream runs at its own rate whatever the vision loop is doing.
+"""
+
+
+def _stream(rings, reader, width, height, fps, scale, selected, rotation, sent, stop):
+    # Runs in the stream process. cscore is only imported here.
+    from .camserver import VideoStream
+
+    parent = multiprocessing.parent_process()
+    readers = [ring.reader(reader) for ring in rings]
+    stream = VideoStream(width, height, fps=0, asynchronous=False)
+    last = 0.0
+
+    while not stop.is_set() and parent.is_alive():
+        camera = selected.value
+        if camera < 0:
+            stop.wait(0.05)
+            continue
+
+        if fps.value > 0:
+            wait = last + 1.0 / fps.value - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        last = time.monotonic()
+
+        ret, frame, stamp = readers[camera].read_stamped(0.5)
+        if not ret:
+            continue
+
+        stream.rotation = rotation.value
+        stream.scale = scale.value
+        stream.putFrame(frame)
+        sent.value = stream.Sent
+
+    for camera in readers:
+        camera.release()
+
+
+class StreamProcess:
+    """
+    VideoStream run in a separate process on the frames of shared rings.
+
+    Usage: Construct with the rings of the cameras and call show() with the camera to stream, hide() to stop
+    streaming. close() at shutdown.
+        Params:
+            rings: Dict of device to basicvislib5549.SharedFrameRing.
+            width: Width of the streamed frames, None to keep the (rotated) frame width.
+            height: Height of the streamed frames, None to keep the (rotated) frame height.
+            fps: Most frames per second sent to the dashboard, 0 for no cap.
+            reader: The reader of the rings used by the stream, ProcessCamera reads with reader 0.
+    """
+
+    def __init__(self, rings, width=None, height=None, fps=15, reader=1):
+        context = multiprocessing.get_context("spawn")
+        self._devices = list(rings)
+        self._fps = context.Value('d', fps)
+        self._scale = context.Value('d', 1.0)
+        self._selected = context.Value('i', -1)
+        self._rotation = context.Value('i', 0)
+        self._sent = context.Value('q', 0)
+        self._stop = context.Event()
+
+        self._process = context.Process(
+            target=_stream, name="StreamProcess", daemon=True,
+            args=([rings[device] for device in self._devices], reader, width, height, self._fps, self._scale,
+                  self._selected, self._rotation, self._sent, self._stop))
+        self._process.start()
+
+    @property
+    def Sent(self):
+        """Frames sent to the dashboard."""
+        return self._sent.value
+
+    def show(self, device, rotation=0):
+        """Streams a camera, rotated like VideoStream.rotation."""
+        self._rotation.value = rotation
+        self._selected.value = self._devices.index(device)
+
+    def configure(self, fps=None, scale=None):
+        """Changes the frame rate cap and the scale of the streamed frames, like VideoStream.fps and scale."""
+        if fps is not None:
+            self._fps.value = fps
+        if scale is not None:
+            self._scale.value = scale
+
+    def hide(self):
+        """Stops streaming until the next show()."""
+        self._selected.value = -1
+
+    def close(self):
+        """Stops the stream process."""
+        self._stop.set()
+        self._process.join(2.0)
+
+        if self._process.is_alive():
+            self._process.terminate()
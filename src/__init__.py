@@ -1 +1,7 @@
-from .src import Src
\ No newline at end of file
+from .src import Src
+from .multicam import CameraWorkers, CameraResult
+from .roitracker import RoiTracker
+from .targetsolver import TargetSolver, TargetPose
+from .targettracker import TargetTracker, TrackedTarget
+from .pyramid import PyramidDetector
+from .batch import ContourBatch, BatchResult
\ No newline at end of file
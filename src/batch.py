@@ -0,0 +1,174 @@
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import robotvisionlib as bvl
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from .src import Src
+
+"""
+Batch version of Src.vision_assistance_contour for offline evaluation of recordings. Frames are processed a chunk at a
+time: resize and blur per frame into stacked buffers, the threshold in one call over the whole chunk, then contour
+extraction sharded over a process pool while the next chunk is thresholded. Results come back as columns rather than
+one tuple per frame.
+"""
+
+
+BatchResult = collections.namedtuple("BatchResult", ["frames", "targets"])
+
+
+def _chunk_targets(packed, width, first):
+    # Runs in the worker processes. The masks arrive bit-packed, findContours only cares about zero and non-zero.
+    masks = np.unpackbits(packed, axis=-1, count=width)
+    tables = []
+
+    for i, mask in enumerate(masks):
+        found = bvl.RobotVision.find_contours(mask, False)
+        found, features, hulls = bvl.RobotVision.filter_contour_features(found, *Src.CONTOUR_FILTER)
+
+        table = np.empty(len(features), ContourBatch.TargetColumns)
+        table['frame'] = first + i
+        for name in bvl.RobotVision.ContourFeatures.names:
+            table[name] = features[name]
+        tables.append(table)
+
+    return np.concatenate(tables) if tables else np.zeros(0, ContourBatch.TargetColumns)
+
+
+class ContourBatch:
+    """
+    Contour pipeline over stacks of frames.
+
+    Usage: Construct once and call process() with an (N, H, W, 3) array of frames, e.g. np.load(path, mmap_mode='r')
+    or the stack of a FrameLog. close() stops the worker processes.
+        Params:
+            workers: Processes contour extraction is sharded over, 0 to extract in this process. One per core but the
+                one running the per-pixel stages if None.
+            chunk: Frames per batch. Larger chunks make fewer calls but a working set that no longer fits the cache,
+                the threshold table lookup slows down past a few dozen frames.
+            compiled: Threshold through the shared CompiledThreshold, as in vision_assistance_contour.
+            metrics: Optional basicvislib5549.Metrics, stages are timed per chunk.
+        Variables:
+            self.Frames: Frames processed.
+            self.Chunks: Chunks processed.
+
+    The results equal those of calling vision_assistance_contour on every frame, with the same resolution and units.
+    """
+
+    # One row per frame. start is the row of its first target in the targets table, count the number of targets,
+    # x and y the average center as returned by vision_assistance_contour.
+    FrameColumns = np.dtype([('frame', np.int64), ('count', np.int32), ('start', np.int64), ('x', np.float64),
+                             ('y', np.float64)])
+    # One row per target, the RobotVision.ContourFeatures of the target and the frame it is in.
+    TargetColumns = np.dtype([('frame', np.int64)] + bvl.RobotVision.ContourFeatures.descr)
+
+    def __init__(self, workers=None, chunk=16, compiled=True, metrics=None):
+        self.workers = workers if workers is not None else max(0, os.cpu_count() - 1)
+        self.chunk = chunk
+        self.compiled = compiled
+        self.metrics = metrics if metrics is not None else Metrics.Disabled
+        self.pool = FramePool()
+
+        self.Frames = 0
+        self.Chunks = 0
+
+        self._executor = None
+
+    def _masks(self, frames, start, stop):
+        count = stop - start
+        width, height = Src.CONTOUR_SIZE
+        resized = self.pool.get("resized", (self.chunk, height, width, 3))[:count]
+        blurred = self.pool.get("blurred", (self.chunk, height, width, 3))[:count]
+
+        # Resize and blur read neighbouring pixels, each frame is filtered on its own to keep its borders.
+        with self.metrics.timer("resize"):
+            for i in range(count):
+                cv2.resize(frames[start + i], (width, height), dst=resized[i], interpolation=cv2.INTER_CUBIC)
+
+        with self.metrics.timer("blur"):
+            for i in range(count):
+                bvl.RobotVision.blur(resized[i], bvl.RobotVision.BlurType.BOX_BLUR, Src.CONTOUR_BLUR, out=blurred[i])
+
+        # The threshold is per pixel, the chunk is thresholded as one tall image.
+        stacked = blurred.reshape((count * height, width, 3))
+        with self.metrics.timer("threshold"):
+            if self.compiled:
+                mask = Src.compiled_threshold(*Src.CONTOUR_THRESHOLD).apply(
+                    stacked, out=self.pool.get("mask", (self.chunk * height, width))[:count * height])
+
+            else:
+                brightness, contrast, hue, sat, val = Src.CONTOUR_THRESHOLD
+                adjusted = bvl.RobotVision.brightness_contrast(
+                    stacked, brightness, contrast, out=self.pool.get("adjusted", (self.chunk * height, width, 3))[
+                                                       :count * height])
+                mask = bvl.RobotVision.hsv_threshold(
+                    adjusted, hue, sat, val, out=self.pool.get("mask", (self.chunk * height, width))[:count * height],
+                    hsv=self.pool.get("hsv", (self.chunk * height, width, 3))[:count * height])
+
+        # A packed copy is handed on, so the buffers can be reused while it waits for a worker.
+        return np.packbits(mask.reshape((count, height, width)), axis=-1)
+
+    def process(self, frames, start=0, stop=None) -> BatchResult:
+        """Finds the targets of every frame of a stack.
+        Args:
+            frames: An (N, H, W, 3) BGR numpy.ndarray or numpy.memmap, anything indexable by frame giving H x W x 3.
+            start: First frame to process.
+            stop: Frame to stop at, exclusive, the end of the stack if None.
+        Returns:
+            A BatchResult of a ContourBatch.FrameColumns array with one row per frame and a ContourBatch.TargetColumns
+            array with one row per target, both in frame order. Frame numbers are indices into frames.
+        """
+        stop = len(frames) if stop is None else min(stop, len(frames))
+        width = Src.CONTOUR_SIZE[0]
+
+        if self.workers > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        pending = []
+        for first in range(start, stop, self.chunk):
+            packed = self._masks(frames, first, min(stop, first + self.chunk))
+
+            if self._executor is not None:
+                pending.append(self._executor.submit(_chunk_targets, packed, width, first))
+
+            else:
+                with self.metrics.timer("contours"):
+                    pending.append(_chunk_targets(packed, width, first))
+
+            self.Chunks += 1
+
+        with self.metrics.timer("contours wait"):
+            tables = [table.result() if self._executor is not None else table for table in pending]
+
+        self.Frames += stop - start
+
+        return ContourBatch._columns(tables, start, stop)
+
+    @staticmethod
+    def _columns(tables, start, stop):
+        targets = np.concatenate(tables) if tables else np.zeros(0, ContourBatch.TargetColumns)
+        count = stop - start
+        result = np.zeros(count, ContourBatch.FrameColumns)
+        result['frame'] = np.arange(start, stop)
+
+        frame = targets['frame'] - start
+        result['count'] = np.bincount(frame, minlength=count)
+        np.cumsum(result['count'][:-1], out=result['start'][1:])
+
+        # Averages of the integer centers, like Src._summarize, 0 for frames without targets.
+        found = result['count'] > 0
+        for axis, center in (('x', 'cx'), ('y', 'cy')):
+            sums = np.bincount(frame, targets[center].astype(int), minlength=count)
+            result[axis][found] = sums[found] / result['count'][found]
+
+        return BatchResult(result, targets)
+
+    def close(self):
+        """Stops the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
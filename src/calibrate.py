@@ -0,0 +1,121 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import RobotVision, FrameLog, HsvCalibration
+from .src import Src
+
+"""
+Calibration of the contour pipeline's HSV thresholds from recorded frames (see basicvislib5549.FrameRecorder). Each
+frame is brought to the processing resolution, blurred and brightness/contrast adjusted like in
+Src.vision_assistance_contour, then added to an HsvCalibration with its labels. The labels are either mask images
+(white on the targets) named by frame number, or with --bootstrap the filled hulls of the targets the current
+thresholds find.
+
+    python -m src.calibrate recordings/video1 --masks labels/ --out thresholds.json
+
+The output holds the "hue", "sat" and "val" ranges for RobotVision.hsv_threshold, the same keys as the "mask" node of
+Src.CONTOUR_GRAPH.
+"""
+
+
+# Thresholds of Src.vision_assistance_contour.
+CURRENT = tuple(Src.CONTOUR_THRESHOLD[2:])
+
+
+def preprocess(frame):
+    """Gets a frame as the contour pipeline thresholds it."""
+    brightness, contrast = Src.CONTOUR_THRESHOLD[:2]
+    resized = Src.contour_resize(frame)
+    blurred = RobotVision.blur(resized, RobotVision.BlurType.BOX_BLUR, Src.CONTOUR_BLUR)
+
+    return RobotVision.brightness_contrast(blurred, brightness, contrast)
+
+
+def bootstrap_mask(frame):
+    """Labels the targets the current thresholds find, filling their convex hulls."""
+    found = Src.vision_assistance_contour(frame, compiled=True, contours=True)[3]
+    width, height = Src.CONTOUR_SIZE
+    mask = np.zeros((height, width), np.uint8)
+    cv2.drawContours(mask, [cv2.convexHull(c) for c in found], -1, 255, -1)
+
+    return mask
+
+
+def read_mask(directory, index):
+    """Reads the label of a frame from '<directory>/<index>.png', scaled to the processing resolution."""
+    paths = glob.glob(os.path.join(directory, "%06d.*" % index)) + glob.glob(os.path.join(directory, "%d.*" % index))
+    if not paths:
+        return None
+
+    mask = cv2.imread(paths[0], cv2.IMREAD_GRAYSCALE)
+
+    return cv2.resize(mask, Src.CONTOUR_SIZE, interpolation=cv2.INTER_NEAREST)
+
+
+def calibrate(log, masks=None, every=1, bins=(90, 64, 64), beta=1.0):
+    """Builds the histograms of a recording.
+    Args:
+        log: A FrameLog.
+        masks: Directory of label images, None to bootstrap the labels from the current thresholds.
+        every: Only use every this many frames.
+    Returns:
+        The HsvCalibration.
+    """
+    calibration = HsvCalibration(bins, beta)
+
+    for i in range(0, len(log.Index), every):
+        frame = log.frame(i)
+        if frame is None:
+            continue
+
+        mask = read_mask(masks, i) if masks is not None else bootstrap_mask(frame)
+        if mask is None:
+            continue
+
+        calibration.add(preprocess(frame), mask)
+
+    return calibration
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the contour pipeline's HSV thresholds from a recording.")
+    parser.add_argument("log", help="recording path without the .frames/.index extension")
+    labels = parser.add_mutually_exclusive_group(required=True)
+    labels.add_argument("--masks", help="directory of label images named by frame number")
+    labels.add_argument("--bootstrap", action="store_true", help="label the targets the current thresholds find")
+    parser.add_argument("--every", type=int, default=1, help="only use every this many frames")
+    parser.add_argument("--bins", type=int, nargs=3, default=(90, 64, 64), help="hue, saturation and value bins")
+    parser.add_argument("--beta", type=float, default=1.0, help="weight of recall against precision")
+    parser.add_argument("--restarts", type=int, default=32)
+    parser.add_argument("--out", help="write the thresholds to this JSON file")
+    args = parser.parse_args(argv)
+
+    calibration = calibrate(FrameLog(args.log), args.masks, args.every, args.bins, args.beta)
+    if calibration.Frames == 0:
+        print("No labeled frames in %s" % args.log)
+        return 1
+
+    hue, sat, val = calibration.search(args.restarts, start=CURRENT)
+    result = {"hue": hue, "sat": sat, "val": val}
+
+    print("%d frames, %d boxes scored" % (calibration.Frames, calibration.Evaluated))
+    for name, ranges in (("current", CURRENT), ("calibrated", (hue, sat, val))):
+        score = calibration.evaluate(*ranges)
+        print("    %-10s hue %-10s sat %-10s val %-10s F %.3f  precision %.3f  recall %.3f" % (
+            name, ranges[0], ranges[1], ranges[2], score["fscore"], score["precision"], score["recall"]))
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
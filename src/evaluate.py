@@ -0,0 +1,292 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+from basicvislib5549 import FrameLog, PipelineGraph
+from .pyramid import PyramidDetector
+from .src import Src
+
+"""
+Headless evaluation of the contour pipelines over recorded footage: video files, directories of images and FrameLog
+recordings. Every input is split into ranges of frames that are processed by a pool of worker processes, and the
+detections are written to CSV or JSON Lines as the ranges finish, in input order, so the outputs of two pipeline
+versions can be compared line by line.
+
+    python -m src.evaluate footage/*.mp4 recordings/video1 --pipeline pyramid --out pyramid.jsonl
+    python -m src.evaluate footage/ --graph variant.json --out variant.csv --workers 4
+
+Coordinates are in pixels of the input frames, whatever resolution the pipeline processes at. Nothing is displayed,
+no camera or window system is needed.
+"""
+
+
+IMAGES = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def contour_pipeline(args):
+    return Src.vision_assistance_contour, Src.CONTOUR_SIZE
+
+
+def compiled_pipeline(args):
+    return (lambda frame: Src.vision_assistance_contour(frame, compiled=True)), Src.CONTOUR_SIZE
+
+
+def graph_pipeline(args):
+    if args.graph:
+        with open(args.graph) as f:
+            config = json.load(f)
+    else:
+        config = Src.CONTOUR_GRAPH
+
+    graph = PipelineGraph(config)
+    # Coordinates are those of the graph's resize, the frame's if it has none.
+    size = next(((node["params"]["width"], node["params"]["height"]) for node in config["nodes"]
+                 if node["stage"] == "resize_image"), None)
+
+    return (lambda frame: Src.vision_assistance_graph(frame, graph)), size
+
+
+def pyramid_pipeline(args):
+    return PyramidDetector().process, None
+
+
+# Pipelines by name, each a function from the arguments to a (pipeline, size) tuple. The pipeline maps a frame to the
+# (average center, centers, bounding boxes) of vision_assistance_contour, size is the (width, height) its coordinates
+# are in, None for those of the frame.
+PIPELINES = {
+    "contour": contour_pipeline,
+    "compiled": compiled_pipeline,
+    "graph": graph_pipeline,
+    "pyramid": pyramid_pipeline,
+}
+
+
+def inputs(paths):
+    """Expands the command-line paths into (kind, path, frames) inputs.
+    Args:
+        paths: Video files, image directories and FrameLog recordings (with or without the .index extension).
+    Returns:
+        A list of ('video' | 'images' | 'log', path, frame count) tuples, the count is None if the video does not
+        report it.
+    """
+    found = []
+
+    for path in paths:
+        base = path[:-len('.index')] if path.endswith('.index') else path
+
+        if os.path.isfile(base + '.index'):
+            found.append(('log', base, len(FrameLog(base))))
+
+        elif os.path.isdir(path):
+            count = len(image_files(path))
+            if count:
+                found.append(('images', path, count))
+
+        elif os.path.isfile(path):
+            capture = cv2.VideoCapture(path)
+            if not capture.isOpened():
+                raise IOError("could not open %s" % path)
+
+            count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            capture.release()
+            found.append(('video', path, count if count > 0 else None))
+
+        else:
+            raise IOError("no such input %s" % path)
+
+    return found
+
+
+def image_files(directory):
+    return sorted(path for path in glob.glob(os.path.join(directory, '*')) if path.lower().endswith(IMAGES))
+
+
+def ranges(found, chunk):
+    """Splits the inputs into (kind, path, start, stop) units of at most chunk frames, stop None for the rest."""
+    units = []
+
+    for kind, path, count in found:
+        if count is None:
+            units.append((kind, path, 0, None))
+            continue
+
+        for start in range(0, count, chunk):
+            units.append((kind, path, start, min(count, start + chunk)))
+
+    return units
+
+
+def frames(kind, path, start, stop):
+    """Yields the (index, frame) of a unit. Records of a log without a frame are skipped."""
+    if kind == 'log':
+        log = FrameLog(path)
+        for i in range(start, stop):
+            frame = log.frame(i)
+            if frame is not None:
+                yield i, frame
+
+    elif kind == 'images':
+        for i, image in enumerate(image_files(path)[start:stop], start):
+            frame = cv2.imread(image, cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield i, frame
+
+    else:
+        capture = cv2.VideoCapture(path)
+        if start > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+        i = start
+        while stop is None or i < stop:
+            ret, frame = capture.read()
+            if not ret:
+                break
+
+            yield i, frame
+            i += 1
+
+        capture.release()
+
+
+# The pipeline of a worker process, built once by _init.
+_pipeline = None
+
+
+def _init(args):
+    global _pipeline
+    _pipeline = PIPELINES[args.pipeline](args)
+
+
+def _evaluate(unit):
+    # Runs in the worker processes, returns the rows of a unit with the time spent on it.
+    pipeline, size = _pipeline
+    kind, path, start, stop = unit
+    rows = []
+    started = time.perf_counter()
+
+    for i, frame in frames(kind, path, start, stop):
+        center, centers, bboxes = pipeline(frame)[:3]
+        centers = np.asarray(centers, float).reshape(-1, 2)
+        bboxes = np.asarray(bboxes, float).reshape(-1, 4)
+
+        if size is not None:
+            # Pixel centers map to pixel centers, boxes by their edges.
+            scale = np.array([frame.shape[1] / size[0], frame.shape[0] / size[1]])
+            center = (np.asarray(center, float) + 0.5) * scale - 0.5 if len(centers) else np.zeros(2)
+            centers = (centers + 0.5) * scale - 0.5
+            bboxes = bboxes * np.tile(scale, 2)
+
+        rows.append({"file": path, "frame": i, "count": len(centers),
+                     "x": round(float(center[0]), 2), "y": round(float(center[1]), 2),
+                     "centers": np.round(centers, 2).tolist(), "bboxes": np.round(bboxes, 2).tolist()})
+
+    return os.getpid(), time.perf_counter() - started, rows
+
+
+class _CsvWriter:
+    """One line per frame, centers and bounding boxes as space separated numbers with ';' between targets."""
+
+    FIELDS = ("file", "frame", "count", "x", "y", "centers", "bboxes")
+
+    def __init__(self, f):
+        self._writer = csv.DictWriter(f, _CsvWriter.FIELDS)
+        self._writer.writeheader()
+
+    def write(self, row):
+        row = dict(row)
+        for key in ("centers", "bboxes"):
+            row[key] = ";".join(" ".join("%g" % v for v in target) for target in row[key])
+        self._writer.writerow(row)
+
+
+class _JsonWriter:
+    """One JSON object per frame."""
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, row):
+        self._f.write(json.dumps(row) + "\n")
+
+
+def evaluate(units, args, writer):
+    """Runs the pipeline over every unit, writing the rows of each as it completes.
+    Returns:
+        A dict of worker process id to its [frames, seconds].
+    """
+    workers = {}
+
+    if args.workers > 0:
+        pool = multiprocessing.Pool(args.workers, _init, (args,))
+        results = pool.imap(_evaluate, units)
+
+    else:
+        pool = None
+        _init(args)
+        results = map(_evaluate, units)
+
+    try:
+        for pid, seconds, rows in results:
+            for row in rows:
+                writer.write(row)
+
+            stats = workers.setdefault(pid, [0, 0.0])
+            stats[0] += len(rows)
+            stats[1] += seconds
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return workers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a contour pipeline over recorded footage without a display.")
+    parser.add_argument("inputs", nargs="+", help="video files, image directories and FrameLog recordings")
+    parser.add_argument("--pipeline", choices=sorted(PIPELINES), default="compiled")
+    parser.add_argument("--graph", help="PipelineGraph JSON config for --pipeline graph, Src.CONTOUR_GRAPH if not set")
+    parser.add_argument("--out", help="CSV or .jsonl file to write the detections to, JSON Lines on stdout if not set")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="output format, from the --out extension if not set")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, 0 for none")
+    parser.add_argument("--chunk", type=int, default=300, help="frames per unit of work")
+    args = parser.parse_args(argv)
+
+    if args.graph and args.pipeline != "graph":
+        parser.error("--graph needs --pipeline graph")
+
+    fmt = args.format or ("csv" if args.out and args.out.lower().endswith(".csv") else "jsonl")
+    units = ranges(inputs(args.inputs), args.chunk)
+
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    started = time.perf_counter()
+    try:
+        workers = evaluate(units, args, _CsvWriter(out) if fmt == "csv" else _JsonWriter(out))
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    total = sum(count for count, seconds in workers.values())
+    report = sys.stderr if not args.out else sys.stdout
+    print("%d frames from %d inputs in %d units, %.2f s, %.1f frames/s with %s '%s'" % (
+        total, len(args.inputs), len(units), elapsed, total / elapsed if elapsed > 0 else 0.0,
+        "%d workers" % args.workers if args.workers else "no workers", args.pipeline), file=report)
+    for pid, (count, seconds) in sorted(workers.items()):
+        print("    worker %-8d %8d frames %8.2f s %10.1f frames/s" % (
+            pid, count, seconds, count / seconds if seconds > 0 else 0.0), file=report)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from .src import Src
+
+"""
+Runs the capture + vision pipeline of any number of cameras concurrently on a persistent thread pool. OpenCV releases
+the GIL in nearly every call of the contour pipeline, so the cameras are processed in parallel rather than in turn.
+"""
+
+
+CameraResult = collections.namedtuple("CameraResult", ["camera", "ret", "frame", "timestamp", "result"])
+
+
+class CameraWorkers:
+    """
+    One worker per camera, reading and processing a frame from every camera per call to process().
+
+    Usage: Construct with the sources (FrameGrabber, VideoCapture or None for a missing camera) and call process()
+    once per loop iteration.
+        Params:
+            sources: A list of sources, one per camera.
+            pipeline: Function run on each frame, called as pipeline(frame, pool=..., metrics=..., **kwargs).
+            maxSkew: Seconds the capture times of a set may differ by. Older frames are read again once, which
+                with a FrameGrabber gives the newest frame. None to accept any skew.
+            metrics: Optional basicvislib5549.Metrics, each camera records under its own 'camN' prefix.
+            **kwargs: Passed to the pipeline, e.g. compiled=True.
+        Variables:
+            self.Skew: Capture time spread of the last set, in seconds.
+            self.Resynced: Number of frames read again to meet maxSkew.
+    """
+
+    def __init__(self, sources, pipeline=Src.vision_assistance_contour, maxSkew=None, metrics=None, **kwargs):
+        self.sources = list(sources)
+        self.pipeline = pipeline
+        self.maxSkew = maxSkew
+        self.kwargs = kwargs
+        self.Skew = 0.0
+        self.Resynced = 0
+
+        metrics = metrics if metrics is not None else Metrics.Disabled
+        self._metrics = [metrics.scoped("cam%d" % i) for i in range(len(self.sources))]
+        self._pools = [FramePool() for source in self.sources]
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix="CameraWorker")
+
+    @staticmethod
+    def _read(source):
+        if source is None:
+            return False, np.zeros((1, 1, 3), np.uint8), time.monotonic()
+
+        if hasattr(source, 'read_stamped'):
+            return source.read_stamped()
+
+        ret, frame = source.read()
+
+        return ret, frame, time.monotonic()
+
+    def _capture(self, camera):
+        with self._metrics[camera].timer("capture"):
+            return CameraWorkers._read(self.sources[camera])
+
+    def _work(self, camera):
+        ret, frame, stamp = self._capture(camera)
+
+        if ret is not True:
+            return CameraResult(camera, False, frame if frame is not None else np.zeros((1, 1, 3), np.uint8), stamp,
+                                None)
+
+        with self._metrics[camera].timer("vision"):
+            result = self.pipeline(frame, pool=self._pools[camera], metrics=self._metrics[camera], **self.kwargs)
+
+        return CameraResult(camera, ret, frame, stamp, result)
+
+    def _resync(self, results):
+        # Cameras that gave no frame have nothing to resync to.
+        read = [r for r in results if r.ret]
+        if not read:
+            return results
+
+        newest = max(r.timestamp for r in read)
+        stale = [r.camera for r in read if newest - r.timestamp > self.maxSkew]
+
+        if not stale:
+            return results
+
+        self.Resynced += len(stale)
+        redone = {camera: self._executor.submit(self._work, camera) for camera in stale}
+
+        return [redone[r.camera].result() if r.camera in redone else r for r in results]
+
+    def process(self):
+        """Reads and processes one frame from every camera concurrently.
+        Returns:
+            A list of CameraResult in camera order. result is None for cameras that failed to read.
+        """
+        futures = [self._executor.submit(self._work, camera) for camera in range(len(self.sources))]
+        results = [future.result() for future in futures]
+
+        if self.maxSkew is not None and len(results) > 1:
+            results = self._resync(results)
+
+        stamps = [r.timestamp for r in results if r.ret]
+        self.Skew = max(stamps) - min(stamps) if stamps else 0.0
+
+        return results
+
+    def close(self):
+        """Stops the workers. The sources are left open."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,209 @@
+import numpy as np
+import cv2
+
+from basicvislib5549 import robotvisionlib as bvl
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from .src import Src
+
+"""
+Coarse-to-fine version of Src.vision_assistance_contour. Candidate blobs are found on an area-downsampled copy of the
+frame, then only windows around them are blurred, thresholded and searched for contours at full resolution. Frames
+without candidates cost the coarse pass alone, frames with targets the coarse pass plus their windows, and the
+contours, centers and bounding boxes have the precision of the full frame.
+
+Src.vision_assistance_contour(..., pyramid=detector) runs it in place of the usual pipeline, with the results scaled to
+CONTOUR_SIZE pixels like those of the other modes.
+"""
+
+
+class PyramidDetector:
+    """
+    Multi-resolution contour detection.
+
+    Usage: Construct one per camera and pass it to Src.vision_assistance_contour as pyramid, or call process() on each
+    frame. process() returns full-resolution pixels unless given a size, a TargetSolver for them is constructed with
+    size set to the frame size.
+        Params:
+            factor: Downsampling of the coarse pass, a power of two. 4 runs it on a 160x120 copy of a 640x480 frame,
+                made by halving the frame twice.
+            padding: Full-resolution pixels added around each candidate's window.
+            grow: Times a window may grow to take in a blob crossing its edge, before the frame is processed in full.
+            minFraction: Fraction of the scaled minimum area a coarse blob needs to become a candidate. Coarse blobs
+                are smaller and blurrier than they are at full resolution, so candidates are accepted generously.
+            pool: Optional FramePool, one is created if not given.
+            metrics: Optional basicvislib5549.Metrics.
+        Variables:
+            self.Windows: (x0, y0, x1, y1) full-resolution windows processed on the last frame.
+            self.CoarseOnly: Frames answered by the coarse pass alone.
+            self.Refined: Frames refined in windows.
+            self.Grown: Windows grown around a blob crossing their edge.
+            self.FullFrames: Frames processed in full at full resolution, when blobs kept crossing their windows.
+
+    The pipeline parameters are those of Src.vision_assistance_contour, scaled from its processing resolution to the
+    frame's: the blur radius and the minimum and maximum sizes by the ratio of the widths, areas by its square.
+    """
+
+    def __init__(self, factor=4, padding=8, minFraction=0.25, pool=None, metrics=None, grow=2):
+        if factor < 1 or factor & (factor - 1):
+            raise ValueError("factor must be a power of two, not %r" % factor)
+
+        self.factor = factor
+        self.padding = padding
+        self.minFraction = minFraction
+        self.grow = grow
+        self.pool = pool if pool is not None else FramePool()
+        self.metrics = metrics if metrics is not None else Metrics.Disabled
+
+        self.Windows = []
+        self.CoarseOnly = 0
+        self.Refined = 0
+        self.Grown = 0
+        self.FullFrames = 0
+
+        self._scale = None
+
+    def _configure(self, width):
+        # Scale of the frame against the contour pipeline's processing resolution, parameters follow from it.
+        scale = width / Src.CONTOUR_SIZE[0]
+        if scale == self._scale:
+            return
+
+        self._scale = scale
+        self._blur = max(1, int(round(Src.CONTOUR_BLUR * scale)))
+        self._coarseBlur = max(1, int(round(Src.CONTOUR_BLUR * scale / self.factor)))
+
+        self._filter = Src.contour_filter(scale)
+        self._coarseArea = Src.contour_filter(scale / self.factor)[0] * self.minFraction
+
+    def _mask(self, source, radius, out=None):
+        blurred = bvl.RobotVision.blur(source, bvl.RobotVision.BlurType.BOX_BLUR, radius)
+
+        return Src.compiled_threshold(*Src.CONTOUR_THRESHOLD).apply(blurred, out=out)
+
+    def _downsample(self, frame):
+        # Halving in steps averages the same pixels as one INTER_AREA resize, several times faster.
+        level, factor = frame, 1
+        while factor < self.factor:
+            factor *= 2
+            shape = (frame.shape[0] // factor, frame.shape[1] // factor, 3)
+            level = cv2.resize(level, (shape[1], shape[0]), dst=self.pool.get("level %d" % factor, shape),
+                               interpolation=cv2.INTER_AREA)
+
+        return level
+
+    def _candidates(self, frame):
+        height, width = frame.shape[:2]
+        size = (width // self.factor, height // self.factor)
+
+        with self.metrics.timer("coarse"):
+            coarse = self._downsample(frame)
+            mask = self._mask(coarse, self._coarseBlur, out=self.pool.get("coarse mask", (size[1], size[0])))
+            blobs = bvl.RobotVision.find_contours(mask, True)
+
+        windows = []
+        margin = self.padding + self._blur + self.factor
+
+        for blob in blobs:
+            x, y, w, h = cv2.boundingRect(blob)
+            if w * h < self._coarseArea:
+                continue
+
+            windows.append([max(0, x * self.factor - margin), max(0, y * self.factor - margin),
+                            min(width, (x + w) * self.factor + margin), min(height, (y + h) * self.factor + margin)])
+
+        return PyramidDetector._merge(windows)
+
+    @staticmethod
+    def _merge(windows):
+        # Overlapping windows are joined, so no blob is found twice.
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(windows)):
+                for j in range(i + 1, len(windows)):
+                    a, b = windows[i], windows[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        windows[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del windows[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        return [tuple(window) for window in windows]
+
+    def _refine(self, frame, window):
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = window
+        # The blur reads a margin around the window, clamped to the frame like the full-frame border.
+        r = self._blur
+        ex0, ey0, ex1, ey1 = max(0, x0 - r), max(0, y0 - r), min(width, x1 + r), min(height, y1 + r)
+
+        mask = self._mask(frame[ey0:ey1, ex0:ex1], r)[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+        blobs = bvl.RobotVision.find_contours(mask, False, (x0, y0))
+
+        # A blob reaching an inner edge of the window may continue outside of it, the window is grown to take it in.
+        grown = list(window)
+        margin = self.padding + r
+        for blob in blobs:
+            x, y, w, h = cv2.boundingRect(blob)
+            if (x0 > 0 and x <= x0) or (y0 > 0 and y <= y0) or (x1 < width and x + w >= x1) or \
+                    (y1 < height and y + h >= y1):
+                grown = [min(grown[0], max(0, x - margin)), min(grown[1], max(0, y - margin)),
+                         max(grown[2], min(width, x + w + margin)), max(grown[3], min(height, y + h + margin))]
+
+        return blobs, tuple(grown)
+
+    def process(self, source: np.ndarray, contours: bool = False, size: tuple = None) -> (tuple, tuple, tuple):
+        """Finds the targets of a frame.
+        Args:
+            contours: True to also return the contours of the targets.
+            size: (width, height) the results are scaled to, like Src.CONTOUR_SIZE. Full-resolution pixels if None.
+        Returns:
+            The same (average center, centers, bounding boxes[, contours]) as Src.vision_assistance_contour.
+        """
+        height, width = source.shape[:2]
+        self._configure(width)
+        self.Windows = windows = self._candidates(source)
+
+        found = []
+        if not windows:
+            self.CoarseOnly += 1
+
+        else:
+            with self.metrics.timer("refine"):
+                # Windows left as they are keep their results while others grow.
+                refined = {}
+
+                for attempt in range(self.grow + 1):
+                    grown = []
+                    for window in windows:
+                        if window not in refined:
+                            refined[window] = self._refine(source, window)
+                        grown.append(refined[window][1])
+
+                    if grown == windows:
+                        self.Refined += 1
+                        break
+
+                    self.Grown += sum(a != b for a, b in zip(windows, grown))
+                    windows = PyramidDetector._merge([list(window) for window in grown])
+
+                else:
+                    # Blobs keep crossing their windows, process the whole frame rather than cut one.
+                    windows = [(0, 0, width, height)]
+                    refined[windows[0]] = self._refine(source, windows[0])
+                    self.FullFrames += 1
+
+                self.Windows = windows
+                for window in windows:
+                    found.extend(refined[window][0])
+
+        with self.metrics.timer("filter contours"):
+            found, features, hulls = bvl.RobotVision.filter_contour_features(found, *self._filter)
+
+        if size is not None:
+            found = Src._rescale(found, features, size[0] / width, size[1] / height, contours)
+
+        return Src._summarize(found, features, contours)
@@ -0,0 +1,120 @@
+import numpy as np
+
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from .src import Src
+
+"""
+Incremental version of Src.vision_assistance_contour. Once targets are found, only a padded region around their
+bounding boxes is blurred, thresholded and searched for contours, with a full-frame pass every few frames or whenever
+the region loses the targets.
+"""
+
+
+class RoiTracker:
+    """
+    Region-of-interest restricted contour detection.
+
+    Usage: Construct one per camera and call process() on each frame instead of Src.vision_assistance_contour.
+        Params:
+            padding: Pixels (at the processing resolution) added around the previous targets' bounding boxes.
+            reacquire: Run a full-frame pass at least every this many frames, 0 to only do so on failure.
+            compiled: Passed to the pipeline, see Src.vision_assistance_contour.
+            pool: Optional FramePool, one is created if not given.
+            metrics: Optional basicvislib5549.Metrics.
+        Variables:
+            self.Region: (x0, y0, x1, y1) processed on the last frame, at the processing resolution.
+            self.FullFrames: Number of full-frame passes.
+            self.RegionFrames: Number of frames answered from the region only.
+
+    The result of a region pass equals the full-frame result whenever no foreground pixel of the region touches its
+    edge, i.e. every blob seen in the region lies entirely inside it. Otherwise the frame is processed again in full.
+    """
+
+    def __init__(self, padding=24, reacquire=30, compiled=False, pool=None, metrics=None):
+        self.padding = padding
+        self.reacquire = reacquire
+        self.compiled = compiled
+        self.pool = pool if pool is not None else FramePool()
+        self.metrics = metrics if metrics is not None else Metrics.Disabled
+
+        self.Region = None
+        self.FullFrames = 0
+        self.RegionFrames = 0
+        self._sinceFull = 0
+        self._bboxes = None
+
+    def reset(self):
+        """Forgets the targets, the next frame is processed in full."""
+        self._bboxes = None
+
+    def _region(self, width, height):
+        bboxes = self._bboxes
+        x0 = max(0, int(bboxes[:, 0].min()) - self.padding)
+        y0 = max(0, int(bboxes[:, 1].min()) - self.padding)
+        x1 = min(width, int((bboxes[:, 0] + bboxes[:, 2]).max()) + self.padding)
+        y1 = min(height, int((bboxes[:, 1] + bboxes[:, 3]).max()) + self.padding)
+
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _touches_edge(mask, region, width, height):
+        x0, y0, x1, y1 = region
+
+        # Edges on the frame border are the same as in a full-frame pass.
+        return ((y0 > 0 and mask[0].any()) or (y1 < height and mask[-1].any()) or
+                (x0 > 0 and mask[:, 0].any()) or (x1 < width and mask[:, -1].any()))
+
+    def _full(self, resized, contours=False):
+        mask = Src.contour_mask(resized, self.compiled, self.pool, self.metrics)
+        result = Src.contour_targets(mask, self.metrics, contours=contours)
+
+        self.FullFrames += 1
+        self._sinceFull = 0
+        self.Region = (0, 0, resized.shape[1], resized.shape[0])
+
+        return result
+
+    def process(self, source: np.ndarray, predicted: np.ndarray = None,
+                contours: bool = False) -> (tuple, tuple, tuple):
+        """Finds the targets of a frame.
+        Args:
+            predicted: Optional (N, 4) bounding boxes to look around instead of those of the last targets, e.g. where
+                a tracker expects them to have moved.
+            contours: True to also return the contours of the targets.
+        Returns:
+            The same (average center, centers, bounding boxes[, contours]) as Src.vision_assistance_contour.
+        """
+        resized = Src.contour_resize(source, self.pool, self.metrics)
+        height, width = resized.shape[:2]
+
+        due = self.reacquire > 0 and self._sinceFull + 1 >= self.reacquire
+
+        if self._bboxes is None or len(self._bboxes) == 0 or due:
+            result = self._full(resized, contours)
+
+        else:
+            if predicted is not None and len(predicted) > 0:
+                self._bboxes = predicted
+
+            region = self._region(width, height)
+            mask = Src.contour_mask(resized, self.compiled, self.pool, self.metrics, region)
+
+            if RoiTracker._touches_edge(mask, region, width, height):
+                result = self._full(resized, contours)
+
+            else:
+                result = Src.contour_targets(mask, self.metrics, (region[0], region[1]), contours)
+
+                if len(result[2]) == 0:
+                    # Lost the targets, look at the whole frame.
+                    result = self._full(resized, contours)
+
+                else:
+                    self.RegionFrames += 1
+                    self._sinceFull += 1
+                    self.Region = region
+
+        self._bboxes = result[2]
+
+        return result
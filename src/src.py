@@ -1,70 +1,334 @@
-from basicvislib5549 import robotvisionlib as bvl
-import cv2
-import math
-import numpy as np
-
-"""
-Pipeline for vision calculation, performs the main brunt of the work on the TX2 including calculating contour
-dimensions, centers, and average center of the contours.
-"""
-
-
-class Src:
-
-    @staticmethod
-    def vision_assistance_contour(source: np.ndarray) -> (tuple, tuple, tuple):
-
-        source = bvl.RobotVision.resize_image(source, 280, 210, cv2.INTER_CUBIC)
-
-        source = bvl.RobotVision.blur(source, bvl.RobotVision.BlurType.BOX_BLUR, 5)
-
-        source = bvl.RobotVision.brightness_contrast(source, -255, 256*1.4-1)
-
-        source = bvl.RobotVision.hsv_threshold(source, [80, 100], [140, 255], [100, 255])
-
-        contours = bvl.RobotVision.find_contours(source, False)
-
-        contours = bvl.RobotVision.filter_contours(contours, 200, 0, 10, 1000, 10, 1000, [0, 100], 100000, 0, 0, 1000)
-
-        contours = bvl.RobotVision.convex_hulls(contours)
-
-        bboxes = bvl.RobotVision.contour_bounding_box(contours)
-
-        centers = bvl.RobotVision.contour_centers(contours)
-
-        avgcenx = 0
-        avgceny = 0
-
-        for c in contours:
-            avgcenx = avgcenx + centers[c, 0]
-            avgceny = avgceny + centers[c, 1]
-
-        return (avgcenx, avgceny), centers, bboxes
-
-    @staticmethod
-    def vision_assistance_camshift(source: np.ndarray, window: tuple, roi_hist: tuple) -> (tuple, int):
-
-        trackwindow_new, pts = bvl.RobotVision.camshift_cv(source, window, roi_hist)
-
-        angle = 0
-
-        if pts is not False:
-            # magnitude = math.sqrt(math.pow((pts[1, 0] - pts[0, 0]), 2) + math.pow((pts[1, 1] - pts[0, 1]), 2))
-            ymag1 = (pts[1, 0] - pts[0, 0])
-            xmag1 = (pts[1, 1] - pts[0, 1])
-
-            ymag2 = (pts[2, 0] - pts[1, 0])
-            xmag2 = (pts[2, 1] - pts[1, 1])
-
-            angle = 90
-
-            angle1 = (abs(math.degrees(math.atan(ymag1 / xmag1)) - 180))
-            angle2 = (abs(math.degrees(math.atan(ymag2 / xmag2)) - 180))
-
-            if 45 < angle1 < 135:
-                angle = angle1
-
-            if 45 < angle2 < 135:
-                angle = angle2
-
-        return trackwindow_new, angle      #returns trackwindow as to keep evaluating for camshift each frame, angle as evaluated angle.
+from basicvislib5549 import robotvisionlib as bvl
+from basicvislib5549.compiledthreshold import CompiledThreshold
+from basicvislib5549.framecontext import FrameContext
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from basicvislib5549.pipelinegraph import PipelineGraph
+import cv2
+import math
+import threading
+import numpy as np
+
+"""
+Pipeline for vision calculation, performs the main brunt of the work on the TX2 including calculating contour
+dimensions, centers, and average center of the contours.
+"""
+
+
+class _NoPool:
+    """Stand-in for a FramePool that lets each RobotVision stage allocate its own output."""
+
+    @staticmethod
+    def get(name, shape, dtype=np.uint8):
+        return None
+
+
+class Src:
+
+    _threshold = None
+    _threshold_lock = threading.Lock()
+    _nopool = _NoPool()
+
+    @staticmethod
+    def compiled_threshold(brightness, contrast, hue, sat, val) -> CompiledThreshold:
+        """Gets the shared CompiledThreshold, only rebuilding its table when the parameters change."""
+
+        with Src._threshold_lock:
+            if Src._threshold is None:
+                Src._threshold = CompiledThreshold(brightness, contrast, hue, sat, val)
+
+            else:
+                Src._threshold.update(brightness, contrast, hue, sat, val)
+
+            return Src._threshold
+
+    # Processing resolution and box blur radius of the contour pipeline.
+    CONTOUR_SIZE = (280, 210)
+    CONTOUR_BLUR = 5
+
+    # Brightness, contrast, hue, saturation and value of the threshold, and the filter_contour_features arguments.
+    CONTOUR_THRESHOLD = (-255, 256*1.4-1, [80, 100], [140, 255], [100, 255])
+    CONTOUR_FILTER = (200, 0, 10, 1000, 10, 1000, [0, 100], 100000, 0, 0, 1000)
+
+    @staticmethod
+    def vision_assistance_contour(source: np.ndarray, compiled: bool = False, pool: FramePool = None,
+                                  metrics: Metrics = None, contours: bool = False,
+                                  context: FrameContext = None, scale: float = 1.0,
+                                  pyramid=None) -> (tuple, tuple, tuple):
+
+        if pyramid is not None:
+            # Coarse-to-fine on the full-resolution frame (see PyramidDetector), results in CONTOUR_SIZE pixels.
+            return pyramid.process(source, contours=contours, size=Src.CONTOUR_SIZE)
+
+        if scale != 1.0:
+            # Processed at a fraction of the resolution, the results are still in CONTOUR_SIZE pixels.
+            return Src._contour_scaled(source, scale, compiled, pool, metrics, contours)
+
+        if context is not None:
+            # Intermediates and targets are shared with every other pipeline run on this frame through the context.
+            return Src._contour_context(source, compiled, metrics, contours, context)
+
+        source = Src.contour_resize(source, pool, metrics)
+
+        source = Src.contour_mask(source, compiled, pool, metrics)
+
+        return Src.contour_targets(source, metrics, contours=contours)
+
+    @staticmethod
+    def _contour_context(source, compiled, metrics, contours, context):
+        context.update(source)
+        metrics = metrics if metrics is not None else Metrics.Disabled
+        size = Src.CONTOUR_SIZE
+        blur = (bvl.RobotVision.BlurType.BOX_BLUR, Src.CONTOUR_BLUR)
+        brightness, contrast, hue, sat, val = Src.CONTOUR_THRESHOLD
+        # The compiled and uncompiled masks are bit-identical, so they share one key.
+        name = "mask %dx%d %d %g %r" % (size + blur + (Src.CONTOUR_THRESHOLD,))
+
+        def mask():
+            # Each step resizes and blurs first, unless another pipeline already did at CONTOUR_SIZE.
+            if compiled:
+                with metrics.timer("blur"):
+                    blurred = context.blurred(size, *blur)
+
+                with metrics.timer("threshold"):
+                    return Src.compiled_threshold(*Src.CONTOUR_THRESHOLD).apply(
+                        blurred, out=context.pool.get(name, (size[1], size[0])))
+
+            with metrics.timer("threshold"):
+                hsv = context.hsv(size, blur, (brightness, contrast))
+                return cv2.inRange(hsv, (hue[0], sat[0], val[0]), (hue[1], sat[1], val[1]),
+                                   dst=context.pool.get(name, (size[1], size[0])))
+
+        return Src.contour_targets(context.get(name, mask), metrics, contours=contours)
+
+    @staticmethod
+    def _contour_scaled(source, scale, compiled, pool, metrics, contours):
+        pool = pool if pool is not None else Src._nopool
+        metrics = metrics if metrics is not None else Metrics.Disabled
+        width, height = Src.CONTOUR_SIZE
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+        with metrics.timer("resize"):
+            source = bvl.RobotVision.resize_image(source, size[0], size[1], cv2.INTER_CUBIC,
+                                                  out=pool.get("resized", (size[1], size[0], 3)))
+
+        source = Src.contour_mask(source, compiled, pool, metrics, radius=max(1, int(round(Src.CONTOUR_BLUR * scale))))
+
+        with metrics.timer("find contours"):
+            found = bvl.RobotVision.find_contours(source, False)
+
+        with metrics.timer("filter contours"):
+            found, features, hulls = bvl.RobotVision.filter_contour_features(found, *Src.contour_filter(scale))
+
+        found = Src._rescale(found, features, width / size[0], height / size[1], contours)
+
+        return Src._summarize(found, features, contours)
+
+    @staticmethod
+    def _rescale(found, features, sx, sy, contours):
+        # Pixel centers map onto pixel centers, boxes by their edges. Contours become float32 unless not returned.
+        features['cx'] = (features['cx'] + 0.5) * sx - 0.5
+        features['cy'] = (features['cy'] + 0.5) * sy - 0.5
+        for name, factor in (('x', sx), ('w', sx), ('y', sy), ('h', sy)):
+            features[name] = np.round(features[name] * factor)
+
+        if contours:
+            found = [((contour + 0.5) * (sx, sy) - 0.5).astype(np.float32) for contour in found]
+
+        return found
+
+    @staticmethod
+    def contour_filter(scale: float = 1.0) -> tuple:
+        """Gets CONTOUR_FILTER for frames scaled by scale from CONTOUR_SIZE, lengths scaled by it and areas by its
+        square."""
+
+        area, perimeter, minWidth, maxWidth, minHeight, maxHeight, solidity, maxVertices, minVertices, minRatio, \
+            maxRatio = Src.CONTOUR_FILTER
+
+        return (area * scale ** 2, perimeter * scale, minWidth * scale, maxWidth * scale, minHeight * scale,
+                maxHeight * scale, solidity, maxVertices, minVertices, minRatio, maxRatio)
+
+    @staticmethod
+    def contour_resize(source: np.ndarray, pool: FramePool = None, metrics: Metrics = None) -> np.ndarray:
+        """First stage of vision_assistance_contour, scales the frame to the processing resolution."""
+
+        pool = pool if pool is not None else Src._nopool
+        metrics = metrics if metrics is not None else Metrics.Disabled
+        width, height = Src.CONTOUR_SIZE
+
+        with metrics.timer("resize"):
+            return bvl.RobotVision.resize_image(source, width, height, cv2.INTER_CUBIC,
+                                                out=pool.get("resized", (height, width, 3)))
+
+    @staticmethod
+    def contour_mask(source: np.ndarray, compiled: bool = False, pool: FramePool = None, metrics: Metrics = None,
+                     region: tuple = None, radius: int = None) -> np.ndarray:
+        """Second stage of vision_assistance_contour, blurs and thresholds the resized frame.
+        Args:
+            region: Optional (x0, y0, x1, y1) to only process that part of the frame. The blur reads a margin around
+                it, so the result equals the same region of the full-frame mask.
+            radius: Box blur radius, CONTOUR_BLUR if None.
+        Returns:
+            The mask, or the view of the region in the pooled full-frame mask.
+        """
+
+        if pool is None:
+            # Every stage allocates its own output.
+            pool = Src._nopool
+
+        if metrics is None:
+            metrics = Metrics.Disabled
+
+        height, width = source.shape[:2]
+        x0, y0, x1, y1 = region if region is not None else (0, 0, width, height)
+        # The blur is run on the region grown by its radius, clamped to the frame like the full-frame border.
+        margin = radius if radius is not None else Src.CONTOUR_BLUR
+        ex0, ey0 = max(0, x0 - margin), max(0, y0 - margin)
+        ex1, ey1 = min(width, x1 + margin), min(height, y1 + margin)
+
+        def view(name, shape, expanded=False):
+            buffer = pool.get(name, shape)
+            if buffer is None:
+                return None
+            return buffer[ey0:ey1, ex0:ex1] if expanded else buffer[y0:y1, x0:x1]
+
+        with metrics.timer("blur"):
+            source = bvl.RobotVision.blur(source[ey0:ey1, ex0:ex1], bvl.RobotVision.BlurType.BOX_BLUR,
+                                          margin, out=view("blurred", source.shape, True))
+            source = source[y0 - ey0:y1 - ey0, x0 - ex0:x1 - ex0]
+
+        with metrics.timer("threshold"):
+            if compiled:
+                # Single lookup per pixel, bit-identical to the brightness_contrast + hsv_threshold chain below.
+                source = Src.compiled_threshold(*Src.CONTOUR_THRESHOLD).apply(source, out=view("mask", (height, width)))
+
+            else:
+                brightness, contrast, hue, sat, val = Src.CONTOUR_THRESHOLD
+                source = bvl.RobotVision.brightness_contrast(source, brightness, contrast,
+                                                             out=view("adjusted", (height, width, 3)))
+
+                source = bvl.RobotVision.hsv_threshold(source, hue, sat, val,
+                                                       out=view("mask", (height, width)),
+                                                       hsv=view("hsv", (height, width, 3)))
+
+        return source
+
+    @staticmethod
+    def contour_targets(mask: np.ndarray, metrics: Metrics = None, offset: tuple = (0, 0),
+                        contours: bool = False) -> (tuple, tuple, tuple):
+        """Last stage of vision_assistance_contour, finds and filters the targets in a mask.
+        Args:
+            offset: (x, y) of the mask in the frame, added to every returned coordinate.
+            contours: True to also return the contours of the targets, for TargetSolver.
+        Returns:
+            The (average center, centers, bounding boxes), followed by the contours if asked for.
+        """
+
+        if metrics is None:
+            metrics = Metrics.Disabled
+
+        with metrics.timer("find contours"):
+            found = bvl.RobotVision.find_contours(mask, False, offset)
+
+        with metrics.timer("filter contours"):
+            found, features, hulls = bvl.RobotVision.filter_contour_features(found, *Src.CONTOUR_FILTER)
+
+        return Src._summarize(found, features, contours)
+
+    @staticmethod
+    def _summarize(found, features, contours):
+        # Bounding boxes of the hulls are those of the contours, centers are the hull centroids.
+        bboxes = np.stack((features['x'], features['y'], features['w'], features['h']), axis=1)
+
+        centers = np.stack((features['cx'], features['cy']), axis=1).astype(int)
+
+        if len(centers) > 0:
+            avgcenx, avgceny = centers.mean(axis=0)
+
+        else:
+            avgcenx = 0
+            avgceny = 0
+
+        if contours:
+            return (avgcenx, avgceny), centers, bboxes, found
+
+        return (avgcenx, avgceny), centers, bboxes
+
+    # vision_assistance_contour as a PipelineGraph config, the starting point for new variants.
+    CONTOUR_GRAPH = {
+        "nodes": [
+            {"name": "resized", "stage": "resize_image", "inputs": ["frame"],
+             "params": {"width": CONTOUR_SIZE[0], "height": CONTOUR_SIZE[1], "interpolation": "cv2.INTER_CUBIC"}},
+            {"name": "blurred", "stage": "blur", "inputs": ["resized"],
+             "params": {"method": "RobotVision.BlurType.BOX_BLUR", "radius": CONTOUR_BLUR}},
+            {"name": "adjusted", "stage": "brightness_contrast", "inputs": ["blurred"],
+             "params": dict(zip(("brightness", "contrast"), CONTOUR_THRESHOLD[:2]))},
+            {"name": "mask", "stage": "hsv_threshold", "inputs": ["adjusted"],
+             "params": dict(zip(("hue", "sat", "val"), CONTOUR_THRESHOLD[2:]))},
+            {"name": "contours", "stage": "find_contours", "inputs": ["mask"], "params": {"external_only": False}},
+            {"name": "targets", "stage": "filter_contour_features", "inputs": ["contours"],
+             "params": dict(zip(("min_area", "min_perimeter", "min_width", "max_width", "min_height", "max_height",
+                                 "solidity", "max_vertex_count", "min_vertex_count", "min_ratio", "max_ratio"),
+                                CONTOUR_FILTER))},
+        ],
+        "outputs": ["targets"],
+    }
+
+    @staticmethod
+    def vision_assistance_graph(source: np.ndarray, graph: PipelineGraph, output: str = "targets",
+                                contours: bool = False) -> (tuple, tuple, tuple):
+        """Runs a contour pipeline declared as a PipelineGraph, e.g. PipelineGraph(Src.CONTOUR_GRAPH).
+        Args:
+            output: Name of the output holding the filter_contour_features result.
+        Returns:
+            The same as vision_assistance_contour.
+        """
+
+        found, features, hulls = graph.run(source)[output]
+
+        return Src._summarize(found, features, contours)
+
+    @staticmethod
+    def vision_assistance_camshift(source: np.ndarray, window: tuple, roi_hist: tuple,
+                                   context: FrameContext = None, size: tuple = None) -> (tuple, int):
+        """Tracks the window with CamShift.
+        Args:
+            context: Optional FrameContext the HSV conversion is shared through.
+            size: Optional (width, height) to track in the frame resized to, the window is in its pixels. At
+                CONTOUR_SIZE the resized frame is the one of vision_assistance_contour on the same context.
+        Returns:
+            The new window, to pass in on the next frame, and the angle of the tracked box.
+        """
+
+        hsv = None
+        if context is not None:
+            context.update(source)
+            hsv = context.hsv(size)
+
+        elif size is not None:
+            source = bvl.RobotVision.resize_image(source, size[0], size[1], cv2.INTER_CUBIC)
+
+        trackwindow_new, pts = bvl.RobotVision.camshift_cv(source, window, roi_hist, hsv)
+
+        angle = 0
+
+        if pts is not False:
+            # magnitude = math.sqrt(math.pow((pts[1, 0] - pts[0, 0]), 2) + math.pow((pts[1, 1] - pts[0, 1]), 2))
+            ymag1 = (pts[1, 0] - pts[0, 0])
+            xmag1 = (pts[1, 1] - pts[0, 1])
+
+            ymag2 = (pts[2, 0] - pts[1, 0])
+            xmag2 = (pts[2, 1] - pts[1, 1])
+
+            angle = 90
+
+            angle1 = (abs(math.degrees(math.atan(ymag1 / xmag1)) - 180))
+            angle2 = (abs(math.degrees(math.atan(ymag2 / xmag2)) - 180))
+
+            if 45 < angle1 < 135:
+                angle = angle1
+
+            if 45 < angle2 < 135:
+                angle = angle2
+
+        return trackwindow_new, angle      #returns trackwindow as to keep evaluating for camshift each frame, angle as evaluated angle.
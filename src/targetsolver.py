@@ -0,0 +1,273 @@
+import collections
+import math
+
+import numpy as np
+import cv2
+
+from .src import Src
+
+"""
+Target geometry: turns the tape contours found by Src.vision_assistance_contour into the distance, yaw and skew of the
+target, taking the camera intrinsics and lens distortion into account.
+
+Only the contour points are undistorted, through a table computed once per resolution, never the whole frame. The
+points of every tape in view are undistorted together, then every run of neighbouring tapes is solved with a planar
+solvePnP over the corners of all its tapes, and the runs that fit the model are kept as targets.
+"""
+
+
+TargetPose = collections.namedtuple("TargetPose", ["distance", "yaw", "skew", "rvec", "tvec"])
+
+
+class TargetSolver:
+    """
+    Pose of a vision target from the contours of its tapes.
+
+    Usage: Construct once with the calibration of the camera and call solve() with the contours of each frame.
+        Params:
+            cameraMatrix: 3x3 camera matrix at calibrationSize.
+            distCoeffs: Distortion coefficients, None for none.
+            calibrationSize: (width, height) the camera was calibrated at.
+            size: (width, height) of the frames the contours come from, Src.CONTOUR_SIZE by default.
+            model: (tapes, 4, 3) corners of every tape of the target in the plane of the target, in the unit distance
+                is reported in. Tapes are ordered left to right, corners from the top one clockwise. The 2019 tape
+                pair in inches by default.
+            maxError: Most mean reprojection error of the tape corners, as a fraction of the target's width in the
+                image, for a run of tapes to be taken as a target.
+        Variables:
+            self.cameraMatrix: The camera matrix scaled to size.
+
+    The target frame has x to the right, y down and z into the target, so yaw and skew are positive to the right:
+        distance: Distance from the camera to the center of the target, along the floor plane of the camera.
+        yaw: Degrees from the optical axis to the center of the target.
+        skew: Degrees the target plane is turned from facing the camera, 0 when it is parallel to the image plane.
+    Skew comes from the perspective of tapes a few pixels across at the processing resolution, so it is far less
+    precise than distance and yaw, especially at range.
+    """
+
+    @staticmethod
+    def tape_pair(width=2.0, length=5.5, angle=14.5, gap=8.0):
+        """Gets the model of a pair of tapes leaning toward each other at the top, like the 2019 targets.
+        Args:
+            width: Width of each tape.
+            length: Length of each tape.
+            angle: Degrees each tape leans from vertical.
+            gap: Distance between the tapes at their closest, the top inner corners.
+        Returns:
+            The (2, 4, 3) model, centered on the target.
+        """
+        a = math.radians(angle)
+        # Corners of the left tape clockwise, turned so its top leans toward the middle.
+        tape = np.array([[-width / 2, -length / 2], [width / 2, -length / 2], [width / 2, length / 2],
+                         [-width / 2, length / 2]])
+        tape = tape @ np.array([[math.cos(a), math.sin(a)], [-math.sin(a), math.cos(a)]])
+        tape = TargetSolver._from_top(tape)
+        tape[:, 0] += -gap / 2 - tape[:, 0].max()
+
+        # The right tape is the mirror image of the left one, mirroring reverses the order of its corners.
+        mirrored = TargetSolver._from_top(tape[::-1] * [-1, 1])
+
+        model = np.zeros((2, 4, 3))
+        model[0, :, :2] = tape
+        model[1, :, :2] = mirrored
+        model[:, :, 1] -= (model[:, :, 1].min() + model[:, :, 1].max()) / 2
+
+        return model
+
+    @staticmethod
+    def load_calibration(path):
+        """Loads a calibration saved by OpenCV's calibration tools (cv2.FileStorage yml, xml or json).
+        Returns:
+            A (cameraMatrix, distCoeffs, (width, height)) tuple.
+        """
+        storage = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+
+        if not storage.isOpened():
+            raise IOError("Calibration file %s could not be read" % path)
+
+        cameraMatrix = storage.getNode("camera_matrix").mat()
+        distCoeffs = storage.getNode("distortion_coefficients").mat()
+        size = (int(storage.getNode("image_width").real()), int(storage.getNode("image_height").real()))
+        storage.release()
+
+        if cameraMatrix is None:
+            raise ValueError("Calibration file %s has no camera_matrix" % path)
+
+        return cameraMatrix, distCoeffs, size
+
+    @staticmethod
+    def from_file(path, size=Src.CONTOUR_SIZE, model=None):
+        """Gets a solver for the camera calibrated in a file, see load_calibration."""
+        cameraMatrix, distCoeffs, calibrationSize = TargetSolver.load_calibration(path)
+
+        return TargetSolver(cameraMatrix, distCoeffs, calibrationSize, size, model)
+
+    @staticmethod
+    def from_fov(fov, size=Src.CONTOUR_SIZE, model=None):
+        """Gets a solver for an uncalibrated camera from its horizontal field of view in degrees, without distortion."""
+        width, height = size
+        focal = width / 2 / math.tan(math.radians(fov) / 2)
+        cameraMatrix = np.array([[focal, 0, (width - 1) / 2], [0, focal, (height - 1) / 2], [0, 0, 1]])
+
+        return TargetSolver(cameraMatrix, None, size, size, model)
+
+    def __init__(self, cameraMatrix, distCoeffs=None, calibrationSize=Src.CONTOUR_SIZE, size=Src.CONTOUR_SIZE,
+                 model=None, maxError=0.05):
+        self.size = tuple(size)
+        self.model = model if model is not None else TargetSolver.tape_pair()
+        self.maxError = maxError
+
+        # The intrinsics follow the frame when it is resized (pixel centers at +0.5), distortion coefficients do not.
+        sx = size[0] / calibrationSize[0]
+        sy = size[1] / calibrationSize[1]
+        self.cameraMatrix = np.array(cameraMatrix, np.float64) * [[sx], [sy], [1]]
+        self.cameraMatrix[0, 2] += (sx - 1) / 2
+        self.cameraMatrix[1, 2] += (sy - 1) / 2
+        self.distCoeffs = np.array(distCoeffs, np.float64).reshape(-1) if distCoeffs is not None else None
+
+        self._points = None
+        self._maps = None
+        self._objectPoints = self.model.reshape(-1, 3)
+
+    def _table(self):
+        # Undistorted position of every pixel of the frame.
+        if self._points is None:
+            width, height = self.size
+            grid = np.mgrid[0:height, 0:width][::-1].transpose(1, 2, 0).reshape(-1, 1, 2).astype(np.float32)
+
+            if self.distCoeffs is None or not self.distCoeffs.any():
+                points = grid
+            else:
+                points = cv2.undistortPoints(grid, self.cameraMatrix, self.distCoeffs, P=self.cameraMatrix)
+
+            self._points = points.reshape(height, width, 2)
+
+        return self._points
+
+    def undistort_points(self, points):
+        """Removes the lens distortion from pixel coordinates.
+        Args:
+            points: (N, 2) or (N, 1, 2) pixel coordinates, integer ones (contour points) are looked up in the table.
+        Returns:
+            (N, 2) float32 undistorted pixel coordinates.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+
+        if np.issubdtype(points.dtype, np.integer):
+            width, height = self.size
+            return self._table()[np.clip(points[:, 1], 0, height - 1), np.clip(points[:, 0], 0, width - 1)]
+
+        if self.distCoeffs is None:
+            return points.astype(np.float32)
+
+        return cv2.undistortPoints(points.reshape(-1, 1, 2).astype(np.float32), self.cameraMatrix, self.distCoeffs,
+                                   P=self.cameraMatrix).reshape(-1, 2)
+
+    def undistort_frame(self, frame):
+        """Removes the lens distortion from a whole frame of self.size, for display. The maps are computed once."""
+        if self.distCoeffs is None:
+            return frame
+
+        if self._maps is None:
+            self._maps = cv2.initUndistortRectifyMap(self.cameraMatrix, self.distCoeffs, None, self.cameraMatrix,
+                                                     self.size, cv2.CV_16SC2)
+
+        return cv2.remap(frame, self._maps[0], self._maps[1], cv2.INTER_LINEAR)
+
+    @staticmethod
+    def corners(points):
+        """Gets the four corners of a tape from its undistorted contour points.
+        Returns:
+            (4, 2) corners from the top one clockwise. Unlike the minimum area rectangle, they keep the perspective.
+        """
+        (cx, cy), (w, h), angle = cv2.minAreaRect(points)
+        a = math.radians(angle)
+        offsets = points - (cx, cy)
+        # Coordinates in the frame of the rectangle, scaled so its corners are at (+-1, +-1).
+        u = offsets @ (math.cos(a), math.sin(a)) / max(w, 1e-6)
+        v = offsets @ (-math.sin(a), math.cos(a)) / max(h, 1e-6)
+
+        corners = points[[np.argmax(-u - v), np.argmax(u - v), np.argmax(u + v), np.argmax(v - u)]]
+
+        # (u, v) turns clockwise on screen like (x, y), only the starting corner needs fixing.
+        return TargetSolver._from_top(corners)
+
+    @staticmethod
+    def _from_top(corners):
+        # Starts at the corner nearest straight up from the middle, which tolerates far more tilt and noise than
+        # taking the highest corner.
+        offsets = corners - corners.mean(axis=0)
+        up = np.arctan2(offsets[:, 0], -offsets[:, 1])
+
+        return np.roll(corners, -int(np.argmin(np.abs(up))), axis=0)
+
+    def _undistort_all(self, contours):
+        # The points of every contour undistorted in one lookup, split back per contour.
+        points = self.undistort_points(np.concatenate([np.asarray(contour).reshape(-1, 2) for contour in contours]))
+        lengths = np.cumsum([len(np.asarray(contour).reshape(-1, 2)) for contour in contours])[:-1]
+
+        return np.split(points, lengths)
+
+    def _fit(self, imagePoints):
+        # Pose of a run of tapes and its mean reprojection error relative to its width, None if it does not fit.
+        ok, rvec, tvec = cv2.solvePnP(self._objectPoints, imagePoints, self.cameraMatrix, None,
+                                      flags=cv2.SOLVEPNP_IPPE)
+
+        if not ok:
+            return None
+
+        rotation = cv2.Rodrigues(rvec)[0]
+        # Tapes paired across two targets fit a target seen from behind.
+        if tvec[2, 0] <= 0 or rotation[2, 2] <= 0:
+            return None
+
+        projected = cv2.projectPoints(self._objectPoints, rvec, tvec, self.cameraMatrix, None)[0].reshape(-1, 2)
+        width = max(np.ptp(imagePoints[:, 0]), 1.0)
+        error = np.linalg.norm(projected - imagePoints, axis=1).mean() / width
+
+        return error, rvec, tvec, rotation
+
+    def solve_all(self, contours):
+        """Solves the pose of every target in view.
+        Args:
+            contours: Contours of the tapes, as returned by Src.contour_targets(..., contours=True).
+        Returns:
+            A list of TargetPose from left to right, empty if no run of tapes fits the model. A tape belongs to one
+            target at most, the best fitting runs are taken first.
+        """
+        tapes = len(self.model)
+        if len(contours) < tapes:
+            return []
+
+        points = self._undistort_all(contours)
+        order = np.argsort([tape[:, 0].mean() for tape in points], kind='stable')
+        corners = [TargetSolver.corners(points[i]) for i in order]
+
+        fits = []
+        for start in range(len(corners) - tapes + 1):
+            fit = self._fit(np.concatenate(corners[start:start + tapes]).astype(np.float64))
+            if fit is not None and fit[0] <= self.maxError:
+                fits.append((fit[0], start) + fit[1:])
+
+        used = np.zeros(len(corners), bool)
+        poses = []
+
+        for error, start, rvec, tvec, rotation in sorted(fits, key=lambda fit: fit[0]):
+            if used[start:start + tapes].any():
+                continue
+
+            used[start:start + tapes] = True
+            tx, ty, tz = tvec.ravel()
+            poses.append((start, TargetPose(math.hypot(tx, tz), math.degrees(math.atan2(tx, tz)),
+                                            math.degrees(math.atan2(rotation[0, 2], rotation[2, 2])), rvec, tvec)))
+
+        return [pose for start, pose in sorted(poses, key=lambda item: item[0])]
+
+    def solve(self, contours):
+        """Solves the pose of the target nearest the optical axis, see solve_all.
+        Returns:
+            A TargetPose, or None if no target was found.
+        """
+        poses = self.solve_all(contours)
+
+        return min(poses, key=lambda pose: abs(pose.yaw)) if poses else None
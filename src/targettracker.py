@@ -0,0 +1,287 @@
+import collections
+import time
+
+import numpy as np
+import cv2
+
+from basicvislib5549.framepool import FramePool
+from basicvislib5549.metrics import Metrics
+from .roitracker import RoiTracker
+
+"""
+Multi-target tracking on top of the contour pipeline. Every target keeps an identity and a constant-velocity Kalman
+filter across frames. Detections are matched to the predicted targets by optimal (Hungarian) assignment.
+
+The full-frame detector only runs every few frames, or on the next frame when too few targets are confirmed. In
+between, only the region around the predicted targets is searched (see RoiTracker), which verifies the prediction.
+"""
+
+
+TrackedTarget = collections.namedtuple("TrackedTarget", ["id", "center", "bbox", "velocity", "hits", "misses"])
+
+
+def assign(cost):
+    """Solves the assignment problem (Hungarian method) on a rectangular cost matrix.
+    Args:
+        cost: (rows, columns) numpy.ndarray of costs.
+    Returns:
+        A (rows, columns) tuple of index arrays of the pairs with the smallest total cost, one pair per row or column,
+        whichever there are fewer of.
+    """
+    cost = np.asarray(cost, np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+
+    n, m = cost.shape
+    if n == 0:
+        return np.zeros(0, int), np.zeros(0, int)
+
+    # Every row taking its cheapest column is optimal when no two rows want the same one, the usual case for tracks.
+    best = cost.argmin(axis=1)
+    if len(np.unique(best)) == n:
+        rows = np.arange(n)
+        return (best, rows) if transposed else (rows, best)
+
+    # Potentials of rows (u) and columns (v), match[j] is the row assigned to column j, all 1-based with 0 free.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, int)
+    way = np.zeros(m + 1, int)
+
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, bool)
+
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if match[j0] == 0:
+                break
+
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    columns = np.flatnonzero(match[1:]) + 1
+    rows = match[columns] - 1
+    columns = columns - 1
+
+    order = np.argsort(rows)
+    rows, columns = rows[order], columns[order]
+
+    return (columns, rows) if transposed else (rows, columns)
+
+
+class _Track:
+    """Constant-velocity Kalman filter of a target's center and size."""
+
+    def __init__(self, id, bbox, processNoise, measurementNoise):
+        self.id = id
+        self.hits = 1
+        self.misses = 0
+
+        # State (cx, cy, w, h, vx, vy, vw, vh) in pixels and pixels per second, measured (cx, cy, w, h).
+        self.filter = cv2.KalmanFilter(8, 4)
+        self.filter.measurementMatrix = np.eye(4, 8, dtype=np.float32)
+        self.filter.processNoiseCov = np.diag([1, 1, 1, 1, 10, 10, 10, 10]).astype(np.float32) * processNoise
+        self.filter.measurementNoiseCov = np.eye(4, dtype=np.float32) * measurementNoise
+        self.filter.errorCovPost = np.diag([1, 1, 1, 1, 1000, 1000, 1000, 1000]).astype(np.float32)
+        self.filter.statePost = np.zeros((8, 1), np.float32)
+        self.filter.statePost[:4, 0] = _Track.measurement(bbox)
+        self.state = self.filter.statePost[:, 0].copy()
+
+    @staticmethod
+    def measurement(bbox):
+        x, y, w, h = bbox
+        return np.array([x + w / 2, y + h / 2, w, h], np.float32)
+
+    def predict(self, dt):
+        transition = np.eye(8, dtype=np.float32)
+        transition[range(4), range(4, 8)] = dt
+        self.filter.transitionMatrix = transition
+        self.state = self.filter.predict()[:, 0].copy()
+
+    def correct(self, bbox):
+        self.state = self.filter.correct(_Track.measurement(bbox).reshape(4, 1))[:, 0].copy()
+        self.hits += 1
+        self.misses = 0
+
+    def bbox(self):
+        cx, cy, w, h = self.state[:4]
+        return np.array([cx - w / 2, cy - h / 2, w, h])
+
+    def target(self):
+        return TrackedTarget(self.id, (float(self.state[0]), float(self.state[1])), self.bbox(),
+                             (float(self.state[4]), float(self.state[5])), self.hits, self.misses)
+
+
+class TargetTracker:
+    """
+    Tracker of the targets found by the contour pipeline.
+
+    Usage: Construct one per camera and call process() on each frame instead of Src.vision_assistance_contour.
+        Params:
+            every: Run the full-frame detector at least every this many frames, 1 to run it on every frame.
+            minConfidence: Fraction of the confirmed targets that must be verified on a frame, below it the next
+                frame is searched in full.
+            gate: Largest distance between a prediction and a detection to match them, in predicted target sizes.
+            confirm: Hits before a target is reported, filtering out single-frame detections.
+            maxMisses: Consecutive frames a target may go unseen before it is dropped.
+            processNoise: Kalman process noise, higher follows fast motion more closely but smooths less.
+            measurementNoise: Kalman measurement noise in pixels squared, higher smooths more.
+            padding, compiled, pool, metrics: Passed to the RoiTracker.
+        Variables:
+            self.Targets: The TrackedTargets reported for the last frame, with smoothed centers and bounding boxes.
+            self.Contours: Contours of the detections matched to the reported targets, for TargetSolver.
+            self.Confidence: Fraction of the confirmed targets verified on the last frame, 1 with none.
+            self.Detections: Frames run through the full-frame detector.
+            self.Verifications: Frames only searched around the predicted targets.
+            self.Rate: Frames processed per second, smoothed.
+    """
+
+    def __init__(self, every=5, minConfidence=0.5, gate=1.0, confirm=2, maxMisses=5, processNoise=1.0,
+                 measurementNoise=4.0, padding=24, compiled=False, pool=None, metrics=None):
+        self.every = every
+        self.minConfidence = minConfidence
+        self.gate = gate
+        self.confirm = confirm
+        self.maxMisses = maxMisses
+        self.processNoise = processNoise
+        self.measurementNoise = measurementNoise
+        self.metrics = metrics if metrics is not None else Metrics.Disabled
+        self.roi = RoiTracker(padding, every, compiled, pool if pool is not None else FramePool(), self.metrics)
+
+        self.Targets = []
+        self.Contours = []
+        self.Confidence = 1.0
+        self.Detections = 0
+        self.Verifications = 0
+        self.Rate = 0.0
+
+        self._tracks = []
+        self._nextId = 0
+        self._last = None
+
+    def reset(self):
+        """Forgets every target, the next frame is searched in full."""
+        self._tracks = []
+        self.roi.reset()
+
+    def _cost(self, bboxes):
+        predicted = np.array([track.state[:4] for track in self._tracks])
+        detected = np.stack((bboxes[:, 0] + bboxes[:, 2] / 2, bboxes[:, 1] + bboxes[:, 3] / 2), axis=1)
+
+        size = np.maximum(predicted[:, 2:4].max(axis=1), 1)[:, None]
+        cost = np.linalg.norm(predicted[:, None, :2] - detected[None, :, :], axis=2) / size
+
+        # Matches beyond the gate are never taken, however few others there are.
+        return np.where(cost > self.gate, 1e6, cost)
+
+    def process(self, source: np.ndarray, timestamp: float = None) -> (tuple, tuple, tuple):
+        """Finds and tracks the targets of a frame.
+        Args:
+            timestamp: Capture time of the frame in seconds, time.monotonic() if None.
+        Returns:
+            The same (average center, centers, bounding boxes) as Src.vision_assistance_contour, from the smoothed
+            confirmed targets. Centers and bounding boxes are in the order of self.Targets.
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        dt = now - self._last if self._last is not None else 0.0
+        self._last = now
+
+        if dt > 0:
+            self.Rate = 1 / dt if self.Rate == 0 else 0.9 * self.Rate + 0.1 / dt
+
+        with self.metrics.timer("track predict"):
+            for track in self._tracks:
+                track.predict(dt)
+
+        predicted = np.array([track.bbox() for track in self._tracks]) if self._tracks else None
+        full = self.roi.FullFrames
+
+        start = time.perf_counter()
+        result = self.roi.process(source, predicted, contours=True)
+        bboxes, contours = result[2], result[3]
+
+        # Recorded apart, so the cost of a full-frame search and of a verification can be told apart.
+        if self.roi.FullFrames != full:
+            self.Detections += 1
+            self.metrics.record("track detect", time.perf_counter() - start)
+        else:
+            self.Verifications += 1
+            self.metrics.record("track verify", time.perf_counter() - start)
+
+        with self.metrics.timer("track assign"):
+            matched = []
+
+            if self._tracks and len(bboxes) > 0:
+                cost = self._cost(bboxes)
+                rows, columns = assign(cost)
+                matched = [(r, c) for r, c in zip(rows, columns) if cost[r, c] <= self.gate]
+
+            confirmed = [track for track in self._tracks if track.hits >= self.confirm]
+            verified = 0
+            matchedContours = {}
+
+            for r, c in matched:
+                track = self._tracks[r]
+                if track.hits >= self.confirm:
+                    verified += 1
+                track.correct(bboxes[c])
+                matchedContours[track.id] = contours[c]
+
+            self.Confidence = verified / len(confirmed) if confirmed else 1.0
+
+            matchedRows = set(r for r, c in matched)
+            for r, track in enumerate(self._tracks):
+                if r not in matchedRows:
+                    track.misses += 1
+
+            self._tracks = [track for track in self._tracks if track.misses <= self.maxMisses]
+
+            matchedColumns = set(c for r, c in matched)
+            for c in range(len(bboxes)):
+                if c not in matchedColumns:
+                    self._tracks.append(_Track(self._nextId, bboxes[c], self.processNoise, self.measurementNoise))
+                    matchedContours[self._nextId] = contours[c]
+                    self._nextId += 1
+
+        if self.Confidence < self.minConfidence:
+            # Too many targets were not where they were expected, look at the whole next frame.
+            self.roi.reset()
+
+        reported = [track for track in self._tracks if track.hits >= self.confirm]
+        self.Targets = [track.target() for track in reported]
+        self.Contours = [matchedContours[track.id] for track in reported if track.id in matchedContours]
+
+        centers = np.array([target.center for target in self.Targets]).reshape(-1, 2)
+        bboxes = np.array([target.bbox for target in self.Targets]).reshape(-1, 4)
+
+        if len(centers) > 0:
+            avgcenx, avgceny = centers.mean(axis=0)
+
+        else:
+            avgcenx = 0
+            avgceny = 0
+
+        return (avgcenx, avgceny), centers, bboxes